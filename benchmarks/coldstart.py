@@ -0,0 +1,144 @@
+''' Cold start benchmark: import time, time to the first call and memory
+
+Every run starts a fresh interpreter which imports ipernity_api and calls
+Doc.get against a local stub server, so the numbers include everything a
+short-lived script pays for. The medians of the runs are compared with a
+baseline file; a metric more than `tolerance` above its baseline is
+reported as a regression and the exit status is 1.
+
+Usage:
+    python -m benchmarks.coldstart              # compare with baseline
+    python -m benchmarks.coldstart --update     # write a new baseline
+
+Baselines depend on the machine, update the file after moving the
+benchmark to another host.
+'''
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'baseline.json')
+
+# metric -> description
+METRICS = [
+    ('import_ms', 'import ipernity_api'),
+    ('first_call_ms', 'first Doc.get against the stub'),
+    ('import_rss_kib', 'peak RSS growth during import'),
+    ('maxrss_kib', 'peak RSS of the process'),
+]
+
+CHILD = '''
+import json, resource, sys, time
+def maxrss():
+    # VmHWM is reset by exec, ru_maxrss includes the parent's peak
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+rss = maxrss()
+started = time.perf_counter()
+import ipernity_api
+imported = time.perf_counter()
+import_rss = maxrss() - rss
+ipernity_api.set_keys('key', 'secret')
+ipernity_api.set_api_url(sys.argv[1])
+called = time.perf_counter()
+ipernity_api.Doc.get(id='1')
+done = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_call_ms': (done - called) * 1000,
+    'import_rss_kib': import_rss,
+    'maxrss_kib': maxrss(),
+}))
+'''
+
+
+def run_once(api_url):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    out = subprocess.check_output([sys.executable, '-c', CHILD, api_url],
+                                  cwd=ROOT, env=env)
+    return json.loads(out)
+
+
+def measure(runs=7):
+    ''' medians of `runs` cold starts, as dict metric -> value '''
+    # the stub runs in its own process: children inherit the peak RSS of
+    # this one, which must not import ipernity_api
+    stub = subprocess.Popen([sys.executable, '-m', 'ipernity_api.stub'],
+                            cwd=ROOT, stdout=subprocess.PIPE,
+                            universal_newlines=True)
+    try:
+        api_url = stub.stdout.readline().strip()
+        # the first run compiles the .pyc files, don't count it
+        run_once(api_url)
+        samples = [run_once(api_url) for i in range(runs)]
+    finally:
+        stub.terminate()
+        stub.wait()
+    return dict((name, statistics.median(s[name] for s in samples))
+                for name, _ in METRICS)
+
+
+def compare(results, baseline, tolerance=0.2, metrics=METRICS):
+    ''' list of (metric, value, baseline value, ratio, regressed) '''
+    rows = []
+    for name, _ in metrics:
+        value = results[name]
+        base = baseline.get(name)
+        ratio = value / base if base else None
+        regressed = ratio is not None and ratio > 1 + tolerance
+        rows.append((name, value, base, ratio, regressed))
+    return rows
+
+
+def report(rows):
+    width = max([len(row[0]) for row in rows] + [16])
+    lines = ['%-*s %12s %12s %8s' % (width, 'metric', 'value', 'baseline',
+                                     'ratio')]
+    for name, value, base, ratio, regressed in rows:
+        lines.append('%-*s %12.1f %12s %8s%s' % (
+            width, name, value, '%.1f' % base if base else '-',
+            '%.2f' % ratio if ratio else '-',
+            '  REGRESSION' if regressed else ''))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed relative increase, default 0.2')
+    parser.add_argument('--update', action='store_true',
+                        help='write the results as new baseline')
+    args = parser.parse_args(argv)
+
+    results = measure(args.runs)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    rows = compare(results, baseline, args.tolerance)
+    print(report(rows))
+    if args.update:
+        with open(args.baseline, 'w') as f:
+            json.dump(dict((k, round(v, 1)) for k, v in results.items()),
+                      f, indent=2, sort_keys=True)
+            f.write('\n')
+        print('Baseline written to %s' % args.baseline)
+        return 0
+    return 1 if any(row[4] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,427 @@
+''' Conversion benchmark: the decode/convert hot path of list responses
+
+Converts synthetic doc.search and album.docs.getList pages of 100 to 100k
+docs with the functions that run over every doc of every page, and
+reports per case and size:
+
+    ns/obj      time per doc, best of `--repeat` runs (more for small
+                pages, so that at least MIN_DOCS docs are converted)
+    blocks/obj  net memory blocks allocated per doc by the conversion,
+                i.e. blocks of the result minus blocks of the input freed
+                on the way; negative if more was freed than allocated
+    peak KiB    traced peak memory during the conversion, including the
+                converted objects
+
+Payloads are decoded with json.loads before timing, since every case
+mutates its input. Results can be compared with a baseline file like the
+cold start benchmark; only ns/obj and peak KiB are compared.
+
+With --memory, the memory retained per object is reported instead for the
+high volume classes and for dict based copies of them (same conversion, no
+__slots__): the object and the values created by the conversion, such as
+ints, dates and nested objects, which are compact in both cases.
+
+Usage:
+    python -m benchmarks.convert                        # 100 to 10k docs
+    python -m benchmarks.convert --sizes 100000 --repeat 1
+    python -m benchmarks.convert --sizes 100,1000 --cases resp2ilist
+    python -m benchmarks.convert --update      # write a new baseline
+    python -m benchmarks.convert --memory      # bytes per object
+'''
+import os
+import re
+import sys
+import json
+import time
+import random
+import datetime
+import argparse
+import tracemalloc
+from ipernity_api import ipernity
+from ipernity_api.ipernity import (IpernityObject, Doc, User, Thumb, Media,
+                                   Original, Tag, Comment, _format_result_docs,
+                                   _dict_str2int, _dict_conv, _ts2datetime,
+                                   _parse_ts, _ts2datetime_page)
+from .coldstart import compare, report
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'convert_baseline.json')
+
+SIZES = (100, 1000, 10000)
+
+# docs converted at least per case and size
+MIN_DOCS = 20000
+
+# page payloads: doc.search, album.docs.getList
+KINDS = ('search', 'album')
+
+
+def make_doc(i, rnd):
+    ''' a doc as returned by doc.search with extra=dates,count,owner,medias
+    '''
+    doc_id = str(100000 + i)
+    posted = 1200000000 + rnd.randrange(400000000)
+    thumbs = [{'label': label, 'ext': 'jpg', 'w': str(size),
+               'h': str(size * 3 // 4),
+               'url': 'http://u1.ipernity.com/%s/%s.%s.jpg' % (
+                   doc_id[-2:], doc_id, label)}
+              for label, size in (('75x', 75), ('240', 240), ('500', 500))]
+    return {
+        'doc_id': doc_id,
+        'media': rnd.choice(['photo', 'photo', 'photo', 'video']),
+        'license': str(rnd.randrange(12)),
+        'title': 'Document %d' % i,
+        'safety': '1',
+        'link': 'http://www.ipernity.com/doc/user/%s' % doc_id,
+        'owner': {'user_id': str(rnd.randrange(1, 5000)),
+                  'username': 'user%d' % rnd.randrange(5000),
+                  'realname': ''},
+        'dates': {
+            'posted_at': str(posted),
+            'created': time.strftime('%Y-%m-%d %H:%M:%S',
+                                     time.gmtime(posted - 86400)),
+            'last_comment_at': str(posted + rnd.randrange(100000)),
+        },
+        'count': {'visits': str(rnd.randrange(10000)),
+                  'faves': str(rnd.randrange(50)),
+                  'comments': str(rnd.randrange(30)),
+                  'notes': '0', 'tags': str(rnd.randrange(10)),
+                  'albums': '1', 'groups': str(rnd.randrange(5))},
+        'visibility': {'ispublic': '1', 'isfriend': '0', 'isfamily': '0',
+                       'share': '5'},
+        'thumbs': {'thumb': thumbs},
+    }
+
+
+def make_payload(kind, size, seed=0):
+    ''' JSON text of a response page of `size` docs '''
+    rnd = random.Random(seed)
+    docs = {'total': str(size * 10), 'page': '1', 'pages': '10',
+            'per_page': str(size),
+            'doc': [make_doc(i, rnd) for i in range(size)]}
+    resp = {'api': {'status': 'ok'}}
+    if kind == 'album':
+        resp['album'] = {'album_id': '10460', 'docs': docs}
+    else:
+        resp['docs'] = docs
+    return json.dumps(resp)
+
+
+def _docs(resp):
+    return (resp['album'] if 'album' in resp else resp)['docs']['doc']
+
+
+def _case_resp2ilist(resp):
+    section = resp['album'] if 'album' in resp else resp
+    return lambda: _format_result_docs(section)
+
+
+def _case_set_props(resp):
+    docs = _docs(resp)
+    return lambda: [Doc(**d) for d in docs]
+
+
+def legacy_set_props(self, **params):
+    ''' IpernityObject._set_props before the converters were compiled '''
+    for keys, func in self.__class__.__convertors__:
+        for k in keys:
+            try:
+                params[k] = func(params[k])
+            except KeyError:
+                pass
+    for old, new, func in self.__class__.__replace__:
+        try:
+            val = params.pop(old)
+            params[new] = func(val)
+        except KeyError:
+            pass
+    idname = self.__class__.__id__
+    if idname:
+        idval = params.get('id') or params.get(idname)
+        params['id'] = params[idname] = idval
+    self.__dict__.update(params)
+
+
+# classes built by the conversion of a doc, see Doc.__convertors__
+LEGACY_CLASSES = (Doc, User, Thumb, Media, Original)
+
+
+def _case_set_props_legacy(resp):
+    # dict based copies of the classes with the old _set_props; the
+    # convertors of Doc look up the nested classes in the module, so they
+    # are replaced there for the run
+    docs = _docs(resp)
+    legacy = dict((cls.__name__,
+                   _dict_based(cls, _set_props=legacy_set_props))
+                  for cls in LEGACY_CLASSES)
+
+    def convert():
+        saved = dict((name, getattr(ipernity, name)) for name in legacy)
+        for name, cls in legacy.items():
+            setattr(ipernity, name, cls)
+        try:
+            return [legacy['Doc'](**d) for d in docs]
+        finally:
+            for name, cls in saved.items():
+                setattr(ipernity, name, cls)
+    return convert
+
+
+def _case_set_props_lazy(resp):
+    # an id collecting job: lazy docs, only the ids are read
+    docs = _docs(resp)
+
+    def convert():
+        ipernity.set_lazy(True)
+        try:
+            return [Doc(**d).id for d in docs]
+        finally:
+            ipernity.set_lazy(False)
+    return convert
+
+
+def _case_dict_str2int(resp):
+    docs = _docs(resp)
+    return lambda: [_dict_str2int(d) for d in docs]
+
+
+def _case_dict_conv(resp):
+    docs = _docs(resp)
+    dates = _dict_conv(_ts2datetime)
+    counts = _dict_conv(int)
+    return lambda: [(dates(d['dates']), counts(d['count'])) for d in docs]
+
+
+def _case_ts2datetime(resp):
+    values = [v for d in _docs(resp) for v in d['dates'].values()]
+    # per doc: the timestamps of one doc
+    return lambda: [_ts2datetime(v) for v in values]
+
+
+# ts2datetime runs with the memo of _ts2datetime, which holds all values
+# of pages up to 1365 docs after the first run; larger pages mostly miss,
+# until the memo is skipped. ts2datetime_nomemo is the parser alone.
+def _case_ts2datetime_nomemo(resp):
+    values = [v for d in _docs(resp) for v in d['dates'].values()]
+    return lambda: [_parse_ts(v) for v in values]
+
+
+def legacy_ts2datetime(ts):
+    ''' _ts2datetime before the fast path '''
+    regexp = r'\d\d\d\d-\d\d-\d\d \d\d:\d\d:\d\d'
+    if ts.isdigit():
+        return datetime.datetime.fromtimestamp(int(ts))
+    elif re.match(regexp, ts):
+        try:
+            return datetime.datetime.strptime(ts, '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            return None
+    else:
+        return ts or None
+
+
+def _case_ts2datetime_legacy(resp):
+    values = [v for d in _docs(resp) for v in d['dates'].values()]
+    return lambda: [legacy_ts2datetime(v) for v in values]
+
+
+def _case_ts2datetime_page(resp):
+    dates = [d['dates'] for d in _docs(resp)]
+    keys = ('posted_at', 'created', 'last_comment_at')
+    return lambda: _ts2datetime_page(dates, keys)
+
+
+# case name -> function(decoded payload) returning the function to measure
+CASES = [
+    ('resp2ilist', _case_resp2ilist),
+    ('set_props', _case_set_props),
+    ('set_props_legacy', _case_set_props_legacy),
+    ('set_props_lazy', _case_set_props_lazy),
+    ('dict_str2int', _case_dict_str2int),
+    ('dict_conv', _case_dict_conv),
+    ('ts2datetime', _case_ts2datetime),
+    ('ts2datetime_nomemo', _case_ts2datetime_nomemo),
+    ('ts2datetime_legacy', _case_ts2datetime_legacy),
+    ('ts2datetime_page', _case_ts2datetime_page),
+]
+
+
+def _dict_based(cls, **attrs):
+    ''' copy of cls keeping its properties in the instance __dict__, with
+    additional class attributes attrs
+    '''
+    return type(cls.__name__, (IpernityObject,), dict({
+        '__convertors__': cls.__convertors__,
+        '__replace__': cls.__replace__,
+        '__id__': cls.__id__,
+        '__display__': cls.__display__,
+    }, **attrs))
+
+
+def _memory_samples(rnd):
+    doc = make_doc(0, rnd)
+    thumb = doc['thumbs']['thumb'][0]
+    return [
+        (Doc, lambda: make_doc(0, rnd)),
+        (User, lambda: dict(doc['owner'], is_pro='0', is_online='1')),
+        (Thumb, lambda: dict(thumb)),
+        (Media, lambda: dict(thumb, label='original', bytes='123456')),
+        (Tag, lambda: {'tag_id': '5', 'tag': 'sea', 'type': 'keyword',
+                       'user_id': '7', 'added_at': '1300000000'}),
+        (Comment, lambda: {'comment_id': '9', 'user_id': '7',
+                           'username': 'u', 'content': 'Nice!',
+                           'posted_at': '1300000000', 'canedit': '0',
+                           'candelete': '0', 'canreply': '1'}),
+    ]
+
+
+def _retained(make, count):
+    # bytes per object allocated by make() and still referenced
+    tracemalloc.start()
+    objects = [None] * count
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(count):
+        objects[i] = make()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return retained / count
+
+
+def object_memory(count=5000):
+    ''' list of (class name, bytes per dict based object, bytes per object)
+    '''
+    rows = []
+    for cls, sample in _memory_samples(random.Random(0)):
+        sizes = []
+        for c in (_dict_based(cls), cls):
+            # the inputs are created before tracing and kept alive
+            inputs = iter([sample() for i in range(count)])
+            sizes.append(_retained(lambda: c(**next(inputs)), count))
+        rows.append((cls.__name__,) + tuple(sizes))
+    return rows
+
+
+def memory_table(rows):
+    lines = ['%-8s %12s %12s %8s' % ('class', 'dict B/obj', 'slots B/obj',
+                                     'ratio')]
+    for name, dict_based, compact in rows:
+        lines.append('%-8s %12.0f %12.0f %8.2f' % (
+            name, dict_based, compact, compact / dict_based))
+    return '\n'.join(lines)
+
+
+def reset_ts_memo():
+    ''' empty the memo of _ts2datetime, so that cases don't depend on the
+    cases run before
+    '''
+    ipernity._TS_MEMO.clear()
+    ipernity._ts_memo_hits = ipernity._ts_memo_misses = 0
+    ipernity._ts_memo_skip = 0
+
+
+def run_case(case, text, size, repeat=3):
+    ''' dict of ns_per_obj, blocks_per_obj and peak_kib of case for the
+    payload text of size docs
+    '''
+    reset_ts_memo()
+    best = None
+    for i in range(max(repeat, MIN_DOCS // size)):
+        func = case(json.loads(text))
+        started = time.perf_counter_ns()
+        func()
+        elapsed = time.perf_counter_ns() - started
+        best = elapsed if best is None else min(best, elapsed)
+    func = case(json.loads(text))
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    result = func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    blocks = sys.getallocatedblocks() - blocks
+    del result
+    return {
+        'ns_per_obj': best / size,
+        'blocks_per_obj': blocks / size,
+        'peak_kib': peak / 1024.0,
+    }
+
+
+def measure(sizes=SIZES, kinds=KINDS, cases=None, repeat=3):
+    ''' dict of '<kind>_<case>_<size>_<metric>' -> value '''
+    cases = [(name, case) for name, case in CASES
+             if cases is None or name in cases]
+    results = {}
+    for size in sizes:
+        for kind in kinds:
+            text = make_payload(kind, size)
+            for name, case in cases:
+                r = run_case(case, text, size, repeat)
+                for metric, value in r.items():
+                    results['%s_%s_%d_%s' % (kind, name, size, metric)] = \
+                        value
+    return results
+
+
+def table(results, sizes=SIZES, kinds=KINDS):
+    lines = ['%-8s %-18s %8s %12s %12s %12s' % (
+        'payload', 'case', 'docs', 'ns/obj', 'blocks/obj', 'peak KiB')]
+    for size in sizes:
+        for kind in kinds:
+            for name, _ in CASES:
+                key = '%s_%s_%d_' % (kind, name, size)
+                if key + 'ns_per_obj' not in results:
+                    continue
+                lines.append('%-8s %-18s %8d %12.0f %12.1f %12.0f' % (
+                    kind, name, size, results[key + 'ns_per_obj'],
+                    results[key + 'blocks_per_obj'],
+                    results[key + 'peak_kib']))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)))
+    parser.add_argument('--kinds', default=','.join(KINDS))
+    parser.add_argument('--cases', help='comma separated, default: all')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed relative increase, default 0.2')
+    parser.add_argument('--update', action='store_true',
+                        help='write the results as new baseline')
+    parser.add_argument('--memory', action='store_true',
+                        help='report the memory per object instead')
+    args = parser.parse_args(argv)
+
+    if args.memory:
+        print(memory_table(object_memory()))
+        return 0
+
+    sizes = [int(s) for s in args.sizes.split(',')]
+    kinds = args.kinds.split(',')
+    cases = args.cases.split(',') if args.cases else None
+    results = measure(sizes, kinds, cases, args.repeat)
+    print(table(results, sizes, kinds))
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    metrics = [(k, k) for k in sorted(results)
+               if not k.endswith('blocks_per_obj') and k in baseline]
+    rows = compare(results, baseline, args.tolerance, metrics)
+    if rows:
+        print()
+        print(report(rows))
+    if args.update:
+        baseline.update((k, round(v, 1)) for k, v in results.items()
+                        if not k.endswith('blocks_per_obj'))
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print('Baseline written to %s' % args.baseline)
+        return 0
+    return 1 if any(row[4] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
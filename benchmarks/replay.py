@@ -0,0 +1,180 @@
+''' Replay benchmark: CPU time, allocations and throughput of recorded
+traffic
+
+Replays every call of a cassette (see ipernity_api.cassette) through
+rest.call_api with a ReplayTransport, so the numbers measure the library,
+not the network. The response of a call is then converted with the
+format_result function of its object API method (e.g. Doc.search for
+doc.search), as the object API would. Calls are issued from `workers`
+threads, in recorded order, optionally at the recorded arrival times
+(--pace) and with the recorded latencies (--latency).
+
+Usage:
+    python -m benchmarks.replay calls.jsonl.gz
+    python -m benchmarks.replay calls.jsonl.gz --output new.json
+    python -m benchmarks.replay calls.jsonl.gz --baseline old.json
+
+Results can be written to a file and compared with the results of another
+version of the library; a metric more than `tolerance` above its baseline
+is reported as a regression and the exit status is 1.
+'''
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from ipernity_api import rest, ipernity
+from ipernity_api.client import Client
+from ipernity_api.cassette import load, ReplayTransport
+from ipernity_api.errors import IpernityError
+from ipernity_api.hooks import CallInfo
+from ipernity_api.reflection import ApiMethod, _format
+from .coldstart import compare, report
+
+# metric -> description
+METRICS = [
+    ('calls', 'calls replayed'),
+    ('wall_s', 'elapsed time'),
+    ('cpu_us_per_call', 'CPU time per call'),
+    ('peak_kib', 'peak traced memory'),
+    ('retained_kib', 'traced memory left after the replay'),
+    ('ms_per_call', 'elapsed time per call, inverse throughput'),
+]
+
+
+def object_methods():
+    ''' API method -> (class, ApiMethod) of the object API '''
+    methods = {}
+    for cls in vars(ipernity).values():
+        if isinstance(cls, type) and issubclass(cls, ipernity.IpernityObject):
+            for method in vars(cls).values():
+                if isinstance(method, ApiMethod):
+                    methods.setdefault(method.ipernity_method, (cls, method))
+    return methods
+
+
+def _formatter(methods, api_method, params):
+    ''' format_result of the object API method of api_method, built from
+    the recorded params; None if there is none
+    '''
+    found = methods.get(api_method)
+    if found is None:
+        return None
+    cls, method = found
+    # the decorated function, returning (params, format_result)
+    func = method.func.__wrapped__
+    params = dict(params)
+    try:
+        if method.static:
+            return func(**params)[1]
+        idname = cls.__id__
+        obj = cls(**{idname: params.pop(idname, None)}) if idname else cls()
+        return func(obj, **params)[1]
+    except Exception:
+        return None
+
+
+def _call(client, methods, entry):
+    ''' replay entry, return True if the response was converted '''
+    # scrubbed signatures and tokens are sent as recorded, call_api only
+    # adds the api key
+    params = dict(entry['params'])
+    params.pop('api_key', None)
+    # uploads are replayed without reading the recorded file
+    http_post = entry['post'] and 'file' not in params
+    info = CallInfo(entry['method'])
+    try:
+        resp = rest.call_api(entry['method'], client=client,
+                             http_post=http_post, call_info=info, **params)
+    except IpernityError:
+        return False  # recorded API errors are replayed as errors
+    with client:
+        format_result = _formatter(methods, entry['method'], params)
+        if format_result is None:
+            return False
+        try:
+            _format(info, format_result, resp)
+        except Exception:
+            return False  # a response the object API can't convert
+    return True
+
+
+def replay(interactions, workers=1, latency=False, pace=False,
+           trace=True):
+    ''' replay interactions, return dict metric -> value '''
+    transport = ReplayTransport(interactions, latency=latency)
+    client = Client('key', 'secret', transport=transport)
+    methods = object_methods()
+    if trace:
+        tracemalloc.start()
+    peak = retained = 0
+    cpu = time.process_time()
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for entry in interactions:
+            if pace:
+                delay = entry['at'] - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            futures.append(executor.submit(_call, client, methods, entry))
+        formatted = sum(future.result() for future in futures)
+    wall = time.monotonic() - started
+    cpu = time.process_time() - cpu
+    if trace:
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    calls = max(1, len(interactions))
+    return {
+        'calls': len(interactions),
+        'formatted': formatted,
+        'wall_s': wall,
+        'cpu_us_per_call': cpu / calls * 1e6,
+        'peak_kib': peak / 1024.0,
+        'retained_kib': retained / 1024.0,
+        'ms_per_call': wall / calls * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('cassette')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='replay the cassette this many times')
+    parser.add_argument('--latency', action='store_true',
+                        help='wait the recorded latencies')
+    parser.add_argument('--pace', action='store_true',
+                        help='start calls at the recorded times')
+    parser.add_argument('--no-trace', action='store_true',
+                        help='do not trace allocations (faster)')
+    parser.add_argument('--output', help='write the results to this file')
+    parser.add_argument('--baseline', help='compare with these results')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed relative increase, default 0.2')
+    args = parser.parse_args(argv)
+
+    recorded = load(args.cassette)
+    span = recorded[-1]['at'] if recorded else 0
+    interactions = [dict(entry, at=entry['at'] + i * span)
+                    for i in range(args.repeat) for entry in recorded]
+    results = replay(interactions, args.workers, args.latency, args.pace,
+                     not args.no_trace)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    rows = compare(results, baseline, args.tolerance, METRICS)
+    print(report(rows))
+    print('%d of %d calls converted to objects' % (results['formatted'],
+                                                   results['calls']))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+    return 1 if any(row[4] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
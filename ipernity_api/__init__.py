@@ -1,5 +1,11 @@
 from .keys import set_keys
 from .auth import set_auth_handler
 from .auth import AuthHandler, DesktopAuthHandler, WebAuthHandler, OAuthAuthHandler
-from .rest import enable_cache, disable_cache
+from .rest import enable_cache, disable_cache, set_api_url
+from .rest import set_transport, set_rate_limiter, set_retry_policy
+from .rest import set_hedging_policy, set_scheduler
+from .rest import add_hook, remove_hook
+from .client import Client
 from .ipernity import *
+from .download import download_files
+from .upload import upload_files
@@ -0,0 +1,202 @@
+''' Incremental, content-addressed account backup
+
+A backup directory looks like this:
+
+    manifest.json       doc_id -> content hash and date of the file
+    objects/ab/abcd...  original files, named by the sha256 of their content
+    staging/            downloads in progress
+
+Only docs whose file was posted or replaced since the previous run are
+downloaded again (comments and metadata edits don't count), and identical
+files are stored once, so a run costs roughly the listing of the account
+plus the amount of change.
+
+Example:
+    backup = Backup('/srv/backup/john')
+    report = backup.run(user)
+    print(report)
+'''
+import os
+import json
+import hashlib
+import logging
+from .download import Downloader, FAILED
+from .ipernity import Doc, walk
+
+log = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 2
+
+# dates of a doc that change with its file, unlike comment_at or
+# modified_at (title, description, ...)
+CONTENT_DATES = ('posted_at', 'replaced_at', 'updated_at')
+
+
+def file_hash(path, chunk_size=64 * 1024):
+    ''' sha256 hex digest of a file '''
+    h = hashlib.sha256()
+    with open(path, 'rb') as fobj:
+        for chunk in iter(lambda: fobj.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def doc_modified(doc):
+    ''' latest of the doc's CONTENT_DATES as ISO string, None if doc has
+    none
+    '''
+    dates = getattr(doc, 'dates', {})
+    dates = [dates[k] for k in CONTENT_DATES
+             if hasattr(dates.get(k), 'isoformat')]
+    return max(dates).isoformat() if dates else None
+
+
+class BackupReport(object):
+    ''' statistics of a Backup run '''
+    def __init__(self):
+        self.checked = 0
+        self.changed = 0
+        self.stored = 0
+        self.deduplicated = 0
+        self.failed = []
+        self.bytes = 0
+
+    def __str__(self):
+        return ('%d docs checked, %d changed, %d stored, %d deduplicated, '
+                '%d failed, %d bytes downloaded' % (
+                    self.checked, self.changed, self.stored,
+                    self.deduplicated, len(self.failed), self.bytes))
+
+
+class Backup(object):
+    ''' content-addressed backup of the original files of an account
+
+    Parameters:
+        root: backup directory
+        downloader: Downloader used to fetch originals, optional
+        batch_size: number of changed docs downloaded between two manifest
+            saves, so an interrupted run keeps most of its progress
+    '''
+    def __init__(self, root, downloader=None, batch_size=100):
+        self.root = root
+        self.downloader = downloader or Downloader()
+        self.batch_size = batch_size
+        self.manifest_path = os.path.join(root, 'manifest.json')
+        self.staging_dir = os.path.join(root, 'staging')
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {'version': MANIFEST_VERSION, 'docs': {}}
+        with open(self.manifest_path) as fobj:
+            manifest = json.load(fobj)
+        if manifest.get('version', 1) < 2:
+            # version 1 kept the latest of all dates, comments included
+            for entry in manifest['docs'].values():
+                entry['latest'] = entry.pop('modified', None)
+            manifest['version'] = MANIFEST_VERSION
+        return manifest
+
+    def save_manifest(self):
+        ''' write the manifest atomically '''
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root)
+        tmp = self.manifest_path + '.tmp'
+        with open(tmp, 'w') as fobj:
+            json.dump(self.manifest, fobj, indent=1, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    def object_path(self, digest, ext=''):
+        ''' path of an object relative to the backup root '''
+        name = digest + ('.' + ext if ext else '')
+        return os.path.join('objects', digest[:2], name)
+
+    def changed(self, doc):
+        ''' True if doc is not backed up or its file changed '''
+        entry = self.manifest['docs'].get(str(doc.id))
+        if entry is None:
+            return True
+        modified = doc_modified(doc)
+        if 'latest' in entry:
+            # entry of a version 1 manifest: the file dates were <= latest
+            latest = entry['latest']
+            return modified is None or latest is None or modified > latest
+        return entry.get('modified') != modified
+
+    def run(self, user, **kwargs):
+        ''' back up all docs of user, return BackupReport
+
+        Additional keyword arguments are passed to Doc.getList.
+        '''
+        kwargs['user_id'] = getattr(user, 'id', user)
+        extra = set(kwargs.pop('extra', '').split(',')) | {'dates',
+                                                           'original'}
+        kwargs['extra'] = ','.join(sorted(e for e in extra if e))
+        report = BackupReport()
+        batch = []
+        for doc in walk(Doc.getList, **kwargs):
+            report.checked += 1
+            if not self.changed(doc):
+                continue
+            report.changed += 1
+            batch.append(doc)
+            if len(batch) >= self.batch_size:
+                self._store(batch, report)
+                batch = []
+        if batch:
+            self._store(batch, report)
+        # partial downloads of failed docs stay for the next run
+        try:
+            os.rmdir(self.staging_dir)
+        except OSError:
+            pass
+        log.info('Backup of %s done: %s', self.root, report)
+        return report
+
+    def _original(self, doc):
+        original = getattr(doc, 'original', None)
+        if original is None:
+            # doc.getList did not include the original, ask for it
+            original = doc.getMedias()['original']
+        return original
+
+    def _store(self, docs, report):
+        ''' download originals of docs and move them into the object store '''
+        originals = {}
+        for doc in docs:
+            original = self._original(doc)
+            if original is None:
+                log.warning('No original available for %s', doc)
+                report.failed.append(doc)
+                continue
+            originals[id(original)] = (doc, original)
+
+        def filename(original):
+            doc = originals[id(original)][0]
+            return '%s.%s' % (doc.id, getattr(original, 'ext', 'bin'))
+
+        stats = self.downloader.download(
+            [o for _, o in originals.values()], self.staging_dir, filename)
+        report.bytes += stats.bytes
+        for result in stats.results:
+            doc, original = originals[id(result.file)]
+            if result.status == FAILED:
+                report.failed.append(doc)
+                continue
+            digest = file_hash(result.path)
+            relpath = self.object_path(digest, getattr(original, 'ext', ''))
+            dest = os.path.join(self.root, relpath)
+            if os.path.exists(dest):
+                os.remove(result.path)
+                report.deduplicated += 1
+            else:
+                if not os.path.isdir(os.path.dirname(dest)):
+                    os.makedirs(os.path.dirname(dest))
+                os.replace(result.path, dest)
+                report.stored += 1
+            self.manifest['docs'][str(doc.id)] = {
+                'hash': digest,
+                'modified': doc_modified(doc),
+                'path': relpath,
+            }
+        self.save_manifest()
@@ -0,0 +1,128 @@
+''' Circuit breaker for the API endpoint
+
+The breaker watches the outcome of the requests sent by a Transport over a
+sliding time window. When the error rate or the rate of slow calls exceeds
+its threshold the circuit opens: requests fail immediately with
+IpernityCircuitOpenError instead of waiting for a struggling server. After
+`open_for` seconds a few probe requests are let through (half-open state);
+if they succeed the circuit closes again, otherwise it reopens.
+
+Example:
+    rest.set_transport(Transport(breaker=CircuitBreaker()))
+'''
+import time
+import logging
+import threading
+from collections import deque
+from .errors import IpernityCircuitOpenError
+
+log = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitBreaker(object):
+    ''' error rate and latency based circuit breaker
+
+    Parameters:
+        failure_rate: fraction of failed requests that opens the circuit
+        slow_rate: fraction of slow requests that opens the circuit
+        slow_threshold: latency in seconds above which a request is slow
+        window: length of the sliding window in seconds
+        min_requests: minimum number of requests in the window before the
+            rates are evaluated
+        open_for: seconds the circuit stays open before probing
+        probes: number of successful probe requests needed to close
+    '''
+    def __init__(self, failure_rate=0.5, slow_rate=0.8, slow_threshold=10.0,
+                 window=30.0, min_requests=20, open_for=30.0, probes=1):
+        self.failure_rate = failure_rate
+        self.slow_rate = slow_rate
+        self.slow_threshold = slow_threshold
+        self.window = window
+        self.min_requests = min_requests
+        self.open_for = open_for
+        self.probes = probes
+        self.state = CLOSED
+        self.opened_at = None
+        self.calls = deque()  # (timestamp, failed, slow)
+        self.failures = 0
+        self.slow = 0
+        self.probing = 0
+        self.probe_successes = 0
+        # number of the current half-open phase, identifies its probes
+        self.half_opened = 0
+        self.lock = threading.Lock()
+
+    def _set_state(self, state):
+        log.warning('Circuit %s -> %s', self.state, state)
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        elif state == HALF_OPEN:
+            self.probing = self.probe_successes = 0
+            self.half_opened += 1
+        elif state == CLOSED:
+            self.calls.clear()
+            self.failures = self.slow = 0
+
+    def before(self):
+        ''' call before a request, raise IpernityCircuitOpenError if the
+        request must not be sent
+
+        Returns the probe to pass to record(), None if the request is not
+        a probe.
+        '''
+        with self.lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.open_for:
+                    raise IpernityCircuitOpenError(
+                        'Circuit open, API considered unavailable')
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self.probing >= self.probes:
+                    raise IpernityCircuitOpenError(
+                        'Circuit half-open, waiting for probe requests')
+                self.probing += 1
+                return self.half_opened
+            return None
+
+    def record(self, failed, latency, probe=None):
+        ''' record the outcome of a request sent after before()
+
+        Parameters:
+            failed: True if the request failed
+            latency: duration of the request in seconds
+            probe: what before() returned for the request
+        '''
+        with self.lock:
+            if self.state == HALF_OPEN:
+                # requests sent before the circuit opened, and probes of an
+                # earlier half-open phase, don't count
+                if probe != self.half_opened:
+                    return
+                self.probing -= 1
+                if failed or latency > self.slow_threshold:
+                    self._set_state(OPEN)
+                else:
+                    self.probe_successes += 1
+                    if self.probe_successes >= self.probes:
+                        self._set_state(CLOSED)
+                return
+            now = time.monotonic()
+            slow = latency > self.slow_threshold
+            self.calls.append((now, failed, slow))
+            self.failures += failed
+            self.slow += slow
+            while self.calls and self.calls[0][0] < now - self.window:
+                _, old_failed, old_slow = self.calls.popleft()
+                self.failures -= old_failed
+                self.slow -= old_slow
+            count = len(self.calls)
+            if self.state != CLOSED or count < self.min_requests:
+                return
+            if self.failures >= self.failure_rate * count or \
+                    self.slow >= self.slow_rate * count:
+                self._set_state(OPEN)
@@ -0,0 +1,197 @@
+''' Record and replay API traffic
+
+RecordingTransport wraps a transport and writes every request/response pair
+to a cassette; ReplayTransport answers requests from a cassette without
+network, either at full speed or with the recorded latencies:
+
+    rest.set_transport(RecordingTransport('calls.jsonl.gz'))
+    ...  # run the workload, then close the transport
+
+    rest.set_transport(ReplayTransport('calls.jsonl.gz', latency=True))
+
+A cassette has one JSON object per line and is gzip compressed if its name
+ends with .gz. Keys, tokens and signatures are scrubbed before writing,
+both from the request parameters and from the responses, so a cassette
+can be shared. Replayed requests are matched to recorded ones by method and
+scrubbed parameters; see benchmarks/replay.py to replay a cassette as a
+load test.
+'''
+import gzip
+import json
+import time
+import logging
+import threading
+import requests
+from .errors import IpernityError
+from .transport import Transport
+
+log = logging.getLogger(__name__)
+
+# parameters and response fields replaced by SCRUBBED
+SECRET_PARAMS = frozenset([
+    'api_key', 'api_sig', 'auth_token', 'frob', 'oauth_consumer_key',
+    'oauth_token', 'oauth_signature', 'oauth_nonce', 'oauth_timestamp',
+])
+SECRET_FIELDS = frozenset([
+    'token', 'secret', 'frob', 'oauth_token', 'oauth_token_secret',
+])
+SCRUBBED = '*'
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def api_method(url):
+    ''' API method of an API url (.../<method>/json) '''
+    return url.rstrip('/').split('/')[-2]
+
+
+def scrub_params(params):
+    return dict((k, SCRUBBED if k in SECRET_PARAMS else str(v))
+                for k, v in params.items())
+
+
+def scrub_data(data):
+    ''' copy of decoded JSON data without secret fields '''
+    if isinstance(data, dict):
+        return dict((k, SCRUBBED if k in SECRET_FIELDS and
+                     not isinstance(v, (dict, list)) else scrub_data(v))
+                    for k, v in data.items())
+    if isinstance(data, list):
+        return [scrub_data(v) for v in data]
+    return data
+
+
+def _scrub_body(text):
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return text
+    return json.dumps(scrub_data(data), separators=(',', ':'))
+
+
+def _key(method, params):
+    return method, json.dumps(params, sort_keys=True)
+
+
+def load(path):
+    ''' the recorded interactions of a cassette, as list of dicts with
+    keys method, post, params, status, latency, at (seconds since the
+    start of the recording) and body
+    '''
+    with _open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def make_response(status, body, url=None):
+    r = requests.Response()
+    r.status_code = status
+    r._content = body.encode('utf-8')
+    r.encoding = 'utf-8'
+    r.headers['Content-Type'] = 'application/json'
+    r.url = url
+    return r
+
+
+class RecordingTransport(object):
+    ''' transport recording requests and responses to a cassette
+
+    Parameters:
+        path: cassette file, gzip compressed if it ends with .gz
+        transport: transport sending the requests, default: a new
+            transport.Transport
+    '''
+    def __init__(self, path, transport=None):
+        self.path = path
+        self.transport = transport or Transport()
+        self.file = _open(path, 'w')
+        self.started = time.monotonic()
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def send(self, url, params, http_post=True, files=None, deadline=None):
+        started = time.monotonic()
+        r = self.transport.send(url, params, http_post=http_post,
+                                files=files, deadline=deadline)
+        latency = time.monotonic() - started
+        entry = {
+            'method': api_method(url),
+            'post': bool(http_post),
+            'params': scrub_params(params),
+            'status': r.status_code,
+            'latency': round(latency, 6),
+            'at': round(started - self.started, 6),
+            'body': _scrub_body(r.text),
+        }
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self.lock:
+            if self.file is not None:
+                self.file.write(line)
+                self.count += 1
+        return r
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+                log.info('Recorded %d requests to %s', self.count,
+                         self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ReplayTransport(object):
+    ''' transport answering requests from a cassette
+
+    A request is answered by the next unused recording with the same method
+    and (scrubbed) parameters. When all of them are used they are replayed
+    again from the first one, so a cassette can be replayed repeatedly.
+
+    Parameters:
+        path: cassette file, or a list of interactions (see load)
+        latency: if True, wait the recorded latency before answering
+        speed: with latency, divide the recorded latencies by speed
+    '''
+    def __init__(self, path, latency=False, speed=1.0):
+        interactions = load(path) if isinstance(path, str) else path
+        self.latency = latency
+        self.speed = speed
+        self.recorded = {}
+        for entry in interactions:
+            key = _key(entry['method'], entry['params'])
+            self.recorded.setdefault(key, []).append(entry)
+        self.used = {}
+        self.lock = threading.Lock()
+
+    def _next(self, method, params):
+        key = _key(method, scrub_params(params))
+        with self.lock:
+            entries = self.recorded.get(key)
+            if not entries:
+                raise IpernityError('No recorded response for %s %s' %
+                                    (method, key[1]))
+            i = self.used.get(key, 0)
+            self.used[key] = i + 1
+            return entries[i % len(entries)]
+
+    def send(self, url, params, http_post=True, files=None, deadline=None):
+        if deadline is not None:
+            deadline.check(url)
+        entry = self._next(api_method(url), params)
+        if self.latency and entry['latency']:
+            wait = entry['latency'] / self.speed
+            if deadline is not None and wait > deadline.remaining():
+                # like the capped read timeout of a real transport
+                time.sleep(deadline.remaining())
+                raise requests.exceptions.ReadTimeout(
+                    'Recorded latency of %s exceeds the deadline' % url)
+            time.sleep(wait)
+        return make_response(entry['status'], entry['body'], url)
@@ -0,0 +1,114 @@
+''' Client objects holding per tenant settings
+
+By default API keys, the auth handler and the cache are module wide
+settings (keys.set_keys, auth.set_auth_handler, rest.enable_cache). A Client
+owns its own keys, auth handler, cache, transport, rate limiter, retry and
+hedging policy and scheduler, so one process can serve many accounts from
+parallel threads:
+
+    client = Client(auth_handler=AuthHandler.load('john.auth'))
+    doc = client.Doc.get(id=12345)
+    doc.getMedias()             # still uses client
+    with client:                # everything in this block uses client
+        user = User.get(id=123)
+
+Objects created while a client is active remember it, and their API
+methods use that client later on. The active client is per thread; use
+rest.bind_client for functions handed to other threads.
+'''
+from . import rest
+from . import ipernity
+from .transport import Transport
+from .hooks import Hooks
+
+
+class _BoundClass(object):
+    ''' IpernityObject class whose methods are called with a client '''
+    def __init__(self, client, cls):
+        self._client = client
+        self._cls = cls
+
+    def __call__(self, *args, **kwargs):
+        with self._client:
+            return self._cls(*args, **kwargs)
+
+    def __getattr__(self, name):
+        attr = getattr(self._cls, name)
+        if callable(attr) and not isinstance(attr, type):
+            return rest.bind_client(attr, self._client)
+        return attr
+
+    def __repr__(self):
+        return '<%s of %r>' % (self._cls.__name__, self._client)
+
+
+class Client(object):
+    ''' settings of one API user
+
+    Parameters:
+        api_key, api_secret: API keys, default: keys.API_KEY/API_SECRET
+        auth_handler: AuthHandler for authenticated calls, optional.
+            The module wide handler is never used by a client.
+        cache: Django compliant cache object, None disables caching
+        transport: Transport, default: a new Transport with its own
+            connection pool
+        rate_limiter: ratelimit.RateLimiter, may be shared between clients
+        retry_policy: retry.RetryPolicy, None disables retries
+        hedging_policy: hedge.HedgingPolicy, None disables hedging
+        scheduler: scheduler.Scheduler, may be shared between clients
+        hooks: hooks.Hooks called for the calls of this client, in addition
+            to the module wide hooks (rest.add_hook)
+        api_url: base url of the API, default: rest.API_URL
+        lazy: convert the properties of objects created with this client
+            when they are first read, default: ipernity.LAZY (see
+            ipernity.set_lazy)
+    '''
+    def __init__(self, api_key=None, api_secret=None, auth_handler=None,
+                 cache=None, transport=None, rate_limiter=None,
+                 retry_policy=None, hedging_policy=None, scheduler=None,
+                 hooks=None, api_url=None, lazy=None):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.auth_handler = auth_handler
+        self.cache = cache
+        self.transport = transport or Transport()
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.hedging_policy = hedging_policy
+        self.scheduler = scheduler
+        self.hooks = hooks if hooks is not None else Hooks()
+        self.api_url = api_url
+        self.lazy = lazy
+        self._classes = {}
+
+    def __enter__(self):
+        rest._client_stack().append(self)
+        return self
+
+    def __exit__(self, *exc):
+        rest._client_stack().pop()
+
+    def __getattr__(self, name):
+        # client.Doc, client.User, ...
+        if name.startswith('_'):
+            raise AttributeError(name)
+        cls = getattr(ipernity, name, None)
+        if not (isinstance(cls, type)
+                and issubclass(cls, ipernity.IpernityObject)):
+            raise AttributeError(name)
+        bound = self._classes.get(name)
+        if bound is None:
+            bound = self._classes[name] = _BoundClass(self, cls)
+        return bound
+
+    def call_api(self, api_method, **kwargs):
+        ''' rest.call_api with this client '''
+        return rest.call_api(api_method, client=self, **kwargs)
+
+    def walk(self, method, per_page=100, workers=1, **kwargs):
+        ''' ipernity.walk with this client '''
+        return ipernity.walk(rest.bind_client(method, self), per_page,
+                             workers, **kwargs)
+
+    def __repr__(self):
+        return 'Client[%s]' % (self.api_key or 'default keys')
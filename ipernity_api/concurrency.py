@@ -0,0 +1,146 @@
+''' Adaptive concurrency for bulk operations
+
+An AIMDLimiter bounds the number of calls in flight and adapts the bound to
+the capacity of the API: every healthy call raises the limit additively (by
+`increase` per round of `limit` calls), an overload error or a latency spike
+cuts it multiplicatively. At most one cut is made per round trip, calls that
+were already in flight when the limit was cut don't cut it again.
+
+Bulk helpers (walk_pages, walk, Downloader, Exporter, upload_files) accept
+an AIMDLimiter wherever they accept a number of workers:
+
+    limiter = AIMDLimiter(initial=4, maximum=32)
+    for doc in walk(Doc.getList, workers=limiter, user=user):
+        ...
+'''
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from functools import wraps
+import requests
+from .errors import IpernityCircuitOpenError, IpernityTimeoutError
+from .retry import RETRY_STATUSES
+from .rest import WRAPPER_ASSIGNMENTS
+
+log = logging.getLogger(__name__)
+
+
+def overloaded(error):
+    ''' True if error is a sign of an overloaded API '''
+    if isinstance(error, requests.HTTPError):
+        response = error.response
+        return response is not None and response.status_code in RETRY_STATUSES
+    return isinstance(error, (requests.ConnectionError, requests.Timeout,
+                              IpernityCircuitOpenError, IpernityTimeoutError))
+
+
+class Slot(object):
+    ''' a call admitted by AIMDLimiter.slot, set `failed` to report an
+    overload that was not raised
+    '''
+    def __init__(self, started):
+        self.started = started
+        self.failed = False
+
+
+class AIMDLimiter(object):
+    ''' additive increase / multiplicative decrease concurrency limit
+
+    Parameters:
+        initial: initial limit
+        minimum, maximum: bounds of the limit. Thread pools driven by the
+            limiter have `maximum` threads.
+        increase: added to the limit per round of `limit` healthy calls
+        decrease: factor applied to the limit on overload
+        latency_factor: a call slower than latency_factor times the smoothed
+            latency is a latency spike
+        smoothing: weight of a new sample in the smoothed latency
+    '''
+    def __init__(self, initial=4, minimum=1, maximum=32, increase=1.0,
+                 decrease=0.5, latency_factor=2.0, smoothing=0.1):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.smoothing = smoothing
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.inflight = 0
+        self.latency = None
+        self.last_cut = 0.0
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        ''' block until a call may start, return its start time '''
+        with self.cond:
+            while self.inflight >= int(self.limit):
+                self.cond.wait()
+            self.inflight += 1
+            return time.monotonic()
+
+    def release(self, started, failed=False):
+        ''' register the end of a call started at `started` '''
+        now = time.monotonic()
+        latency = now - started
+        with self.cond:
+            self.inflight -= 1
+            spike = (self.latency is not None
+                     and latency > self.latency_factor * self.latency)
+            if not failed:
+                self.latency = latency if self.latency is None else \
+                    self.latency + self.smoothing * (latency - self.latency)
+            if failed or spike:
+                # calls started before the last cut saw the old limit
+                if started >= self.last_cut:
+                    old = self.limit
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self.last_cut = now
+                    log.info('Concurrency %s: %.1f -> %.1f',
+                             'error' if failed else 'latency spike', old,
+                             self.limit)
+            else:
+                self.limit = min(self.maximum,
+                                 self.limit + self.increase / self.limit)
+            self.cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        ''' context manager around one call, exceptions for which
+        overloaded() is True count as failures
+        '''
+        slot = Slot(self.acquire())
+        try:
+            yield slot
+        except Exception as e:
+            slot.failed = slot.failed or overloaded(e)
+            raise
+        finally:
+            self.release(slot.started, slot.failed)
+
+    def call(self, func, *args, **kwargs):
+        ''' call func within a slot '''
+        with self.slot():
+            return func(*args, **kwargs)
+
+    def __repr__(self):
+        return '<AIMDLimiter limit=%.1f inflight=%d>' % (self.limit,
+                                                         self.inflight)
+
+
+def pool_size(workers):
+    ''' number of threads for workers, a number or an AIMDLimiter '''
+    if isinstance(workers, AIMDLimiter):
+        return workers.maximum
+    return workers
+
+
+def limited(func, workers):
+    ''' func, run through workers if it is an AIMDLimiter '''
+    if not isinstance(workers, AIMDLimiter):
+        return func
+
+    @wraps(func, assigned=WRAPPER_ASSIGNMENTS)
+    def call(*args, **kwargs):
+        return workers.call(func, *args, **kwargs)
+    return call
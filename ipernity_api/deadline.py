@@ -0,0 +1,108 @@
+''' Deadlines for API calls and composite operations
+
+A Deadline is a point in time after which an operation is abandoned. Every
+wrapped API method accepts a `_deadline` argument, either a Deadline or a
+number of seconds:
+
+    doc = Doc.get(id=12345, _deadline=5)
+
+Within `with Deadline(30):` every call made by the thread shares the same
+deadline, so composite operations (pagination, Ticket.wait_done, batch
+downloads) finish or fail with IpernityTimeoutError within one overall time
+budget. Nested deadlines can only shorten the outer one. rest.bind_client
+carries the active deadline over to worker threads.
+'''
+import time
+import threading
+from .errors import IpernityTimeoutError
+
+# per thread stack of active deadlines
+_local = threading.local()
+
+
+def _stack():
+    try:
+        return _local.deadlines
+    except AttributeError:
+        _local.deadlines = []
+        return _local.deadlines
+
+
+class Deadline(object):
+    ''' absolute deadline on the monotonic clock
+
+    Parameters:
+        timeout: seconds from now
+    '''
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.expires = time.monotonic() + timeout
+
+    @classmethod
+    def coerce(cls, value):
+        ''' Deadline from a Deadline, a number of seconds or None '''
+        if value is None or isinstance(value, Deadline):
+            return value
+        return cls(value)
+
+    def remaining(self):
+        ''' seconds left, 0 once expired '''
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self):
+        return time.monotonic() >= self.expires
+
+    def check(self, what='operation'):
+        ''' raise IpernityTimeoutError if the deadline has expired '''
+        if self.expired():
+            raise IpernityTimeoutError('Deadline of %ss exceeded for %s'
+                                       % (self.timeout, what))
+
+    def cap(self, timeout, what='operation'):
+        ''' cap a requests timeout (seconds or (connect, read) tuple) to the
+        remaining time, raise IpernityTimeoutError if no time is left (the
+        deadline may expire right after check(), requests rejects a
+        timeout of 0)
+        '''
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise IpernityTimeoutError('Deadline of %ss exceeded for %s'
+                                       % (self.timeout, what))
+        if timeout is None:
+            return remaining
+        if isinstance(timeout, tuple):
+            return tuple(min(t, remaining) if t is not None else remaining
+                         for t in timeout)
+        return min(timeout, remaining)
+
+    def __enter__(self):
+        _stack().append(self)
+        return self
+
+    def __exit__(self, *exc):
+        _stack().pop()
+
+    def __repr__(self):
+        return '<Deadline %.3fs left of %ss>' % (self.remaining(),
+                                                 self.timeout)
+
+
+def current_deadline():
+    ''' the earliest deadline active in this thread, None if there is none '''
+    stack = _stack()
+    return earliest(*stack) if stack else None
+
+
+def earliest(*deadlines):
+    ''' the earliest of the given deadlines, ignoring None '''
+    deadlines = [d for d in deadlines if d is not None]
+    if not deadlines:
+        return None
+    return min(deadlines, key=lambda d: d.expires)
+
+
+def resolve(value=None):
+    ''' effective deadline: value (Deadline or seconds) combined with the
+    deadlines active in this thread
+    '''
+    return earliest(Deadline.coerce(value), current_deadline())
@@ -0,0 +1,260 @@
+''' Parallel downloader for Thumb, Media and Original files
+
+Files are fetched concurrently over a pooled ``requests.Session`` and
+streamed to disk in chunks. Partially downloaded files are kept with a
+``.part`` suffix and resumed with HTTP Range requests, files already present
+with the expected size are skipped.
+
+Example:
+    medias = doc.getMedias()
+    stats = download_files([medias['original']] + medias['thumbs'], 'out')
+    print(stats)
+'''
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from .errors import IpernityTimeoutError
+from .deadline import resolve
+from .concurrency import AIMDLimiter, pool_size, overloaded
+
+log = logging.getLogger(__name__)
+
+PART_SUFFIX = '.part'
+
+# status values of DownloadResult
+DOWNLOADED = 'downloaded'
+RESUMED = 'resumed'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+
+def default_filename(file):
+    ''' destination file name for a File: the last part of its url '''
+    url = file.url.split('?', 1)[0]
+    return url.rstrip('/').rsplit('/', 1)[-1]
+
+
+class DownloadResult(object):
+    ''' outcome of a single file download
+
+    Attributes:
+        file: the File object
+        path: local destination path
+        status: one of DOWNLOADED, RESUMED, SKIPPED or FAILED
+        bytes: number of bytes transferred for this file
+        error: exception if status is FAILED, otherwise None
+    '''
+    def __init__(self, file, path, status, bytes=0, error=None):
+        self.file = file
+        self.path = path
+        self.status = status
+        self.bytes = bytes
+        self.error = error
+
+    def __repr__(self):
+        return 'DownloadResult[%s %s %s]' % (self.status, self.path,
+                                             self.bytes)
+
+
+class DownloadStats(object):
+    ''' aggregated result of a Downloader run '''
+    def __init__(self):
+        self.results = []
+        self.started = time.time()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def add(self, result):
+        with self._lock:
+            self.results.append(result)
+
+    def count(self, status):
+        return len([r for r in self.results if r.status == status])
+
+    @property
+    def bytes(self):
+        ''' total bytes transferred '''
+        return sum([r.bytes for r in self.results])
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def throughput(self):
+        ''' aggregate throughput in bytes per second '''
+        elapsed = self.elapsed
+        return self.bytes / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def failed(self):
+        return [r for r in self.results if r.status == FAILED]
+
+    def __str__(self):
+        return ('%d files (%d downloaded, %d resumed, %d skipped, '
+                '%d failed), %d bytes in %.2fs, %.1f KiB/s' % (
+                    len(self.results), self.count(DOWNLOADED),
+                    self.count(RESUMED), self.count(SKIPPED),
+                    self.count(FAILED), self.bytes, self.elapsed,
+                    self.throughput / 1024))
+
+
+class Downloader(object):
+    ''' concurrent downloader for File objects (Thumb, Media, Original)
+
+    Parameters:
+        workers: number of concurrent downloads, or a
+            concurrency.AIMDLimiter. Also the connection pool size.
+        chunk_size: size of chunks streamed to disk
+        session: optional requests.Session to use
+        timeout: timeout passed to requests, seconds or a (connect, read)
+            tuple
+        filename: function mapping a File to a file name relative to
+            the destination directory, default: last part of the url
+    '''
+    def __init__(self, workers=4, chunk_size=64 * 1024, session=None,
+                 timeout=60, filename=default_filename):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.filename = filename
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size(workers),
+                                  pool_maxsize=pool_size(workers))
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+
+    def download(self, files, dest_dir, filename=None, deadline=None):
+        ''' download files into dest_dir, return DownloadStats
+
+        filename optionally overrides the file naming function for this run.
+        deadline (seconds or deadline.Deadline) bounds the whole run: files
+        not finished in time fail with IpernityTimeoutError, partial files
+        are kept for resuming.
+        '''
+        filename = filename or self.filename
+        deadline = resolve(deadline)
+        if not os.path.isdir(dest_dir):
+            os.makedirs(dest_dir)
+        stats = DownloadStats()
+
+        limiter = self.workers
+        if not isinstance(limiter, AIMDLimiter):
+            limiter = None
+
+        def job(file):
+            try:
+                path = os.path.join(dest_dir, filename(file))
+            except Exception as e:
+                # e.g. a File without url, fails alone
+                log.warning('No file name for %r: %s', file, e)
+                stats.add(DownloadResult(file, None, FAILED, error=e))
+                return
+            if limiter is None:
+                stats.add(self.fetch(file, path, deadline))
+                return
+            with limiter.slot() as slot:
+                result = self.fetch(file, path, deadline)
+                slot.failed = (result.error is not None
+                               and overloaded(result.error))
+            stats.add(result)
+
+        with ThreadPoolExecutor(max_workers=pool_size(self.workers)) \
+                as executor:
+            # consume the iterator so worker exceptions are raised here
+            list(executor.map(job, files))
+        stats.finished = time.time()
+        log.debug('Download finished: %s', stats)
+        return stats
+
+    def fetch(self, file, path, deadline=None):
+        ''' download a single file to path, return DownloadResult '''
+        try:
+            if deadline is not None:
+                deadline.check(file.url)
+            return self._fetch(file, path, deadline)
+        except (requests.RequestException, IOError,
+                IpernityTimeoutError) as e:
+            log.warning('Download of %s failed: %s', file.url, e)
+            return DownloadResult(file, path, FAILED, error=e)
+
+    def _timeout(self, deadline):
+        if deadline is None:
+            return self.timeout
+        return deadline.cap(self.timeout, 'download')
+
+    def _remote_size(self, file, deadline=None):
+        size = getattr(file, 'bytes', None)
+        if size is None:
+            r = self.session.head(file.url, allow_redirects=True,
+                                  timeout=self._timeout(deadline))
+            r.raise_for_status()
+            size = r.headers.get('Content-Length')
+        return int(size) if size is not None else None
+
+    def _complete_size(self, file, r, deadline=None):
+        ''' expected size of a file answered with 416, None if unknown '''
+        size = self._remote_size(file, deadline)
+        if size is None:
+            # Content-Range: bytes */<complete length>
+            total = r.headers.get('Content-Range', '').rsplit('/', 1)[-1]
+            size = int(total) if total.isdigit() else None
+        return size
+
+    def _fetch(self, file, path, deadline=None):
+        if os.path.exists(path):
+            # a file of unknown size may be truncated, download it again
+            size = self._remote_size(file, deadline)
+            if size is not None and os.path.getsize(path) == size:
+                log.debug('Skipping %s, already present', path)
+                return DownloadResult(file, path, SKIPPED)
+
+        part = path + PART_SUFFIX
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        headers = {'Range': 'bytes=%d-' % offset} if offset else {}
+        r = self.session.get(file.url, headers=headers, stream=True,
+                             timeout=self._timeout(deadline))
+        corrupt = False
+        try:
+            if offset and r.status_code == 416:
+                # range not satisfiable: the partial file is complete,
+                # unless it does not have the expected size
+                corrupt = self._complete_size(file, r, deadline) != offset
+                status, mode = RESUMED, None
+            elif offset and r.status_code == 206:
+                status, mode = RESUMED, 'ab'
+            else:
+                # no partial file or server ignored the Range header
+                r.raise_for_status()
+                status, mode = DOWNLOADED, 'wb'
+            transferred = 0
+            if mode:
+                with open(part, mode) as fobj:
+                    for chunk in r.iter_content(self.chunk_size):
+                        fobj.write(chunk)
+                        transferred += len(chunk)
+                        if deadline is not None:
+                            deadline.check(file.url)
+        finally:
+            r.close()
+        if corrupt:
+            log.warning('Discarding %s, not of the expected size', part)
+            os.remove(part)
+            return self._fetch(file, path, deadline)
+        os.replace(part, path)
+        log.debug('Downloaded %s (%s, %d bytes)', path, status, transferred)
+        return DownloadResult(file, path, status, transferred)
+
+
+def download_files(files, dest_dir, deadline=None, **kwargs):
+    ''' download File objects concurrently into dest_dir
+
+    Keyword arguments are passed to Downloader. Returns DownloadStats.
+    '''
+    return Downloader(**kwargs).download(files, dest_dir, deadline=deadline)
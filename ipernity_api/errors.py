@@ -25,3 +25,17 @@ class IpernityAPIError(IpernityError):
         IpernityError.__init__(self, "%i : %s" % (code, message))
         self.code = code
         self.message = message
+
+
+class IpernityCircuitOpenError(IpernityError):
+    """ Raised without sending the request while the circuit breaker
+    considers the API unavailable, see breaker.CircuitBreaker
+    """
+    pass
+
+
+class IpernityTimeoutError(IpernityError):
+    """ Raised when the deadline of a call or composite operation expires,
+    see deadline.Deadline
+    """
+    pass
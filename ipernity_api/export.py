@@ -0,0 +1,169 @@
+''' Streaming JSONL export of accounts, albums, folders and groups
+
+Every record is written to the output as soon as it is decoded, so memory
+use only depends on the page size and fetch concurrency, not on the size of
+the account. Each line is a JSON object:
+
+    {"type": "doc", "data": {...}}
+    {"type": "comment", "doc_id": "123", "data": {...}}
+
+Example:
+    with JSONLWriter('john.jsonl.gz') as writer:
+        Exporter(writer, workers=4).export_user(user)
+'''
+import io
+import gzip
+import json
+import datetime
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import UserList
+from .rest import bind_client
+from .concurrency import pool_size, limited
+from .ipernity import (IpernityObject, Doc, Album, Folder, Group, Comment,
+                       walk, walk_pages)
+
+log = logging.getLogger(__name__)
+
+
+def serialize(value):
+    ''' convert IpernityObjects, IpernityLists and dates to JSON data '''
+    if isinstance(value, IpernityObject):
+        return dict((k, serialize(v)) for k, v in value._asdict().items())
+    elif isinstance(value, dict):
+        return dict((k, serialize(v)) for k, v in value.items())
+    elif isinstance(value, (list, tuple, UserList)):
+        return [serialize(v) for v in value]
+    elif isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+class JSONLWriter(object):
+    ''' thread-safe JSON lines writer
+
+    Parameters:
+        output: file name or binary file object
+        compress: gzip the output. Default: True if output is a file name
+            ending with '.gz'
+    '''
+    def __init__(self, output, compress=None):
+        if isinstance(output, str):
+            if compress is None:
+                compress = output.endswith('.gz')
+            self._raw = open(output, 'wb')
+        else:
+            self._raw = output
+        self._stream = (gzip.GzipFile(fileobj=self._raw, mode='wb')
+                        if compress else None)
+        self._out = io.TextIOWrapper(self._stream or self._raw,
+                                     encoding='utf-8')
+        self._owned = isinstance(output, str)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def write(self, type, data, **extra):
+        ''' write one record '''
+        record = {'type': type}
+        record.update(extra)
+        record['data'] = serialize(data)
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._out.write(line)
+            self._out.write('\n')
+            self.count += 1
+
+    def close(self):
+        self._out.flush()
+        self._out.detach()
+        if self._stream:
+            self._stream.close()
+        if self._owned:
+            self._raw.close()
+        else:
+            self._raw.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Exporter(object):
+    ''' walk an account and write its objects to a JSONLWriter
+
+    Parameters:
+        writer: JSONLWriter
+        workers: number of concurrent API calls, for page fetches and for
+            comments/tags of docs
+        per_page: page size for list methods
+        comments, tags: export comments and tags of each doc
+    '''
+    def __init__(self, writer, workers=4, per_page=100, comments=True,
+                 tags=True):
+        self.writer = writer
+        self.workers = workers
+        self.per_page = per_page
+        self.comments = comments
+        self.tags = tags
+
+    def _write_pages(self, type, method, **kwargs):
+        for page in walk_pages(method, self.per_page, self.workers,
+                               **kwargs):
+            for elem in page:
+                self.writer.write(type, elem)
+            yield page
+
+    def export_doc_details(self, doc):
+        ''' write comments and tags of doc '''
+        if self.comments:
+            for comment in walk(Comment.getList, self.per_page, doc=doc):
+                self.writer.write('comment', comment, doc_id=doc.id)
+        if self.tags:
+            for tag in doc.tags_getList():
+                self.writer.write('tag', tag, doc_id=doc.id)
+
+    def export_docs(self, user, extra='dates,count,geo,original'):
+        ''' write docs of user together with their comments and tags '''
+        pages = self._write_pages('doc', Doc.getList,
+                                  user_id=getattr(user, 'id', user),
+                                  extra=extra)
+        if not (self.comments or self.tags):
+            for _ in pages:
+                pass
+            return
+        # details are fetched while the next pages are loaded, at most
+        # 2 * workers docs are queued at any time
+        size = pool_size(self.workers)
+        slots = threading.BoundedSemaphore(size * 2)
+        pending = set()
+        details = limited(bind_client(self.export_doc_details), self.workers)
+        with ThreadPoolExecutor(max_workers=size) as executor:
+            for page in pages:
+                for doc in page:
+                    slots.acquire()
+                    future = executor.submit(details, doc)
+                    future.add_done_callback(lambda f: slots.release())
+                    pending.add(future)
+                for future in [f for f in pending if f.done()]:
+                    pending.discard(future)
+                    future.result()
+            for future in pending:
+                future.result()
+
+    def export_user(self, user, docs=True):
+        ''' write user, albums, folders, groups and docs of user '''
+        user_id = getattr(user, 'id', user)
+        if isinstance(user, IpernityObject):
+            self.writer.write('user', user)
+        for type, method in [('album', Album.getList),
+                             ('folder', Folder.getList),
+                             ('group', Group.getList)]:
+            for _ in self._write_pages(type, method, user_id=user_id):
+                pass
+        if docs:
+            self.export_docs(user_id)
+        log.info('Exported %d records of user %s', self.writer.count,
+                 user_id)
@@ -0,0 +1,182 @@
+''' Request hedging for read methods
+
+Slow requests of read methods are hedged: if a call has not returned after
+the observed latency percentile of its method (p95 by default), a duplicate
+request is sent, if a worker is free. The call returns the first successful
+response of the two, so one slow server or connection doesn't make the
+whole call slow. Extra requests are limited by a budget relative to the
+number of calls (see retry.RetryBudget), so hedging can't double the load
+on a slow API.
+
+Example:
+    rest.set_hedging_policy(HedgingPolicy(methods=['doc.get', 'user.get']))
+'''
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .retry import RetryBudget
+from .methodinfo import is_read_method
+
+log = logging.getLogger(__name__)
+
+
+class LatencyWindow(object):
+    ''' latencies of the last `size` calls of a method '''
+    def __init__(self, size=1000):
+        self.samples = deque(maxlen=size)
+        self.added = 0
+        self.cached = {}
+        self.lock = threading.Lock()
+
+    def add(self, latency):
+        with self.lock:
+            self.samples.append(latency)
+            self.added += 1
+
+    def percentile(self, q):
+        ''' latency percentile q (0..1), None without samples
+
+        The sorted window is recomputed after every 5% of new samples.
+        '''
+        with self.lock:
+            count = len(self.samples)
+            if not count:
+                return None
+            value, added = self.cached.get(q, (None, None))
+            if added is None or \
+                    self.added - added >= max(1, self.samples.maxlen // 20):
+                ordered = sorted(self.samples)
+                value = ordered[min(count - 1, int(q * count))]
+                self.cached[q] = (value, self.added)
+            return value
+
+
+class HedgingPolicy(object):
+    ''' hedged requests for read methods
+
+    Once a method has enough latency samples, the request of a call and
+    its hedge, the duplicate request, are sent from thread pools as peers,
+    while the calling thread waits for the first successful response; the
+    other request is abandoned. Both pools are bounded and never queue: a
+    call without a free worker is sent from the calling thread unhedged,
+    and a hedge without a free worker is skipped, so a busy pool never
+    delays calls.
+
+    Parameters:
+        percentile: latency percentile after which a call is hedged
+        min_samples: calls of a method observed before hedging it
+        max_extra: hedged requests allowed per call, e.g. 0.05 for 5%
+        methods: API methods to hedge, default: all read methods
+        window: number of latencies kept per method
+        workers: number of hedges in flight at most
+        calls: number of hedgeable calls in flight at most
+    '''
+    def __init__(self, percentile=0.95, min_samples=20, max_extra=0.05,
+                 methods=None, window=1000, workers=32, calls=256):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.methods = frozenset(methods) if methods is not None else None
+        self.window = window
+        self.budget = RetryBudget(ratio=max_extra, min_per_second=0,
+                                  max_tokens=10)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.free = threading.Semaphore(workers)
+        self.calls = ThreadPoolExecutor(max_workers=calls)
+        self.calls_free = threading.Semaphore(calls)
+        self.latencies = {}
+        self.hedged = 0
+        self.skipped = 0
+        self.lock = threading.Lock()
+
+    def hedgeable(self, api_method):
+        if self.methods is not None:
+            return api_method in self.methods
+        return is_read_method(api_method)
+
+    def _window(self, api_method):
+        with self.lock:
+            window = self.latencies.get(api_method)
+            if window is None:
+                window = self.latencies[api_method] = \
+                    LatencyWindow(self.window)
+            return window
+
+    def delay(self, api_method):
+        ''' seconds after which a call of api_method is hedged, None if
+        there are not enough samples yet
+        '''
+        window = self._window(api_method)
+        if len(window.samples) < self.min_samples:
+            return None
+        return window.percentile(self.percentile)
+
+    def _timed(self, api_method, func):
+        ''' call func(), recording its latency if it succeeds '''
+        started = time.monotonic()
+        result = func()
+        self._window(api_method).add(time.monotonic() - started)
+        return result
+
+    def _send(self, free, executor, api_method, func):
+        ''' send func() from a worker of executor, holding a slot of free,
+        and return its future
+        '''
+        def send():
+            try:
+                return self._timed(api_method, func)
+            finally:
+                free.release()
+        return executor.submit(send)
+
+    def _hedge(self, api_method, func):
+        ''' send a hedge, return its future, or None if there is no free
+        worker or no budget
+        '''
+        if not self.free.acquire(blocking=False):
+            with self.lock:
+                self.skipped += 1
+            log.debug('No free worker to hedge %s', api_method)
+            return None
+        if not self.budget.withdraw():
+            self.free.release()
+            return None
+        log.debug('Hedging %s', api_method)
+        with self.lock:
+            self.hedged += 1
+        return self._send(self.free, self.executor, api_method, func)
+
+    def call(self, api_method, func):
+        ''' call func(), hedged if api_method is slow '''
+        if not self.hedgeable(api_method):
+            return func()
+        self.budget.deposit()
+        delay = self.delay(api_method)
+        if delay is None:
+            return self._timed(api_method, func)
+        if not self.calls_free.acquire(blocking=False):
+            with self.lock:
+                self.skipped += 1
+            log.debug('No free worker to send %s hedged', api_method)
+            return self._timed(api_method, func)
+        primary = self._send(self.calls_free, self.calls, api_method, func)
+        if wait([primary], timeout=delay).done:
+            return primary.result()
+        hedge = self._hedge(api_method, func)
+        if hedge is None:
+            return primary.result()
+        pending = set([primary, hedge])
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                # the other request is abandoned: it finishes in its worker
+                # and its response is dropped
+                if future.exception() is None:
+                    return future.result()
+        # both failed, raise the error of the call's own request
+        return primary.result()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+        self.calls.shutdown(wait=False)
@@ -0,0 +1,156 @@
+''' Instrumentation hooks for API calls
+
+Hook functions are called with a CallInfo at four points of every call:
+
+    before_request: the request is signed and about to be sent
+    after_response: the HTTP response arrived (or the transport failed)
+    after_decode: the JSON response is decoded and checked
+    after_format: the wrapped method converted the response to objects
+
+A retried or hedged call fires before_request, after_response and
+after_decode for every attempt, each with a CallInfo of its own; the
+CallInfo of after_format is the one of the call, holding the data of the
+attempt that returned the response. CallInfo.timings holds the duration of
+each phase in seconds, measured with time.perf_counter:
+
+    sign: signing the request (api_sig or OAuth)
+    wait: scheduler and rate limiter
+    request: transport, or cache lookup
+    decode: JSON decoding
+    format: conversion to IpernityObjects
+
+Example:
+    def log_slow(info):
+        if info.total > 1:
+            print(info.api_method, info.timings, info.response_bytes)
+    add_hook('after_format', log_slow)
+
+Exceptions raised by hooks are logged and otherwise ignored.
+'''
+import logging
+import threading
+from time import perf_counter
+
+log = logging.getLogger(__name__)
+
+EVENTS = ('before_request', 'after_response', 'after_decode', 'after_format')
+
+# CallInfo.cache values
+HIT = 'hit'
+MISS = 'miss'
+
+
+class Hooks(object):
+    ''' hook functions by event '''
+    def __init__(self):
+        self.hooks = dict((event, []) for event in EVENTS)
+
+    def add(self, event, func):
+        ''' call func(info) on event '''
+        if event not in self.hooks:
+            raise ValueError('Unknown hook event %s' % event)
+        self.hooks[event].append(func)
+
+    def remove(self, event, func):
+        self.hooks[event].remove(func)
+
+    def __bool__(self):
+        return any(self.hooks.values())
+
+
+class CallInfo(object):
+    ''' what hooks know about a call
+
+    Attributes:
+        api_method: Ipernity method name
+        url, http_post: API url and HTTP method
+        params: request parameters of the attempt, with signature
+        attempt: number of the attempt, starting at 1
+        cache: HIT, MISS, or None if the response can't be cached
+        status: HTTP status, None if the transport failed
+        request_bytes, response_bytes: payload sizes, None if unknown
+        error: exception of the current phase, None on success
+        error_code: Ipernity error code of an API error
+        timings: dict of phase -> seconds
+        result: decoded JSON (after_decode) or formatted result
+            (after_format)
+    '''
+    def __init__(self, api_method):
+        self.api_method = api_method
+        self.url = None
+        self.http_post = None
+        self.params = None
+        self.attempt = 0
+        self.cache = None
+        self.status = None
+        self.request_bytes = None
+        self.response_bytes = None
+        self.error = None
+        self.error_code = None
+        self.result = None
+        self.timings = {}
+        self.hooks = ()
+        self.started = self._last = perf_counter()
+        self._lock = threading.Lock()
+        self._attempts = 0
+        self._succeeded = False
+
+    def new_attempt(self):
+        ''' CallInfo for the next attempt of the call
+
+        Attempts may run at the same time (hedging), so each one is filled
+        in on its own CallInfo and merged into the call's with merge().
+        '''
+        with self._lock:
+            self._attempts += 1
+            attempt = self._attempts
+        info = CallInfo(self.api_method)
+        info.url = self.url
+        info.http_post = self.http_post
+        info.hooks = self.hooks
+        info.attempt = attempt
+        info.started = self.started
+        return info
+
+    def merge(self, attempt, succeeded):
+        ''' take over the data of a finished attempt
+
+        The first successful attempt wins; until then the last failed one
+        is kept.
+        '''
+        with self._lock:
+            if self._succeeded:
+                return
+            self._succeeded = succeeded
+            for name in ('params', 'attempt', 'cache', 'status',
+                         'request_bytes', 'response_bytes', 'error',
+                         'error_code', 'result'):
+                setattr(self, name, getattr(attempt, name))
+            self.timings = dict(attempt.timings)
+
+    def start(self):
+        ''' start timing a phase sequence (a new attempt) '''
+        self._last = perf_counter()
+
+    def mark(self, phase):
+        ''' record the time since the last mark as duration of phase '''
+        now = perf_counter()
+        self.timings[phase] = now - self._last
+        self._last = now
+
+    @property
+    def total(self):
+        ''' seconds since the call started '''
+        return perf_counter() - self.started
+
+    def fire(self, event):
+        for hooks in self.hooks:
+            for func in hooks.hooks[event]:
+                try:
+                    func(self)
+                except Exception:
+                    log.exception('Hook %r for %s failed', func, event)
+
+    def __repr__(self):
+        return '<CallInfo %s attempt %d %s>' % (self.api_method, self.attempt,
+                                                self.timings)
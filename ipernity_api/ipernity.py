@@ -1,9 +1,13 @@
 import datetime
 import time
-import re
-from collections import UserList
-from .errors import IpernityError
-from .reflection import call, static_call, AutoDoc
+from collections import UserList, deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from .errors import IpernityError, IpernityTimeoutError
+from .rest import current_client, bind_client
+from .deadline import Deadline, resolve, earliest
+from .concurrency import pool_size, limited
+from .reflection import call, static_call, with_client
 
 
 class IpernityList(UserList):
@@ -18,8 +22,140 @@ class IpernityList(UserList):
         return '%s:%s' % (repr(self.info), repr(self.data))
 
 
+def walk_pages(method, per_page=100, workers=1, **kwargs):
+    ''' iterate over the pages (IpernityList) of a paged list method
+
+    parameters:
+        method: a method returning IpernityList, e.g. Doc.getList
+            or album.docs_getList
+        per_page: number of elements fetched per call
+        workers: number of pages fetched concurrently, or a
+            concurrency.AIMDLimiter. At most this many (the limiter's
+            maximum) pages are held in memory; pages are yielded in order.
+        **kwargs: parameters passed to method. `_deadline` is one overall
+            deadline for all pages.
+    '''
+    deadline = resolve(kwargs.pop('_deadline', None))
+    if deadline is not None:
+        kwargs['_deadline'] = deadline
+    # pages may be fetched in other threads, keep the current client
+    method = limited(bind_client(method), workers)
+    first = method(page=1, per_page=per_page, **kwargs)
+    yield first
+    pages = int((first.info or {}).get('pages', 1))
+    if not first or pages < 2:
+        return
+    size = pool_size(workers)
+    with ThreadPoolExecutor(max_workers=size) as executor:
+        pending = deque()
+        for page in range(2, pages + 1):
+            pending.append(executor.submit(method, page=page,
+                                           per_page=per_page, **kwargs))
+            if len(pending) >= size:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def walk(method, per_page=100, workers=1, **kwargs):
+    ''' iterate over every element of a paged list method
+
+    parameters: see walk_pages
+
+    Example:
+        for doc in walk(Doc.getList, user=user, extra='dates'):
+            ...
+    '''
+    for page in walk_pages(method, per_page, workers, **kwargs):
+        for elem in page:
+            yield elem
+
+
+# convert properties on first access, see set_lazy
+LAZY = False
+
+
+def set_lazy(lazy=True):
+    ''' keep the raw values of properties that need a conversion (dates,
+    counts, nested objects, ...) and convert each one when it is first
+    read, for objects created without a client or with a client that does
+    not set lazy itself. Jobs reading only a few properties, like ids,
+    skip most of the conversion work.
+    '''
+    global LAZY
+    LAZY = lazy
+
+
+def _chain(funcs):
+    ''' apply the convertors funcs of a key in turn '''
+    def convert(val):
+        for func in funcs:
+            try:
+                val = func(val)
+            except KeyError:
+                pass
+        return val
+    return convert
+
+
+def _compile_props(cls):
+    ''' function converting the properties of a cls instance in place,
+    as described by cls.__convertors__, __replace__ and __id__
+
+    Only the keys present in the properties are looked at. A KeyError
+    raised by a convertor keeps the value unconverted.
+
+    With lazy, the properties to convert or replace are removed instead
+    and returned separately, as dict name -> (func, raw value); the id
+    properties are always converted.
+    '''
+    convert = {}
+    for keys, func in cls.__convertors__:
+        for k in keys:
+            convert.setdefault(k, []).append(func)
+    convert = dict((k, funcs[0] if len(funcs) == 1 else _chain(funcs))
+                   for k, funcs in convert.items())
+    replace = list(cls.__replace__)
+    replace_keys = frozenset(old for old, new, func in replace)
+    idname = cls.__id__
+    idkeys = frozenset(['id', idname])
+    deferred = dict((k, func) for k, func in convert.items()
+                    if k not in idkeys)
+
+    def props(params, lazy=False):
+        if lazy:
+            pending = dict((k, (deferred[k], params.pop(k)))
+                           for k in deferred.keys() & params.keys())
+        if convert:
+            for k, val in params.items():
+                func = convert.get(k)
+                if func is not None:
+                    try:
+                        params[k] = func(val)
+                    except KeyError:
+                        pass
+        if replace_keys and not replace_keys.isdisjoint(params):
+            for old, new, func in replace:
+                if old in params:
+                    val = params.pop(old)
+                    if lazy and new not in idkeys:
+                        params.pop(new, None)
+                        pending[new] = (func, val)
+                        continue
+                    try:
+                        params[new] = func(val)
+                    except KeyError:
+                        pass
+        if idname:
+            idval = params.get('id') or params.get(idname)
+            params['id'] = params[idname] = idval
+        if lazy:
+            return params, pending
+        return params
+    return props
+
+
 class IpernityObject(object):
-    __metaclass__ = AutoDoc
     # convertors is a list of tuple ([attr1, attr2, ...], conv_func)
     __convertors__ = []
     # replace is a list consist of (oldname, newname, conv_func)
@@ -29,11 +165,67 @@ class IpernityObject(object):
     # attr name represent object's id in ipernity.com, e,g photo_id, user_id
     # if present, will add a filed that call 'id'
     __id__ = ''
+    # Client active when the object was created, see client.Client
+    _client = None
+    # converts the properties of an instance, compiled from __convertors__,
+    # __replace__ and __id__ when the class is defined
+    _props = None
+    # High volume classes keep their known properties in __slots__, other
+    # properties go to the instance __dict__, which is only allocated for
+    # them. _slots holds the slot names of the class and its bases.
+    _slots = frozenset()
+    # lazy objects: properties not converted yet, name -> (func, raw value)
+    _raw = None
 
     def __init__(self, **params):
-        self._set_props(**params)
+        client = current_client()
+        # unset _client and _raw slots would hide the class attributes
+        if self._slots:
+            self._client = client
+            self._raw = None
+        elif client is not None:
+            self._client = client
+        if client is None or client.lazy is None:
+            lazy = LAZY
+        else:
+            lazy = client.lazy
+        if lazy:
+            params, self._raw = self._props(params, True)
+            self._update(params)
+        else:
+            self._set_props(**params)
+
+    def __getattr__(self, name):
+        # only called for missing attributes: convert a raw property
+        raw = None if name.startswith('_') else self._raw
+        # a single lookup: another thread may convert and pop name
+        entry = raw.get(name) if raw else None
+        if entry is not None:
+            func, val = entry
+            try:
+                if self._client is None:
+                    val = func(val)
+                else:
+                    # nested objects belong to the client of the object
+                    with self._client:
+                        val = func(val)
+            except KeyError:
+                pass
+            setattr(self, name, val)
+            raw.pop(name, None)
+            return val
+        # AttributeError, or the value set by another thread meanwhile
+        return object.__getattribute__(self, name)
 
     def __getitem__(self, key):
+        if isinstance(key, str) and key.startswith('_'):
+            # _client, _raw, ...: not properties
+            raise KeyError(key)
+        if key in self._slots or (self._raw and key in self._raw):
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
         return self.__dict__[key]
 
     def __setitem__(self, key, value):
@@ -48,27 +240,39 @@ class IpernityObject(object):
                          filter(lambda a: hasattr(self, a), fields)])
         return '%s[%s]' % (clsname, info)
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._props = staticmethod(_compile_props(cls))
+        cls._slots = frozenset(
+            name for c in cls.__mro__
+            for name in c.__dict__.get('__slots__', ()))
+
     def _set_props(self, **params):
-        # implemnet of __convertors__
-        for keys, func in self.__class__.__convertors__:
-            for k in keys:
-                try:
-                    params[k] = func(params[k])
-                except KeyError:
-                    pass
-        # implement of __replace__
-        for old, new, func in self.__class__.__replace__:
-            try:
-                val = params.pop(old)
-                params[new] = func(val)
-            except KeyError:
-                pass
-        # implement __id__ mechanism
-        idname = self.__class__.__id__
-        if idname:
-            idval = params.get('id') or params.get(idname)
-            params['id'] = params[idname] = idval
-        self.__dict__.update(params)
+        params = self._props(params)
+        if self._raw:
+            # refreshed properties replace the raw ones
+            for k in params:
+                self._raw.pop(k, None)
+        self._update(params)
+
+    def _update(self, params):
+        if self._slots:
+            for k, v in params.items():
+                setattr(self, k, v)
+        else:
+            self.__dict__.update(params)
+
+    def _asdict(self):
+        ''' the properties of the object as dict '''
+        for k in list(self._raw or ()):
+            getattr(self, k)
+        props = dict((k, getattr(self, k)) for k in self._slots
+                     if hasattr(self, k))
+        props.update(self.__dict__)
+        return dict((k, v) for k, v in props.items() if not k.startswith('_'))
+
+
+IpernityObject._props = staticmethod(_compile_props(IpernityObject))
 
 
 def _extract(name):
@@ -106,19 +310,76 @@ def _dict_conv(conv_func):
     return convert
 
 
-def _ts2datetime(ts):
-    regexp = r'\d\d\d\d-\d\d-\d\d \d\d:\d\d:\d\d'
+# _parse_ts results of distinct timestamps: dates repeat a lot (pages of
+# docs posted the same day, '0'). A full memo takes no new values. Looking
+# up a timestamp costs more than a hit saves when few values repeat, so the
+# hit rate is checked every _TS_MEMO_MISSES misses: below 1/8, the memo is
+# cleared and skipped for the next _TS_MEMO_SKIP calls.
+_TS_MEMO = {}
+_TS_MEMO_SIZE = 4096
+_TS_MEMO_MISSES = 65536
+_TS_MEMO_SKIP = 1000000
+_ts_memo_hits = 0
+_ts_memo_misses = 0
+_ts_memo_skip = 0  # calls left without memo
+_MISSING = object()
+
+
+def _parse_ts(ts):
+    ''' convert an epoch timestamp or 'YYYY-MM-DD HH:MM:SS' to datetime
+
+    Other strings are kept, empty strings and invalid dates give None.
+    '''
     if ts.isdigit():
         return datetime.datetime.fromtimestamp(int(ts))
-    elif re.match(regexp, ts):
+    if (len(ts) >= 19 and ts[4] == '-' and ts[7] == '-' and ts[10] == ' '
+            and ts[13] == ':' and ts[16] == ':' and
+            (ts[:4] + ts[5:7] + ts[8:10] + ts[11:13] + ts[14:16] +
+             ts[17:19]).isdecimal()):
+        if len(ts) > 19 or not ts.isascii():
+            return None
         try:
-            return datetime.datetime.strptime(ts, '%Y-%m-%d %H:%M:%S')
+            return datetime.datetime(int(ts[:4]), int(ts[5:7]),
+                                     int(ts[8:10]), int(ts[11:13]),
+                                     int(ts[14:16]), int(ts[17:19]))
         except ValueError:
-            # timestamp might be '0000-00-00 00:00:00',
-            # and will raise ValueError
+            # timestamp might be '0000-00-00 00:00:00'
             return None
-    else:
-        return ts or None
+    return ts or None
+
+
+def _ts2datetime(ts):
+    ''' _parse_ts, memoized '''
+    global _ts_memo_hits, _ts_memo_misses, _ts_memo_skip
+    if _ts_memo_skip:
+        _ts_memo_skip -= 1
+        return _parse_ts(ts)
+    value = _TS_MEMO.get(ts, _MISSING)
+    if value is not _MISSING:
+        _ts_memo_hits += 1
+        return value
+    value = _parse_ts(ts)
+    if len(_TS_MEMO) < _TS_MEMO_SIZE:
+        _TS_MEMO[ts] = value
+    _ts_memo_misses += 1
+    if _ts_memo_misses >= _TS_MEMO_MISSES:
+        if _ts_memo_hits * 7 < _ts_memo_misses:
+            _TS_MEMO.clear()
+            _ts_memo_skip = _TS_MEMO_SKIP
+        _ts_memo_hits = _ts_memo_misses = 0
+    return value
+
+
+def _ts2datetime_page(items, keys):
+    ''' _ts2datetime for the keys of all dicts in items, e.g. the visits of
+    a page, in one pass
+    '''
+    conv = _ts2datetime
+    for item in items:
+        for k in keys:
+            if k in item:
+                item[k] = conv(item[k])
+    return items
 
 
 def _replaceid(kwargs, idname):
@@ -225,20 +486,19 @@ _format_result_tags = _resp2ilist('tag', _dict_mapping_func([('count', int),
 
 def _format_result_visitors(resp):
     info = resp['visits']
-    mapping = [
-        ('visited_at', _ts2datetime),
-        ('first_visit_at', _ts2datetime),
-        ('visits', int),
-    ]
+    dates = ('visited_at', 'first_visit_at')
+    mapping = [(k, _ts2datetime) for k in dates] + [('visits', int)]
 
     def conv_visit(visit):
         uid = visit.pop('user_id')
         uname = visit.pop('username')
-        visit = _dict_mapping(visit, mapping)
+        if 'visits' in visit:
+            visit['visits'] = int(visit['visits'])
         visit['user'] = User(id=uid, username=uname)
         return visit
 
-    visits = [conv_visit(v) for v in info.pop('visit', [])]
+    visits = [conv_visit(v)
+              for v in _ts2datetime_page(info.pop('visit', []), dates)]
     if 'anonymous' in info:
         info['anonymous'] = _dict_mapping(info['anonymous'], mapping)
     info = _dict_str2int(info)
@@ -412,6 +672,9 @@ class Auth(IpernityObject):
 
 
 class Comment(IpernityObject):
+    __slots__ = ('id', 'comment_id', 'user', 'parent', 'username', 'content',
+                 'link', 'posted_at', 'modified_at', 'candelete', 'canedit',
+                 'canreply', '_client', '_raw')
     __id__ = 'comment_id'
     __convertors__ = [
         (['posted_at'], _ts2datetime),
@@ -451,6 +714,11 @@ class Comment(IpernityObject):
 
 
 class Doc(IpernityObject):
+    __slots__ = ('id', 'doc_id', 'media', 'license', 'rotation', 'title',
+                 'safety', 'link', 'owner', 'description', 'dates',
+                 'visibility', 'permissions', 'count', 'can', 'you',
+                 'thumbs', 'thumb', 'medias', 'original', 'w', 'h', 'geo',
+                 'tags', 'notes', 'index', '_client', '_raw')
     __id__ = 'doc_id'
     __display__ = ['id', 'title']
     __convertors__ = [
@@ -562,6 +830,7 @@ class Doc(IpernityObject):
     def getVisitors(self, **kwargs):
         return kwargs, _format_result_visitors
 
+    @with_client
     def replace(self, file, async_=False):
         ''' replace doc with new file '''
         tk = Upload.replace(doc=self, file=file, async_=async_)
@@ -584,6 +853,12 @@ class Doc(IpernityObject):
                 date = kwargs[k]
                 kwargs[k] = (date.strftime(tformat)
                              if isinstance(date, datetime.datetime) else date)
+        # posted_* are timestamps
+        for k in ['posted_min', 'posted_max']:
+            if k in kwargs:
+                date = kwargs[k]
+                kwargs[k] = (int(date.timestamp())
+                             if isinstance(date, datetime.datetime) else date)
         return kwargs, _format_result_docs
 
     @call('doc.set')
@@ -603,10 +878,12 @@ class Doc(IpernityObject):
         return kwargs, _none
 
     # comments
+    @with_client
     def comments_add(self, **kwargs):
         ''' Add a comment to the doc '''
         return Comment.add(doc=self, **kwargs)
 
+    @with_client
     def comments_getList(self, **kwargs):
         ''' Get comments asssociated with the doc '''
         return Comment.getList(doc=self, **kwargs)
@@ -695,6 +972,8 @@ class Faves(IpernityObject):
 
 
 class File(IpernityObject):
+    __slots__ = ('label', 'ext', 'w', 'h', 'url', 'secret', 'bytes', 'length',
+                 'filename', 'type', '_client', '_raw')
     __display__ = ['label', 'url']
     __convertors__ = [
         (['w', 'h', 'lehgth', 'bytes'], int),
@@ -702,19 +981,19 @@ class File(IpernityObject):
 
 
 class Thumb(File):
-    pass
+    __slots__ = ()
 
 
 class Media(File):
-    pass
+    __slots__ = ()
 
 
 class Original(File):
-    pass
+    __slots__ = ()
 
 
 class Player(File):
-    pass
+    __slots__ = ()
 
 
 class Folder(IpernityObject):
@@ -920,6 +1199,8 @@ class Note(IpernityObject):
 
 
 class Tag(IpernityObject):
+    __slots__ = ('id', 'tag', 'type', 'user', 'added_at', 'docs', 'posts',
+                 'title', 'keyword', 'member_id', 'tag_id', '_client', '_raw')
     __id__ = 'id'
     __display__ = ['id', 'tag']
     __convertors__ = [
@@ -965,6 +1246,7 @@ class Ticket(IpernityObject):
         ('doc_id', 'doc', lambda id: Doc(id=id)),
     ]
 
+    @with_client
     def refresh(self):
         ''' refresh the ticket '''
         new = Upload.checkTickets(tickets=[self])[0]
@@ -976,31 +1258,47 @@ class Ticket(IpernityObject):
             meta['doc_id'] = new.doc.id
         return self._set_props(**meta)
 
-    def wait_done(self, timeout=100):
+    @with_client
+    def wait_done(self, timeout=100, _deadline=None):
         ''' wait upload done
 
         parameters:
             timeout: optional timeout to specified max wait time, default 100s
+            _deadline: optional overall deadline (seconds or Deadline),
+                also applied to the checkTickets calls
         '''
         if getattr(self, 'invalid', False):
             raise IpernityError('Ticket: %s Invalid' % self)
 
-        left = timeout
-        while not getattr(self, 'done', False) and left > 0:
-            # wait upload complete
-            # first time, Ticket only init with id, not 'eta' field provide
-            eta = getattr(self, 'eta', 0)
-            left -= eta
-            time.sleep(eta)
-            self.refresh()
+        outer = resolve(_deadline)
+        deadline = earliest(Deadline(timeout), outer)
+        with deadline:
+            while not getattr(self, 'done', False) and not deadline.expired():
+                # wait upload complete
+                # first time, Ticket only init with id, not 'eta' field
+                # provide. eta is an estimate, so wait at most until the
+                # deadline.
+                eta = getattr(self, 'eta', 0)
+                time.sleep(min(eta, deadline.remaining()))
+                if not deadline.expired():
+                    self.refresh()
+        if not getattr(self, 'done', False) and \
+                (outer is None or not outer.expired()):
+            # the upload may have finished during the last wait: check once
+            # more, within the caller's deadline only
+            with outer or nullcontext():
+                self.refresh()
         if not getattr(self, 'done', False):
-            raise IpernityError('Timeout for wait done after %ss' % timeout)
+            raise IpernityTimeoutError('Timeout for wait done after %ss'
+                                       % deadline.timeout)
 
-    def getDoc(self):
+    @with_client
+    def getDoc(self, _deadline=None):
         ''' get the Doc from the uploaded ticket '''
-        self.wait_done()
+        deadline = resolve(_deadline)
+        self.wait_done(_deadline=deadline)
         doc_id = self.doc.id
-        return Doc.get(id=doc_id)
+        return Doc.get(id=doc_id, _deadline=deadline)
 
 
 class Upload(IpernityObject):
@@ -1025,6 +1323,9 @@ class Upload(IpernityObject):
 
 
 class User(IpernityObject):
+    __slots__ = ('id', 'user_id', 'username', 'realname', 'alias', 'icon',
+                 'link', 'is_pro', 'is_online', 'is_closed', 'tmo', 'relation',
+                 'location', 'count', 'dates', '_client', '_raw')
     __id__ = 'user_id'
     __display__ = ['id', 'username']
     __convertors__ = [
@@ -1038,26 +1339,32 @@ class User(IpernityObject):
         kwargs = _replaceid(kwargs, User.__id__)
         return kwargs, lambda r: User(**r['user'])
 
+    @with_client
     def getAlbums(self, **kwargs):
         ''' get Albums of user '''
         return Album.getList(user=self, **kwargs)
 
+    @with_client
     def getDocs(self, **kwargs):
         ''' get Docs of user '''
         return Doc.getList(user=self, **kwargs)
 
+    @with_client
     def getFolders(self, **kwargs):
         ''' get Folders of user '''
         return Folder.getList(user=self, **kwargs)
 
+    @with_client
     def getGroups(self, **kwargs):
         ''' get Groups of user '''
         return Group.getList(user=self, **kwargs)
 
+    @with_client
     def getNetworks(self, **kwargs):
         ''' get Networks of user '''
         return Network.getList(user=self, **kwargs)
 
+    @with_client
     def getPopularTags(self, type='keyword', **kwargs):
         ''' get Popular Tags of user '''
         return Tag.user_getPopular(user=self, type=type, **kwargs)
@@ -1066,6 +1373,7 @@ class User(IpernityObject):
     def getQuota(**kwargs):
         return kwargs, lambda r: Quota(**r['quota'])
 
+    @with_client
     def getTags(self, type='keyword', **kwargs):
         ''' get Tags of user '''
         return Tag.user_getList(user=self, type=type, **kwargs)
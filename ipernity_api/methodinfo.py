@@ -0,0 +1,83 @@
+''' Access to the API method metadata
+
+The call path only needs the authentication flags and the required
+parameters of a method. They are kept in a compact table (methods_index,
+generated from methods.py) which is loaded on import. The complete
+descriptions in methods.py (titles, parameter descriptions, sample
+responses) are only loaded when describe() or all_methods() is called,
+e.g. to build docstrings.
+
+After changing methods.py, regenerate the index with:
+
+    python -m ipernity_api.methodinfo
+'''
+import os
+from .methods_index import METHODS
+
+# fields of a METHODS entry
+TOKEN, POST, SIGN, REQUIRED = range(4)
+
+INDEX_FILE = os.path.join(os.path.dirname(__file__), 'methods_index.py')
+
+INDEX_HEADER = '''\
+# Generated from methods.py by "python -m ipernity_api.methodinfo",
+# do not edit. method name -> (token, post, sign, required parameters)
+'''
+
+
+def exists(api_method):
+    return api_method in METHODS
+
+
+def auth_info(api_method):
+    ''' authentication flags of api_method as dict (token, post, sign) '''
+    entry = METHODS[api_method]
+    return {'token': entry[TOKEN], 'post': entry[POST], 'sign': entry[SIGN]}
+
+
+def required_params(api_method):
+    ''' required parameters of api_method, without api_key '''
+    return list(METHODS[api_method][REQUIRED])
+
+
+def is_read_method(api_method):
+    ''' True if api_method is a read method (does not require HTTP POST) '''
+    entry = METHODS.get(api_method)
+    return entry is not None and not entry[POST]
+
+
+def all_methods():
+    ''' the complete method metadata of methods.py, loaded on first use '''
+    from .methods import __methods__
+    return __methods__
+
+
+def describe(api_method):
+    ''' the complete metadata of api_method, see all_methods '''
+    return all_methods()[api_method]
+
+
+def index_entry(info):
+    ''' METHODS entry for the methods.py metadata info '''
+    auth = info['authentication']
+    required = tuple(sorted(
+        p['name'] for p in info.get('parameters', [])
+        if p.get('required', 0) and p['name'] != 'api_key'))
+    return (int(auth['token']), int(auth['post']), int(auth['sign']),
+            required)
+
+
+def build_index(methods=None):
+    ''' source of methods_index.py for methods (default: all_methods()) '''
+    import pprint
+    methods = methods if methods is not None else all_methods()
+    index = dict((str(name), index_entry(info))
+                 for name, info in methods.items())
+    return '%sMETHODS = %s\n' % (INDEX_HEADER,
+                                 pprint.pformat(index, width=79))
+
+
+if __name__ == '__main__':
+    with open(INDEX_FILE, 'w') as f:
+        f.write(build_index())
+    print('Wrote %s' % INDEX_FILE)
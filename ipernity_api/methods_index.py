@@ -0,0 +1,90 @@
+# Generated from methods.py by "python -m ipernity_api.methodinfo",
+# do not edit. method name -> (token, post, sign, required parameters)
+METHODS = {'account.getQuota': (1, 0, 1, ()),
+ 'album.create': (1, 1, 1, ('title',)),
+ 'album.delete': (1, 1, 1, ('album_id',)),
+ 'album.docs.add': (1, 1, 1, ('album_id', 'doc_id')),
+ 'album.docs.getContext': (0, 0, 0, ('album_id', 'doc_id')),
+ 'album.docs.getList': (0, 0, 0, ('album_id',)),
+ 'album.docs.remove': (1, 1, 1, ('album_id', 'doc_id')),
+ 'album.docs.setList': (1, 1, 1, ('album_id', 'cover_id', 'doc_ids')),
+ 'album.edit': (1, 1, 1, ('album_id',)),
+ 'album.get': (0, 0, 0, ('album_id',)),
+ 'album.getFaves': (0, 0, 0, ('album_id',)),
+ 'album.getList': (0, 0, 0, ()),
+ 'album.getVisitors': (1, 0, 1, ('album_id',)),
+ 'album.orderList': (1, 1, 1, ('album_ids',)),
+ 'album.setPerms': (1, 1, 1, ('album_id', 'perm_comment')),
+ 'api.methods.get': (0, 0, 0, ()),
+ 'api.methods.getList': (0, 0, 0, ()),
+ 'auth.checkToken': (1, 0, 1, ('auth_token',)),
+ 'auth.getFrob': (0, 0, 1, ()),
+ 'auth.getToken': (0, 0, 1, ('frob',)),
+ 'doc.checkMD5': (1, 0, 1, ('md5',)),
+ 'doc.comments.add': (1, 1, 1, ('content', 'doc_id')),
+ 'doc.comments.delete': (1, 1, 1, ('comment_id',)),
+ 'doc.comments.edit': (1, 1, 1, ('comment_id', 'content')),
+ 'doc.comments.get': (0, 0, 0, ('comment_id',)),
+ 'doc.comments.getList': (0, 0, 0, ('doc_id',)),
+ 'doc.comments.reply': (1, 1, 1, ('comment_id', 'content')),
+ 'doc.delete': (1, 1, 1, ('doc_id',)),
+ 'doc.get': (0, 0, 0, ('doc_id',)),
+ 'doc.getContainers': (0, 0, 0, ('doc_id',)),
+ 'doc.getContext': (0, 0, 0, ('doc_id',)),
+ 'doc.getFaves': (0, 0, 0, ('doc_id',)),
+ 'doc.getList': (0, 0, 0, ('user_id',)),
+ 'doc.getMedias': (0, 0, 0, ('doc_id',)),
+ 'doc.getPerms': (1, 0, 1, ('doc_id',)),
+ 'doc.getVisitors': (1, 0, 1, ('doc_id',)),
+ 'doc.notes.add': (1, 1, 1, ('content', 'doc_id', 'h', 'w', 'x', 'y')),
+ 'doc.notes.delete': (1, 1, 1, ('note_id',)),
+ 'doc.notes.edit': (1, 1, 1, ('content', 'h', 'note_id', 'w', 'x', 'y')),
+ 'doc.search': (0, 0, 0, ()),
+ 'doc.set': (1, 1, 1, ('doc_id',)),
+ 'doc.setGeo': (1, 1, 1, ('doc_id',)),
+ 'doc.setLicense': (1, 1, 1, ('doc_id', 'license')),
+ 'doc.setPerms': (1, 1, 1, ('doc_id',)),
+ 'doc.tags.add': (1, 1, 1, ('doc_id',)),
+ 'doc.tags.edit': (1, 1, 1, ('doc_id',)),
+ 'doc.tags.getList': (0, 0, 0, ('doc_id',)),
+ 'doc.tags.remove': (1, 1, 1, ('doc_id', 'id', 'type')),
+ 'explore.docs.getPopular': (0, 0, 0, ()),
+ 'explore.docs.getRecent': (0, 0, 0, ()),
+ 'explore.docs.homepage': (0, 0, 0, ()),
+ 'explore.groups.getRandom': (0, 0, 0, ()),
+ 'faves.albums.add': (1, 1, 1, ()),
+ 'faves.albums.getList': (0, 0, 0, ('user_id',)),
+ 'faves.albums.remove': (1, 1, 1, ()),
+ 'faves.docs.add': (1, 1, 1, ()),
+ 'faves.docs.getList': (0, 0, 0, ('user_id',)),
+ 'faves.docs.remove': (1, 1, 1, ()),
+ 'folder.albums.add': (1, 1, 1, ('album_id', 'folder_id')),
+ 'folder.albums.getList': (0, 0, 0, ('folder_id',)),
+ 'folder.albums.remove': (1, 1, 1, ('album_id', 'folder_id')),
+ 'folder.create': (1, 1, 1, ('title',)),
+ 'folder.delete': (1, 1, 1, ('folder_id',)),
+ 'folder.edit': (1, 1, 1, ('folder_id',)),
+ 'folder.get': (0, 0, 0, ('folder_id',)),
+ 'folder.getList': (0, 0, 0, ()),
+ 'folder.orderList': (1, 1, 1, ('folder_ids',)),
+ 'group.docs.add': (1, 1, 1, ('doc_id', 'group_id')),
+ 'group.docs.getContext': (0, 0, 0, ('doc_id', 'group_id')),
+ 'group.docs.getList': (0, 0, 0, ('group_id',)),
+ 'group.docs.remove': (1, 1, 1, ('doc_id', 'group_id')),
+ 'group.get': (0, 0, 0, ('group_id',)),
+ 'group.getList': (0, 0, 0, ()),
+ 'group.search': (0, 0, 0, ()),
+ 'network.autocomplete': (1, 0, 1, ('query',)),
+ 'network.docs.getRecent': (1, 0, 1, ()),
+ 'network.getList': (0, 0, 0, ()),
+ 'post.getFaves': (0, 0, 0, ('post_id',)),
+ 'post.getVisitors': (1, 0, 1, ('post_id',)),
+ 'tags.docs.getList': (0, 0, 0, ('id', 'type')),
+ 'tags.user.getList': (0, 0, 0, ('type', 'user_id')),
+ 'tags.user.getPopular': (0, 0, 0, ('type', 'user_id')),
+ 'test.echo': (0, 0, 0, ('echo',)),
+ 'test.hello': (0, 0, 0, ()),
+ 'upload.checkTickets': (1, 0, 1, ('tickets',)),
+ 'upload.file': (1, 1, 1, ('file',)),
+ 'upload.replace': (1, 1, 1, ('file',)),
+ 'user.get': (0, 0, 1, ('user_id',))}
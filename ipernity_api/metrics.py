@@ -0,0 +1,220 @@
+''' Call metrics in the Prometheus text format
+
+A Registry holds counters and latency histograms, filled by hooks (see
+hooks) once it is installed:
+
+    registry = Registry()
+    registry.install()              # module wide hooks, or a Client's hooks
+    server = serve(registry, 9100)  # http://localhost:9100/metrics
+
+Metrics:
+    ipernity_requests_total{method,status,cache}: HTTP requests sent or
+        answered from the cache, status "error" if the transport failed
+    ipernity_api_errors_total{method,code}: Ipernity API errors
+    ipernity_response_bytes_total{method}: size of the responses
+    ipernity_request_duration_seconds{method}: histogram of the time spent
+        in the transport
+    ipernity_call_duration_seconds{method}: histogram of the time of
+        wrapped method calls, including retries and formatting
+'''
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from . import rest
+from .hooks import HIT
+
+log = logging.getLogger(__name__)
+
+# upper bounds of the latency buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+           30.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (k, _escape(v)) for k, v in pairs)
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class Counter(object):
+    ''' counter with labels '''
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, *labels):
+        return self.values.get(labels, 0)
+
+    def render(self):
+        with self.lock:
+            values = sorted(self.values.items())
+        return ['%s%s %s' % (self.name, _labels(self.labels, key),
+                             _number(value)) for key, value in values]
+
+
+class Histogram(object):
+    ''' histogram with labels and fixed buckets '''
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}  # labels -> [bucket counts, sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self.lock:
+            data = self.values.get(labels)
+            if data is None:
+                data = self.values[labels] = [[0] * len(self.buckets), 0.0,
+                                              0]
+            i = bisect.bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                data[0][i] += 1
+            data[1] += value
+            data[2] += 1
+
+    def count(self, *labels):
+        data = self.values.get(labels)
+        return data[2] if data else 0
+
+    def render(self):
+        with self.lock:
+            values = sorted((k, (list(v[0]), v[1], v[2]))
+                            for k, v in self.values.items())
+        lines = []
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append('%s_bucket%s %d' % (
+                    self.name, _labels(self.labels, key,
+                                       [('le', _number(float(bound)))]),
+                    cumulative))
+            lines.append('%s_bucket%s %d' % (
+                self.name, _labels(self.labels, key, [('le', '+Inf')]),
+                count))
+            lines.append('%s_sum%s %s' % (self.name,
+                                          _labels(self.labels, key),
+                                          _number(total)))
+            lines.append('%s_count%s %d' % (self.name,
+                                            _labels(self.labels, key), count))
+        return lines
+
+
+class Registry(object):
+    ''' the metrics of API calls '''
+    def __init__(self, buckets=BUCKETS):
+        self.requests = Counter(
+            'ipernity_requests_total', 'HTTP requests by method, status '
+            'and cache outcome', ['method', 'status', 'cache'])
+        self.errors = Counter(
+            'ipernity_api_errors_total', 'Ipernity API errors by method '
+            'and error code', ['method', 'code'])
+        self.response_bytes = Counter(
+            'ipernity_response_bytes_total', 'Size of API responses',
+            ['method'])
+        self.request_duration = Histogram(
+            'ipernity_request_duration_seconds', 'Time spent in the '
+            'transport', ['method'], buckets)
+        self.call_duration = Histogram(
+            'ipernity_call_duration_seconds', 'Duration of API method calls',
+            ['method'], buckets)
+        self.metrics = [self.requests, self.errors, self.response_bytes,
+                        self.request_duration, self.call_duration]
+
+    def after_response(self, info):
+        status = 'error' if info.status is None else str(info.status)
+        self.requests.inc(info.api_method, status, info.cache or 'none')
+        if info.response_bytes:
+            self.response_bytes.inc(info.api_method,
+                                    amount=info.response_bytes)
+        if 'request' in info.timings and info.cache != HIT:
+            self.request_duration.observe(info.timings['request'],
+                                          info.api_method)
+
+    def after_decode(self, info):
+        if info.error_code is not None:
+            self.errors.inc(info.api_method, info.error_code)
+
+    def after_format(self, info):
+        self.call_duration.observe(info.total, info.api_method)
+
+    def install(self, hooks=None):
+        ''' register the hooks filling this registry
+
+        hooks: hooks.Hooks, e.g. Client.hooks, default: module wide hooks
+        '''
+        hooks = hooks if hooks is not None else rest.HOOKS
+        for event in ['after_response', 'after_decode', 'after_format']:
+            hooks.add(event, getattr(self, event))
+
+    def uninstall(self, hooks=None):
+        hooks = hooks if hooks is not None else rest.HOOKS
+        for event in ['after_response', 'after_decode', 'after_format']:
+            hooks.remove(event, getattr(self, event))
+
+    def render(self):
+        ''' metrics in the Prometheus text exposition format '''
+        lines = []
+        for metric in self.metrics:
+            lines.append('# HELP %s %s' % (metric.name, metric.help))
+            lines.append('# TYPE %s %s' % (metric.name, metric.type))
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def serve(registry, port=9100, addr=''):
+    ''' serve registry on http://addr:port/metrics from a daemon thread
+
+    Returns the server, call its shutdown() method to stop it.
+    '''
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            log.debug(format, *args)
+
+    server = ThreadingHTTPServer((addr, port), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    log.info('Serving metrics on port %d', server.server_address[1])
+    return server
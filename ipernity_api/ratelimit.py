@@ -0,0 +1,157 @@
+''' Client side rate limiting with token buckets
+
+A RateLimiter keeps one token bucket per API key. Every request takes one
+token (or the weight configured for its method), and blocks until enough
+tokens are available. Buckets are thread-safe; with a state file, buckets
+are kept in a SQLite database and shared by all processes on the host.
+
+Example:
+    # 5 requests per second, bursts of 10, shared by all workers
+    rest.set_rate_limiter(RateLimiter(5, burst=10,
+                                      path='/tmp/ipernity-rate.db'))
+'''
+import time
+import sqlite3
+import logging
+import threading
+from .errors import IpernityTimeoutError
+
+log = logging.getLogger(__name__)
+
+
+class TokenBucket(object):
+    ''' in-process token bucket
+
+    Parameters:
+        rate: tokens added per second
+        burst: bucket size, default: rate
+    '''
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, n=1):
+        ''' take n tokens
+
+        Returns 0 on success, otherwise the number of seconds to wait
+        before enough tokens are available.
+        '''
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= n:
+                self.tokens -= n
+                return 0
+            return (n - self.tokens) / self.rate
+
+
+class SharedTokenBucket(object):
+    ''' token bucket stored in a SQLite database, shared between processes
+
+    Parameters:
+        path: database file
+        key: name of the bucket in the database
+        rate, burst: see TokenBucket
+    '''
+    def __init__(self, path, key, rate, burst=None):
+        self.path = path
+        self.key = key
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self.local = threading.local()
+        conn = self._conn()
+        conn.execute('CREATE TABLE IF NOT EXISTS buckets '
+                     '(key TEXT PRIMARY KEY, tokens REAL, updated REAL)')
+
+    def _conn(self):
+        # sqlite connections can't be shared between threads
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30,
+                                   isolation_level=None)
+            self.local.conn = conn
+        return conn
+
+    def take(self, n=1):
+        ''' see TokenBucket.take '''
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            row = conn.execute('SELECT tokens, updated FROM buckets '
+                               'WHERE key = ?', (self.key,)).fetchone()
+            tokens, updated = row if row else (self.burst, now)
+            tokens = min(self.burst,
+                         tokens + max(0, now - updated) * self.rate)
+            if tokens >= n:
+                tokens -= n
+                wait = 0
+            else:
+                wait = (n - tokens) / self.rate
+            conn.execute('INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)',
+                         (self.key, tokens, now))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return wait
+
+
+class RateLimiter(object):
+    ''' token bucket rate limiter, one bucket per API key
+
+    Parameters:
+        rate: requests per second per API key
+        burst: bucket size, default: rate
+        weights: dict of API method -> number of tokens, default weight is 1
+        path: SQLite file to share the buckets between processes,
+            default: buckets are local to the process
+    '''
+    def __init__(self, rate, burst=None, weights=None, path=None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.weights = weights or {}
+        self.path = path
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, api_key):
+        with self.lock:
+            bucket = self.buckets.get(api_key)
+            if bucket is None:
+                if self.path:
+                    bucket = SharedTokenBucket(self.path, api_key, self.rate,
+                                               self.burst)
+                else:
+                    bucket = TokenBucket(self.rate, self.burst)
+                self.buckets[api_key] = bucket
+            return bucket
+
+    def acquire(self, api_key, api_method=None, deadline=None):
+        ''' block until a request of api_method may be sent
+
+        Returns the number of seconds waited. Raises IpernityTimeoutError
+        if the wait would exceed deadline (deadline.Deadline, optional).
+        '''
+        # a weight larger than the bucket could never be satisfied
+        n = min(self.weights.get(api_method, 1), self.burst)
+        bucket = self.bucket(api_key)
+        waited = 0
+        while True:
+            wait = bucket.take(n)
+            if not wait:
+                if waited:
+                    log.debug('Rate limited %s for %.3fs', api_method,
+                              waited)
+                return waited
+            if deadline is not None and wait > deadline.remaining():
+                raise IpernityTimeoutError(
+                    'Rate limit wait for %s exceeds the deadline'
+                    % api_method)
+            time.sleep(wait)
+            waited += wait
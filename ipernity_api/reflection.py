@@ -1,21 +1,37 @@
+import types
 import logging
 from functools import wraps, partial
-from .methods import __methods__
+from . import methodinfo
 from .errors import IpernityError
-from .rest import call_api
+from .rest import call_api, current_client
+from .hooks import CallInfo
 
 log = logging.getLogger(__name__)
 
-def _required_params(info):
-    params = info.get('parameters', [])
-    requires = [p['name'] for p in
-                filter(lambda p: bool(p.get('required', 0)), params)]
-    # api_key would be handled in rest
-    try:
-        requires.remove('api_key')
-    except ValueError:
-        pass
-    return requires
+def _format(info, format_result, resp):
+    ''' format_result(resp), timed for the after_format hooks '''
+    info.start()
+    res = format_result(resp)
+    info.mark('format')
+    info.result = res
+    info.fire('after_format')
+    return res
+
+
+def with_client(func):
+    ''' decorator for instance methods: run with the Client of the object
+
+    IpernityObjects created while a Client is active keep it in `_client`,
+    so later calls on the object use the same client.
+    '''
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        client = getattr(self, '_client', None)
+        if client is None or client is current_client():
+            return func(self, *args, **kwargs)
+        with client:
+            return func(self, *args, **kwargs)
+    return wrapper
 
 
 def call(api_method):
@@ -33,18 +49,19 @@ def call(api_method):
     * return value of decorated function:
         api json resonpse will be decoded by "format_result" function
         and return to caller.
+    * the decorated function accepts a `_deadline` keyword (seconds or
+        deadline.Deadline), passed to rest.call_api.
     '''
     # use two level decorator here:
     # level 1: "call" to accept decorator paramter 'api_method'
     # level 2: "decorator" is the real decorator to accept function, this
     # decorator will finally return the wrapper functon "wrapper".
     def decorator(func):
-        try:
-            info = __methods__[api_method]
-        except KeyError:
+        if not methodinfo.exists(api_method):
             raise IpernityError('Method %s not found' % api_method)
-        requires = _required_params(info)
-        auth_info = info['authentication']
+        # api_key would be handled in rest
+        requires = methodinfo.required_params(api_method)
+        auth_info = methodinfo.auth_info(api_method)
         # partial object for this api call
         request = partial(call_api, api_method,
                           authed=auth_info['token'],
@@ -52,7 +69,9 @@ def call(api_method):
                           signed=auth_info['sign'])
 
         @wraps(func)
+        @with_client
         def wrapper(self, *args, **kwargs):
+            deadline = kwargs.pop('_deadline', None)
             params, format_result = func(self, *args, **kwargs)
             # IpernityObject.__id__ handling
             idname = getattr(self.__class__, '__id__', None)
@@ -63,22 +82,54 @@ def call(api_method):
                 raise IpernityError('parameters missing, required: %s'
                                     % ', '.join(requires))
             log.debug('Calling API method %s', api_method)
-            resp = request(**params)
-            res = format_result(resp)
+            info = CallInfo(api_method)
+            resp = request(deadline=deadline, call_info=info, **params)
+            res = _format(info, format_result, resp)
             log.debug('Call returned %s', res)
             return res
-        wrapper.ipernity_method = api_method
-        wrapper.static = False
-        return wrapper
+        return ApiMethod(wrapper, api_method, False)
 
     return decorator
 
 
-class StaticCaller(staticmethod):
-    def __init__(self, func):
-        staticmethod.__init__(self, func)
-        self.__dict__ = func.__dict__
-        self.inner_func = func
+class ApiMethod(object):
+    # wrapper of an API method call whose docstring is built from the
+    # method metadata on first access of __doc__ (e.g. by help()). Static
+    # methods are not bound to instances.
+    def __init__(self, func, api_method, static):
+        self.func = func
+        self.ipernity_method = api_method
+        self.static = static
+        self.ignore_params = ['api_key']
+        self._doc = None
+        self.__name__ = func.__name__
+        self.__qualname__ = func.__qualname__
+        self.__module__ = func.__module__
+        self.__wrapped__ = func
+
+    def __set_name__(self, owner, name):
+        # the id parameter of instance methods is set from the object
+        idname = getattr(owner, '__id__', None)
+        if idname and not self.static:
+            self.ignore_params.append(idname)
+
+    @property
+    def __doc__(self):
+        if self._doc is None:
+            self._doc = method_doc(self.ipernity_method, self.ignore_params,
+                                   self.func.__doc__)
+        return self._doc
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def __get__(self, obj, objtype=None):
+        if obj is None or self.static:
+            return self
+        return types.MethodType(self, obj)
+
+    def __repr__(self):
+        return '<API method %s %s>' % (self.ipernity_method, self.__qualname__)
 
 
 def static_call(api_method):
@@ -88,12 +139,11 @@ def static_call(api_method):
     '''
 
     def decorator(func):
-        try:
-            info = __methods__[api_method]
-        except KeyError:
+        if not methodinfo.exists(api_method):
             raise IpernityError('Method %s not found' % api_method)
-        requires = _required_params(info)
-        auth_info = info['authentication']
+        # api_key would be handled in rest
+        requires = methodinfo.required_params(api_method)
+        auth_info = methodinfo.auth_info(api_method)
         # partial object for this api call
         request = partial(call_api, api_method,
                           authed=auth_info['token'],
@@ -102,24 +152,32 @@ def static_call(api_method):
 
         @wraps(func)
         def wrapper(*args, **kwargs):
+            deadline = kwargs.pop('_deadline', None)
             params, format_result = func(*args, **kwargs)
             # required parameters checking
             if not all([p in params for p in requires]):
                 raise IpernityError('parameters missing, required: %s'
                                     % ','.join(requires))
             log.debug('Calling (static) API method %s', api_method)
-            resp = request(**params)
-            res = format_result(resp)
+            info = CallInfo(api_method)
+            resp = request(deadline=deadline, call_info=info, **params)
+            res = _format(info, format_result, resp)
             log.debug('Call returned %s', res)
             return res
-        wrapper.ipernity_method = api_method
-        wrapper.static = True
-        return StaticCaller(wrapper)
+        return ApiMethod(wrapper, api_method, True)
 
     return decorator
 
 
-def method_doc(method, ignore_params=[]):
+def method_doc(method, ignore_params=(), doc_prefix=None):
+    ''' docstring of API method, built from the method metadata
+
+    Parameters:
+        method: API method name
+        ignore_params: parameters left out
+        doc_prefix: text put in front, e.g. the docstring of the wrapped
+            function
+    '''
     doc = '''
     API: %(method)s
     Description: %(desc)s
@@ -127,12 +185,12 @@ def method_doc(method, ignore_params=[]):
     Permission: %(perms)s
     %(params)s
     '''
-    info = __methods__[method]
+    info = methodinfo.describe(method)
     desc = info['title']
     # resp = info['response']
     auth = 'Required' if info['authentication']['token'] else 'No Need'
     perms = ','.join(['%s:%s' % (k, v)
-                      for k, v in info['permissions'].iteritems()]
+                      for k, v in info['permissions'].items()]
                      if info['permissions'] else [])
     params_required = []
     params_optional = []
@@ -142,7 +200,7 @@ def method_doc(method, ignore_params=[]):
         required = param.get('required', 0)
         if name in ignore_params:
             continue
-        value.strip()
+        value = value.strip()
         line = '%s: %s' % (name, value)
         if required:
             params_required.append(line)
@@ -168,19 +226,6 @@ def method_doc(method, ignore_params=[]):
     text = text.replace('<code>', "'").replace('</code>', "'")
     text = text.replace('<ul>', "").replace('</ul>', "")
     text = text.replace('<li>', " " * 12).replace('</li>', "")
-    return text.encode('ascii', errors='ignore')
-
-
-class AutoDoc(type):
-    def __new__(meta, classname, bases, classDict):
-        selfname = classDict.get('__id__', None)
-        ignore_params = ['api_key']
-        for k, v in classDict.items():
-            if hasattr(v, 'ipernity_method'):
-                method = v.ipernity_method
-                if v.static:
-                    v.inner_func.__doc__ = method_doc(method, ignore_params)
-                else:
-                    ignore_params.append(selfname)
-                    v.__doc__ = method_doc(method, ignore_params)
-        return type.__new__(meta, classname, bases, classDict)
+    if doc_prefix:
+        text = doc_prefix.rstrip() + '\n' + text
+    return text
@@ -1,14 +1,36 @@
 import logging
-import requests
 import hashlib
+import threading
+from contextlib import ExitStack
+from functools import wraps, partial
 from .errors import IpernityError, IpernityAPIError
 from .cache import SimpleCache
+from .transport import Transport
+from .deadline import current_deadline, resolve
+from .scheduler import current_priority, priority
+from .hooks import Hooks, CallInfo, HIT, MISS
 from . import keys
 
+API_URL = 'http://api.ipernity.com/api/'
+DEFAULT_API_URL = API_URL
+
 CACHE = None
+TRANSPORT = None
+RATE_LIMITER = None
+RETRY_POLICY = None
+HEDGING_POLICY = None
+SCHEDULER = None
+HOOKS = Hooks()
 
 log = logging.getLogger(__name__)
 
+# per thread stack of active Client objects
+_local = threading.local()
+
+# attributes copied to wrapper functions. __doc__ is left out, docstrings of
+# API methods are only built when they are read (see reflection.ApiMethod)
+WRAPPER_ASSIGNMENTS = ('__module__', '__name__', '__qualname__')
+
 def enable_cache(cache_object=None):
     """ enable caching
     Parameters:
@@ -28,6 +50,101 @@ def disable_cache():
     CACHE = None
 
 
+def set_api_url(url=None):
+    ''' set the base url of the API, e.g. of a local stub server, None to
+    restore the default
+    '''
+    global API_URL
+    API_URL = url or DEFAULT_API_URL
+
+
+def set_rate_limiter(limiter):
+    ''' set the default RateLimiter (see ratelimit), None to disable '''
+    global RATE_LIMITER
+    RATE_LIMITER = limiter
+
+
+def set_retry_policy(policy):
+    ''' set the default RetryPolicy (see retry), None to disable retries '''
+    global RETRY_POLICY
+    RETRY_POLICY = policy
+
+
+def set_hedging_policy(policy):
+    ''' set the default HedgingPolicy (see hedge), None to disable '''
+    global HEDGING_POLICY
+    HEDGING_POLICY = policy
+
+
+def set_scheduler(scheduler):
+    ''' set the default Scheduler (see scheduler), None to disable '''
+    global SCHEDULER
+    SCHEDULER = scheduler
+
+
+def add_hook(event, func):
+    ''' call func(hooks.CallInfo) on event for every call, see hooks '''
+    HOOKS.add(event, func)
+
+
+def remove_hook(event, func):
+    HOOKS.remove(event, func)
+
+
+def set_transport(transport):
+    ''' set the default Transport, None to restore the default '''
+    global TRANSPORT
+    TRANSPORT = transport
+
+
+def get_transport():
+    ''' get the default Transport, create it on first use '''
+    global TRANSPORT
+    if TRANSPORT is None:
+        TRANSPORT = Transport()
+    return TRANSPORT
+
+
+def _client_stack():
+    try:
+        return _local.clients
+    except AttributeError:
+        _local.clients = []
+        return _local.clients
+
+
+def current_client():
+    ''' the Client active in this thread, None if there is none '''
+    stack = _client_stack()
+    return stack[-1] if stack else None
+
+
+def bind_client(func, client=None):
+    ''' bind func to client (default: the current client)
+
+    The returned function runs func with client, the current deadline and
+    priority class active, in whatever thread it is called. Use it for
+    functions handed to thread pools.
+    '''
+    client = client or current_client()
+    deadline = current_deadline()
+    klass = current_priority()
+    if client is None and deadline is None and klass is None:
+        return func
+
+    @wraps(func, assigned=WRAPPER_ASSIGNMENTS)
+    def bound(*args, **kwargs):
+        with ExitStack() as stack:
+            if client is not None:
+                stack.enter_context(client)
+            if deadline is not None:
+                stack.enter_context(deadline)
+            if klass is not None:
+                stack.enter_context(priority(klass))
+            return func(*args, **kwargs)
+    return bound
+
+
 def _clean_params(params):
     for k, v in params.items():
         if isinstance(v, bool):
@@ -37,8 +154,19 @@ def _clean_params(params):
     return params
 
 
+def _send(transport, url, kwargs, http_post, deadline):
+    if http_post and 'file' in kwargs:  # upload file handling
+        log.debug('sending file ' + kwargs['file'])
+        with open(kwargs['file'], 'rb') as fobj:
+            return transport.send(url, kwargs, files={'file': fobj},
+                                  deadline=deadline)
+    return transport.send(url, kwargs, http_post=http_post,
+                          deadline=deadline)
+
+
 def call_api(api_method, api_key=None, api_secret=None, signed=False,
-             authed=False, http_post=True, auth_handler=None, **kwargs):
+             authed=False, http_post=True, auth_handler=None, client=None,
+             deadline=None, call_info=None, **kwargs):
     ''' file request to ipernity API
 
     Parameters:
@@ -48,10 +176,39 @@ def call_api(api_method, api_key=None, api_secret=None, signed=False,
         auth_handler: auth_handler
         http_post: if set True, would use POST method, otherwise, GET
             some methods only support GET request, for example: api.methods.get
+        client: Client providing keys, auth handler, cache, transport,
+            rate limiter, retry and hedging policy and scheduler, default is
+            the current client or the module wide settings
+        deadline: deadline.Deadline or seconds for the whole call including
+            retries, combined with the deadlines active in this thread
+        call_info: hooks.CallInfo to fill in, optional
 
     Default:
         * format is JSON
     '''
+    from . import auth
+    client = client or current_client()
+    deadline = resolve(deadline)
+    if client is not None:
+        api_key = api_key or client.api_key
+        api_secret = api_secret or client.api_secret
+        auth_handler = auth_handler or client.auth_handler
+        cache = client.cache
+        transport = client.transport
+        limiter = client.rate_limiter
+        retry = client.retry_policy
+        hedge = client.hedging_policy
+        scheduler = client.scheduler
+        api_url = client.api_url or API_URL
+    else:
+        auth_handler = auth_handler or auth.AUTH_HANDLER
+        cache = CACHE
+        transport = get_transport()
+        limiter = RATE_LIMITER
+        retry = RETRY_POLICY
+        hedge = HEDGING_POLICY
+        scheduler = SCHEDULER
+        api_url = API_URL
     # api_keys handling
     if not api_key:
         api_key = keys.API_KEY
@@ -62,40 +219,106 @@ def call_api(api_method, api_key=None, api_secret=None, signed=False,
     kwargs['api_key'] = api_key
     kwargs = _clean_params(kwargs)
 
-    url = "http://api.ipernity.com/api/%s/%s" % (api_method, 'json')
-    
-    from . import auth
-    auth_handler = auth_handler or auth.AUTH_HANDLER
+    url = "%s%s/%s" % (api_url, api_method, 'json')
+
     if authed and not auth_handler:
         raise IpernityError('no auth_handler provided')
-    elif auth_handler and isinstance(auth_handler, auth.OAuthAuthHandler):
-            kwargs = auth_handler.sign_params(url, kwargs, http_post)
-    elif signed or authed:  # signature handling
-        if authed:
-            kwargs['auth_token'] = auth_handler.auth_token['token']
-        api_sig = sign_keys(api_secret, kwargs, api_method)
-        kwargs['api_sig'] = api_sig
-
-    # send the request
-    if http_post:  # POST
-        if 'file' in kwargs:  # upload file handling
-            log.debug('sending file ' + kwargs['file'])
-            with open(kwargs['file'], 'rb') as fobj:
-                files = {'file': fobj}
-                r = requests.post(url, data=kwargs, files=files)
-        else:
-            r = requests.post(url, data=kwargs)
-    else:  # GET
-        # cache only works in GET request
-        if CACHE is None:
-            r = requests.get(url, params=kwargs)
-        else:
-            r = CACHE.get(url) or requests.get(url, params=kwargs)
-            if url not in CACHE:
-                CACHE.set(url, r)
+
+    info = call_info or CallInfo(api_method)
+    info.url = url
+    info.http_post = http_post
+    info.hooks = [h for h in (HOOKS, client and client.hooks) if h]
+
+    # the priority class of the calling thread, requests may be sent from
+    # other threads (hedging)
+    schedule = None
+    if scheduler is not None:
+        schedule = partial(scheduler.slot, current_priority(), deadline)
+
+    def request():
+        attempt = info.new_attempt()
+        # signatures are built for every attempt (OAuth uses a nonce)
+        attempt.start()
+        params = dict(kwargs)
+        if auth_handler and isinstance(auth_handler, auth.OAuthAuthHandler):
+            params = auth_handler.sign_params(url, params, http_post)
+        elif signed or authed:  # signature handling
+            if authed:
+                params['auth_token'] = auth_handler.auth_token['token']
+            params['api_sig'] = sign_keys(api_secret, params, api_method)
+        attempt.mark('sign')
+        try:
+            resp = _request(api_method, url, params, http_post, api_key,
+                            transport, cache, limiter, deadline, schedule,
+                            attempt)
+        except BaseException:
+            info.merge(attempt, False)
+            raise
+        info.merge(attempt, True)
+        return resp
+
+    send = request
+    if hedge is not None:
+        send = partial(hedge.call, api_method, request)
+    if retry is None:
+        return send()
+    return retry.call(api_method, send, deadline)
+
+
+def _request(api_method, url, kwargs, http_post, api_key, transport, cache,
+             limiter, deadline=None, schedule=None, info=None):
+    ''' send a signed request and decode the response
+
+    schedule: optional function returning a context manager that admits the
+        request (Scheduler.slot)
+    info: hooks.CallInfo of the attempt (CallInfo.new_attempt)
+    '''
+    if info is None:
+        info = CallInfo(api_method).new_attempt()
+    info.params = kwargs
+    info.fire('before_request')
+    info.start()
+
+    def send():
+        if limiter is not None:
+            limiter.acquire(api_key, api_method, deadline)
+        if deadline is not None:
+            deadline.check(api_method)
+        info.mark('wait')
+        return _send(transport, url, kwargs, http_post, deadline)
+
+    if schedule is not None:
+        unscheduled = send
+
+        def send():
+            with schedule():
+                return unscheduled()
+
+    try:
+        if http_post or cache is None:
+            r = send()
+        else:  # cache only works in GET request
+            r = cache.get(url)
+            if r is None:
+                info.cache = MISS
+                r = send()
+                cache.set(url, r)
+            else:
+                info.cache = HIT
+    except Exception as e:
+        info.mark('request')
+        info.error = e
+        info.fire('after_response')
+        raise
+    info.mark('request')
     log.debug('Request returned %s', r)
+    info.status = r.status_code
+    info.request_bytes = _request_size(r)
+    info.response_bytes = len(r.content)
+    info.fire('after_response')
     r.raise_for_status()  # raise error if necessary, response_code != 2xx
 
+    info.start()
     resp = r.json()
     # check the response, if error happends, raise exception
     api = resp['api']
@@ -104,11 +327,29 @@ def call_api(api_method, api_key=None, api_secret=None, signed=False,
         # add more info to err_mesg
         err_mesg += '\nAPI: %s \nPayload: %s' % (api_method, kwargs)
         err_code = int(api['code'])
-        raise IpernityAPIError(err_code, err_mesg)
-
+        info.mark('decode')
+        info.error = IpernityAPIError(err_code, err_mesg)
+        info.error_code = err_code
+        info.fire('after_decode')
+        raise info.error
+    info.mark('decode')
+    info.result = resp
+    info.fire('after_decode')
     return resp
 
 
+def _request_size(r):
+    ''' size of the request answered by r, None if unknown '''
+    req = getattr(r, 'request', None)
+    if req is None:
+        return None
+    if req.body is None:
+        return len(req.url)
+    if isinstance(req.body, (bytes, str)):
+        return len(req.body)
+    return None
+
+
 def sign_keys(api_secret, kwargs, method=None):
     ''' request signature: Some API methods require signature.
     Support Request signature and Authorization link signature
@@ -0,0 +1,150 @@
+''' Retry of failed API calls with exponential backoff
+
+A RetryPolicy decides whether a failed call is retried and how long to wait
+before the next attempt (exponential backoff with full jitter). By default
+only read methods are retried, i.e. methods that do not require HTTP POST
+according to the method metadata, and only on transient errors: connection
+errors, timeouts and HTTP 429/5xx responses. A RetryBudget shared by all
+calls caps the number of retries relative to the number of calls, so an
+outage does not multiply the load on the API.
+
+Example:
+    rest.set_retry_policy(RetryPolicy(max_attempts=5))
+'''
+import time
+import random
+import logging
+import threading
+import requests
+from .errors import IpernityAPIError
+from .methodinfo import is_read_method
+
+log = logging.getLogger(__name__)
+
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+class RetryBudget(object):
+    ''' limit retries to a fraction of calls
+
+    Every call deposits `ratio` tokens, every retry withdraws one. On top of
+    that `min_per_second` retries per second are always allowed.
+
+    Parameters:
+        ratio: retries allowed per call, e.g. 0.1 for 10%
+        min_per_second: retries always allowed per second
+        max_tokens: maximum number of saved up retries, the budget starts
+            full
+    '''
+    def __init__(self, ratio=0.1, min_per_second=1.0, max_tokens=10):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.tokens = float(max_tokens)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, amount):
+        now = time.monotonic()
+        amount += (now - self.updated) * self.min_per_second
+        self.updated = now
+        self.tokens = min(self.max_tokens, self.tokens + amount)
+
+    def deposit(self):
+        ''' register a call '''
+        with self.lock:
+            self._refill(self.ratio)
+
+    def withdraw(self):
+        ''' take a retry, return False if the budget is exhausted '''
+        with self.lock:
+            self._refill(0)
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class RetryPolicy(object):
+    ''' retry decisions and backoff
+
+    Parameters:
+        max_attempts: maximum number of attempts per call, including the first
+        base: backoff base in seconds, after the failed attempt n the call
+            waits a random time between 0 and min(cap, base * 2 ** (n - 1))
+        cap: maximum backoff in seconds
+        statuses: HTTP statuses considered transient
+        error_codes: Ipernity API error codes considered transient
+        methods: API methods retried in addition to read methods
+        read_only: only retry read methods (and those in methods)
+        budget: RetryBudget, None for no budget
+    '''
+    def __init__(self, max_attempts=4, base=0.5, cap=30.0,
+                 statuses=RETRY_STATUSES, error_codes=(), methods=(),
+                 read_only=True, budget=None):
+        self.max_attempts = max_attempts
+        self.base = base
+        self.cap = cap
+        self.statuses = frozenset(statuses)
+        self.error_codes = frozenset(error_codes)
+        self.methods = frozenset(methods)
+        self.read_only = read_only
+        self.budget = budget if budget is not None else RetryBudget()
+
+    def transient(self, error):
+        ''' True if error is worth retrying '''
+        if isinstance(error, IpernityAPIError):
+            return error.code in self.error_codes
+        if isinstance(error, requests.HTTPError):
+            response = error.response
+            return response is not None and \
+                response.status_code in self.statuses
+        return isinstance(error, (requests.ConnectionError,
+                                  requests.Timeout))
+
+    def retryable(self, api_method):
+        ''' True if api_method may be retried '''
+        return (not self.read_only or api_method in self.methods
+                or is_read_method(api_method))
+
+    def should_retry(self, error, api_method, attempt):
+        ''' decide on a retry after the failed attempt number `attempt`
+        (starting at 1)
+        '''
+        if attempt >= self.max_attempts:
+            return False
+        if not (self.transient(error) and self.retryable(api_method)):
+            return False
+        if self.budget is not None and not self.budget.withdraw():
+            log.warning('Retry budget exhausted, not retrying %s',
+                        api_method)
+            return False
+        return True
+
+    def backoff(self, attempt):
+        ''' seconds to wait after the failed attempt number `attempt` '''
+        return random.uniform(0, min(self.cap,
+                                     self.base * 2 ** (attempt - 1)))
+
+    def call(self, api_method, func, deadline=None):
+        ''' call func() and retry it according to this policy
+
+        No retry is attempted if its backoff would end after deadline
+        (deadline.Deadline, optional).
+        '''
+        if self.budget is not None:
+            self.budget.deposit()
+        attempt = 1
+        while True:
+            try:
+                return func()
+            except Exception as e:
+                if not self.should_retry(e, api_method, attempt):
+                    raise
+                delay = self.backoff(attempt)
+                if deadline is not None and delay >= deadline.remaining():
+                    raise
+                log.info('Retrying %s in %.2fs after attempt %d failed: %s',
+                         api_method, delay, attempt, e)
+                time.sleep(delay)
+                attempt += 1
@@ -0,0 +1,170 @@
+''' Priority scheduling of API requests
+
+A Scheduler admits at most `concurrency` requests at a time to the rate
+limiter and the transport. Waiting requests are admitted by priority class:
+interactive requests always go before bulk requests, which use the capacity
+left over. A class may also be limited to a number of concurrent requests,
+so that bulk jobs can't take every slot while no interactive request is
+waiting.
+
+Requests are interactive unless they are made within a priority block,
+which rest.bind_client carries over to worker threads:
+
+    rest.set_scheduler(Scheduler(concurrency=8, limits={BULK: 6}))
+    with priority(BULK):
+        Exporter(writer).export_user(user)
+
+Scheduler.metrics() returns the queue depth and wait times of every class.
+'''
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from .errors import IpernityError, IpernityTimeoutError
+
+log = logging.getLogger(__name__)
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+# per thread priority class
+_local = threading.local()
+
+
+def current_priority():
+    ''' the priority class set for this thread, None if there is none '''
+    return getattr(_local, 'priority', None)
+
+
+@contextmanager
+def priority(name):
+    ''' make the requests of this block with priority class name '''
+    old = current_priority()
+    _local.priority = name
+    try:
+        yield
+    finally:
+        _local.priority = old
+
+
+class ClassStats(object):
+    ''' queue and wait time metrics of a priority class '''
+    def __init__(self):
+        self.queued = 0
+        self.max_queued = 0
+        self.running = 0
+        self.admitted = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @property
+    def wait_avg(self):
+        return self.wait_total / self.admitted if self.admitted else 0.0
+
+    def as_dict(self):
+        return {
+            'queued': self.queued,
+            'max_queued': self.max_queued,
+            'running': self.running,
+            'admitted': self.admitted,
+            'wait_total': self.wait_total,
+            'wait_avg': self.wait_avg,
+            'wait_max': self.wait_max,
+        }
+
+
+class Scheduler(object):
+    ''' admit requests by priority class
+
+    Parameters:
+        concurrency: maximum number of requests in flight
+        classes: priority classes, highest priority first. The first class
+            is the default.
+        limits: dict of class -> maximum number of requests of that class
+            in flight, optional
+    '''
+    def __init__(self, concurrency=8, classes=(INTERACTIVE, BULK),
+                 limits=None):
+        self.concurrency = concurrency
+        self.classes = tuple(classes)
+        self.limits = dict(limits or {})
+        self.queues = dict((c, deque()) for c in self.classes)
+        self.stats = dict((c, ClassStats()) for c in self.classes)
+        self.running = 0
+        self.cond = threading.Condition()
+
+    def _next(self):
+        # the class whose first waiting request may run now
+        if self.running >= self.concurrency:
+            return None
+        for name in self.classes:
+            limit = self.limits.get(name, self.concurrency)
+            if self.queues[name] and self.stats[name].running < limit:
+                return name
+        return None
+
+    def acquire(self, name=None, deadline=None):
+        ''' block until a request of class name may be sent, return the
+        class name
+
+        Raises IpernityTimeoutError if deadline (deadline.Deadline)
+        expires while waiting.
+        '''
+        name = name or current_priority() or self.classes[0]
+        if name not in self.queues:
+            raise IpernityError('Unknown priority class %s' % name)
+        queue = self.queues[name]
+        stats = self.stats[name]
+        ticket = object()
+        started = time.monotonic()
+        with self.cond:
+            queue.append(ticket)
+            stats.queued += 1
+            stats.max_queued = max(stats.max_queued, stats.queued)
+            try:
+                while not (queue[0] is ticket and self._next() == name):
+                    timeout = None
+                    if deadline is not None:
+                        timeout = deadline.remaining()
+                        if not timeout:
+                            raise IpernityTimeoutError(
+                                'Deadline exceeded in %s queue' % name)
+                    self.cond.wait(timeout)
+            except BaseException:
+                queue.remove(ticket)
+                stats.queued -= 1
+                self.cond.notify_all()
+                raise
+            queue.popleft()
+            waited = time.monotonic() - started
+            stats.queued -= 1
+            stats.running += 1
+            stats.admitted += 1
+            stats.wait_total += waited
+            stats.wait_max = max(stats.wait_max, waited)
+            self.running += 1
+            self.cond.notify_all()
+        return name
+
+    def release(self, name):
+        ''' register the end of a request admitted by acquire '''
+        with self.cond:
+            self.running -= 1
+            self.stats[name].running -= 1
+            self.cond.notify_all()
+
+    @contextmanager
+    def slot(self, name=None, deadline=None):
+        ''' context manager around one request, see acquire '''
+        name = self.acquire(name, deadline)
+        try:
+            yield name
+        finally:
+            self.release(name)
+
+    def metrics(self):
+        ''' dict of class -> ClassStats.as_dict() '''
+        with self.cond:
+            return dict((name, stats.as_dict())
+                        for name, stats in self.stats.items())
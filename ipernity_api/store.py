@@ -0,0 +1,284 @@
+''' Local SQLite store for fetched objects
+
+Doc, Album, Folder, Group, User, Tag and Comment objects are mapped to a
+normalized schema. Every table keeps a few columns for querying plus the
+complete object as JSON in the ``data`` column. Objects are buffered and
+written with batched upserts in a single transaction per batch.
+
+Example:
+    with SQLiteStore('ipernity.db') as store:
+        for doc in walk(Doc.getList, user=user, extra='dates,owner'):
+            store.add(doc)
+        store.flush()
+        store.query('SELECT count(*) FROM docs WHERE owner_id = ?',
+                    (user.id,))
+
+Upserts use ``INSERT ... ON CONFLICT``, which needs SQLite 3.24 or newer.
+'''
+import json
+import time
+import sqlite3
+import logging
+import datetime
+import threading
+from .errors import IpernityError
+from .export import serialize
+from .ipernity import (IpernityObject, Doc, Album, Folder, Group, User, Tag,
+                       Comment)
+
+log = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    username TEXT,
+    realname TEXT,
+    is_pro INTEGER,
+    data TEXT,
+    fetched_at REAL
+);
+CREATE TABLE IF NOT EXISTS docs (
+    id TEXT PRIMARY KEY,
+    owner_id TEXT,
+    title TEXT,
+    media TEXT,
+    license TEXT,
+    posted_at TEXT,
+    created TEXT,
+    modified_at TEXT,
+    data TEXT,
+    fetched_at REAL
+);
+CREATE INDEX IF NOT EXISTS docs_owner ON docs (owner_id);
+CREATE TABLE IF NOT EXISTS albums (
+    id TEXT PRIMARY KEY,
+    owner_id TEXT,
+    title TEXT,
+    created_at TEXT,
+    data TEXT,
+    fetched_at REAL
+);
+CREATE TABLE IF NOT EXISTS folders (
+    id TEXT PRIMARY KEY,
+    owner_id TEXT,
+    title TEXT,
+    created_at TEXT,
+    data TEXT,
+    fetched_at REAL
+);
+CREATE TABLE IF NOT EXISTS "groups" (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    created_at TEXT,
+    members INTEGER,
+    data TEXT,
+    fetched_at REAL
+);
+CREATE TABLE IF NOT EXISTS tags (
+    id TEXT PRIMARY KEY,
+    type TEXT,
+    tag TEXT,
+    data TEXT,
+    fetched_at REAL
+);
+CREATE TABLE IF NOT EXISTS doc_tags (
+    doc_id TEXT,
+    tag_id TEXT,
+    user_id TEXT,
+    added_at TEXT,
+    PRIMARY KEY (doc_id, tag_id)
+);
+CREATE TABLE IF NOT EXISTS comments (
+    id TEXT PRIMARY KEY,
+    doc_id TEXT,
+    user_id TEXT,
+    parent_id TEXT,
+    posted_at TEXT,
+    content TEXT,
+    data TEXT,
+    fetched_at REAL
+);
+CREATE INDEX IF NOT EXISTS comments_doc ON comments (doc_id);
+'''
+
+# class -> (table, [(column, attribute path)])
+# attribute paths are dotted, e.g. 'dates.posted_at' or 'owner.id'
+TABLES = [
+    (Doc, 'docs', [
+        ('owner_id', 'owner.id'),
+        ('title', 'title'),
+        ('media', 'media'),
+        ('license', 'license'),
+        ('posted_at', 'dates.posted_at'),
+        ('created', 'dates.created'),
+        ('modified_at', 'dates.modified_at'),
+    ]),
+    (Album, 'albums', [
+        ('owner_id', 'owner.id'),
+        ('title', 'title'),
+        ('created_at', 'dates.created_at'),
+    ]),
+    (Folder, 'folders', [
+        ('owner_id', 'owner.id'),
+        ('title', 'title'),
+        ('created_at', 'dates.created_at'),
+    ]),
+    (Group, '"groups"', [
+        ('title', 'title'),
+        ('created_at', 'dates.created_at'),
+        ('members', 'count.members'),
+    ]),
+    (User, 'users', [
+        ('username', 'username'),
+        ('realname', 'realname'),
+        ('is_pro', 'is_pro'),
+    ]),
+    (Tag, 'tags', [
+        ('type', 'type'),
+        ('tag', 'tag'),
+    ]),
+    (Comment, 'comments', [
+        ('doc_id', 'doc_id'),
+        ('user_id', 'user.id'),
+        ('parent_id', 'parent.id'),
+        ('posted_at', 'posted_at'),
+        ('content', 'content'),
+    ]),
+]
+
+
+def _lookup(obj, path):
+    ''' follow a dotted attribute/key path, None if missing '''
+    for name in path.split('.'):
+        if isinstance(obj, dict):
+            obj = obj.get(name)
+        else:
+            obj = getattr(obj, name, None)
+        if obj is None:
+            return None
+    return _sql_value(obj)
+
+
+def _sql_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    elif isinstance(value, IpernityObject):
+        return getattr(value, 'id', None)
+    elif isinstance(value, (dict, list)):
+        return json.dumps(serialize(value))
+    return value
+
+
+def _upsert_sql(table, columns, key=('id',)):
+    updates = ', '.join('%s = COALESCE(excluded.%s, %s)' % (c, c, c)
+                        for c in columns if c not in key)
+    return 'INSERT INTO %s (%s) VALUES (%s) ON CONFLICT (%s) DO UPDATE SET %s' \
+        % (table, ', '.join(columns), ', '.join('?' * len(columns)),
+           ', '.join(key), updates)
+
+
+class SQLiteStore(object):
+    ''' buffered SQLite persistence of IpernityObjects
+
+    Parameters:
+        path: database file name, ':memory:' for an in-memory database
+        batch_size: number of buffered rows written in one transaction
+    '''
+    def __init__(self, path, batch_size=5000):
+        self.path = path
+        self.batch_size = batch_size
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        # fewer fsyncs, readers are not blocked by the writer
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.tables = {}
+        for cls, table, columns in TABLES:
+            names = ['id'] + [c for c, _ in columns] + ['data', 'fetched_at']
+            self.tables[cls] = (table, columns, _upsert_sql(table, names))
+        self.doc_tags_sql = _upsert_sql(
+            'doc_tags', ['doc_id', 'tag_id', 'user_id', 'added_at'],
+            ('doc_id', 'tag_id'))
+        self.buffer = {}
+        self.pending = 0
+
+    def _spec(self, obj):
+        for cls in type(obj).__mro__:
+            if cls in self.tables:
+                return self.tables[cls]
+        raise IpernityError('Cannot store %s objects'
+                            % type(obj).__name__)
+
+    def _buffer(self, sql, row):
+        self.buffer.setdefault(sql, []).append(row)
+        self.pending += 1
+
+    def add(self, obj, **context):
+        ''' buffer obj for the next batch
+
+        context gives values for columns missing in the object, e.g.
+        store.add(comment, doc_id=doc.id)
+        '''
+        table, columns, sql = self._spec(obj)
+        now = time.time()
+        row = [str(obj.id)]
+        for column, path in columns:
+            value = _lookup(obj, path)
+            if value is None:
+                value = _sql_value(context.get(column))
+            row.append(value)
+        row.append(json.dumps(serialize(obj)))
+        row.append(now)
+        with self.lock:
+            self._buffer(sql, row)
+            # related objects
+            owner = getattr(obj, 'owner', None)
+            if isinstance(owner, User) and getattr(owner, 'id', None):
+                self.add(owner)
+            if isinstance(obj, Doc):
+                tags = getattr(obj, 'tags', None)
+                if isinstance(tags, dict):
+                    for tag in tags.get('tag', []):
+                        self.add(Tag(**tag), doc_id=obj.id)
+            elif isinstance(obj, Tag) and context.get('doc_id'):
+                self._buffer(self.doc_tags_sql, [
+                    str(context['doc_id']), str(obj.id),
+                    _lookup(obj, 'user.id'), _lookup(obj, 'added_at')])
+            if self.pending >= self.batch_size:
+                self.flush()
+
+    def upsert(self, objs, **context):
+        ''' buffer a list of objects, see add() '''
+        for obj in objs:
+            self.add(obj, **context)
+
+    def flush(self):
+        ''' write all buffered rows in one transaction '''
+        with self.lock:
+            if not self.pending:
+                return
+            started = time.time()
+            with self.conn:
+                for sql, rows in self.buffer.items():
+                    self.conn.executemany(sql, rows)
+            log.debug('Stored %d rows in %.3fs', self.pending,
+                      time.time() - started)
+            self.buffer = {}
+            self.pending = 0
+
+    def query(self, sql, params=()):
+        ''' flush and run a query, return all rows '''
+        with self.lock:
+            self.flush()
+            return self.conn.execute(sql, params).fetchall()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
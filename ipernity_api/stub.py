@@ -0,0 +1,427 @@
+''' Offline stub of the Ipernity API
+
+StubServer answers /api/<method>/json for every method of methods.py from a
+local HTTP server, so that the client can be tested and benchmarked without
+credentials or network:
+
+    with StubServer(api_key='key', api_secret='secret') as stub:
+        client = Client('key', 'secret', api_url=stub.url)
+        with client:
+            doc = Doc.get(id='12')
+
+Requests are checked like the real API would: the method must exist, the
+api key must match, required parameters must be present, and signed
+methods need a valid api_sig (or OAuth signature), methods requiring
+authentication a token. Responses are built from the sample responses in
+methods.py: requested ids are echoed, and lists with paging information
+are filled with `per_page` items for the requested page out of `pages`.
+
+Latency and failures can be injected:
+
+    stub = StubServer(latency=0.05, pages=10, error_rate=0.01)
+    stub.fail('doc.get', code=1, message='Document not found', times=2)
+    stub.fail('user.get', status=503)
+
+The error codes returned for invalid requests are those of this stub (see
+ERR_*), not necessarily the codes of the real API.
+'''
+import re
+import copy
+import json
+import time
+import random
+import logging
+import threading
+import urllib.parse
+from collections import Counter
+from functools import lru_cache
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from . import methodinfo
+from .rest import sign_keys
+
+log = logging.getLogger(__name__)
+
+# error codes of rejected requests
+ERR_METHOD = 1000
+ERR_API_KEY = 1001
+ERR_SIGNATURE = 1002
+ERR_TOKEN = 1003
+ERR_PARAMETER = 1004
+
+# attributes of list elements with paging information
+PAGING = ('page', 'pages', 'per_page', 'total')
+
+_TOKEN = re.compile(r'<!--.*?-->|<(/?)([\w:.-]+)([^<>]*?)(/?)>|([^<]+)', re.S)
+_ATTR = re.compile(r'([\w:.-]+)="([^"]*)"')
+
+
+def parse_sample(text):
+    ''' elements of a sample response as list of (tag, attrs, children,
+    text)
+
+    The samples of methods.py are not always well-formed: unknown
+    attribute syntax is skipped, the first of duplicate attributes is
+    used and unmatched closing tags are ignored. Placeholders of optional
+    elements like <dates ... if option/> are left out.
+    '''
+    root = (None, {}, [], [])
+    stack = [root]
+    for m in _TOKEN.finditer(text):
+        closing, tag, attrs, empty, data = m.groups()
+        if data is not None:
+            data = data.strip()
+            if data and data != '(...)':
+                stack[-1][3].append(data)
+        elif tag is None:
+            continue  # comment
+        elif closing:
+            if any(e[0] == tag for e in stack[1:]):
+                while stack.pop()[0] != tag:
+                    pass
+        else:
+            element = (tag, {}, [], [])
+            for k, v in _ATTR.findall(attrs):
+                element[1].setdefault(k, v)
+            if not ('...' in attrs and not element[1]):
+                stack[-1][2].append(element)
+            if not empty:
+                stack.append(element)
+    return _finish(root[2])
+
+
+def _finish(elements):
+    return [(tag, attrs, _finish(children), ' '.join(text))
+            for tag, attrs, children, text in elements]
+
+
+def _to_json(element):
+    ''' JSON value of a parsed element, following the API's JSON format:
+    attributes become keys, an element with text only becomes a string,
+    repeated elements (and the items of a list) become lists
+    '''
+    tag, attrs, children, text = element
+    if not attrs and not children:
+        return text
+    value = dict(attrs)
+    if text:
+        value['content'] = text
+    counts = Counter(c[0] for c in children)
+    # the items of a list: <docs><doc/></docs>, or the most frequent child
+    # of an element with paging information, e.g. <network><user/>
+    item = None
+    if counts and any(k in attrs for k in PAGING + ('count',)):
+        item = max(counts, key=lambda n: (tag == n + 's', counts[n]))
+    for child in children:
+        name = child[0]
+        if counts[name] > 1 or name == item or tag == name + 's':
+            value.setdefault(name, []).append(_to_json(child))
+        else:
+            value[name] = _to_json(child)
+    return value
+
+
+@lru_cache(maxsize=None)
+def _sample_json(api_method):
+    text = methodinfo.describe(api_method).get('response') or ''
+    return json.dumps(dict((e[0], _to_json(e)) for e in parse_sample(text)))
+
+
+def sample_response(api_method):
+    ''' response data of api_method built from its sample response '''
+    return json.loads(_sample_json(api_method))
+
+
+def _id_key(name, item):
+    for key in (name + '_id', 'id'):
+        if key in item:
+            return key
+    return None
+
+
+def _fill_pages(value, params, pages):
+    ''' fill the lists with paging information of value for the
+    requested page
+    '''
+    if not isinstance(value, dict):
+        return
+    for name, child in list(value.items()):
+        if isinstance(child, dict):
+            _fill_pages(child, params, pages)
+        elif isinstance(child, list) and child and \
+                any(k in value for k in PAGING):
+            per_page = int(params.get('per_page') or value.get('per_page')
+                           or len(child))
+            page = max(1, int(params.get('page') or 1))
+            count = per_page if page <= pages else 0
+            value.update(page=str(page), pages=str(pages),
+                         per_page=str(per_page), total=str(pages * per_page))
+            template = child[0]
+            key = _id_key(name, template) if isinstance(template, dict) \
+                else None
+            items = []
+            for i in range(count):
+                item = copy.deepcopy(template)
+                if key:
+                    item[key] = str((page - 1) * per_page + i + 1)
+                items.append(item)
+            value[name] = items
+
+
+def build_response(api_method, params, pages=1):
+    ''' synthetic response data of api_method for params '''
+    resp = sample_response(api_method)
+    for name, value in resp.items():
+        if isinstance(value, dict):
+            for key in value:
+                if key.endswith('_id') and params.get(key):
+                    value[key] = params[key]
+            _fill_pages(value, params, pages)
+        elif name in params:
+            resp[name] = params[name]
+    return resp
+
+
+class Failure(object):
+    ''' an injected failure, see StubServer.fail '''
+    def __init__(self, code, message, status, times):
+        self.code = code
+        self.message = message
+        self.status = status
+        self.times = times
+
+
+class StubServer(object):
+    ''' local HTTP server implementing the Ipernity API
+
+    Parameters:
+        api_key, api_secret: keys accepted by the server
+        tokens: dict of valid auth_token/oauth_token -> OAuth token secret
+            (or None), default: every token is accepted and OAuth
+            signatures are only checked for the consumer key
+        pages: number of pages of every list response
+        latency: seconds added to every response, or a function
+            latency(api_method) returning them
+        error_rate: fraction of requests answered with HTTP 503
+        seed: seed of the random numbers used for error_rate
+        addr, port: address to listen on, port 0 picks a free port
+    '''
+    def __init__(self, api_key='key', api_secret='secret', tokens=None,
+                 pages=1, latency=0, error_rate=0.0, seed=None,
+                 addr='127.0.0.1', port=0):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.tokens = tokens
+        self.pages = pages
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.addr = addr
+        self.port = port
+        self.failures = {}  # api_method or None -> [Failure]
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self.server = None
+        self.url = None
+
+    def fail(self, api_method=None, code=1, message='Injected error',
+             status=None, times=1):
+        ''' fail the next `times` calls of api_method (every method if
+        None, every call if times is None) with an API error, or with the
+        HTTP status if given
+        '''
+        with self.lock:
+            self.failures.setdefault(api_method, []).append(
+                Failure(code, message, status, times))
+
+    def _failure(self, api_method):
+        with self.lock:
+            for key in (api_method, None):
+                queue = self.failures.get(key)
+                if queue:
+                    failure = queue[0]
+                    if failure.times is not None:
+                        failure.times -= 1
+                        if failure.times <= 0:
+                            queue.pop(0)
+                    return failure
+        if self.error_rate and self.random.random() < self.error_rate:
+            return Failure(None, None, 503, 1)
+        return None
+
+    def _delay(self, api_method):
+        latency = self.latency
+        if callable(latency):
+            latency = latency(api_method)
+        if latency:
+            time.sleep(latency)
+
+    def _check(self, api_method, url, params, post):
+        ''' (code, message) of an invalid request, None if it is valid '''
+        if not methodinfo.exists(api_method):
+            return ERR_METHOD, 'Method "%s" not found' % api_method
+        auth = methodinfo.auth_info(api_method)
+        oauth = 'oauth_signature' in params
+        key = params.get('oauth_consumer_key' if oauth else 'api_key')
+        if key != self.api_key:
+            return ERR_API_KEY, 'Invalid API key'
+        if oauth:
+            if not self._check_oauth(url, params, post):
+                return ERR_SIGNATURE, 'Invalid OAuth signature'
+        elif 'api_sig' in params or auth['sign']:
+            signed = dict((k, v) for k, v in params.items()
+                          if k != 'api_sig')
+            if params.get('api_sig') != sign_keys(self.api_secret, signed,
+                                                  api_method):
+                return ERR_SIGNATURE, 'Invalid signature'
+        if auth['token']:
+            token = params.get('oauth_token' if oauth else 'auth_token')
+            if not token or \
+                    (self.tokens is not None and token not in self.tokens):
+                return ERR_TOKEN, 'Authentication required'
+        missing = [p for p in methodinfo.required_params(api_method)
+                   if p not in params]
+        if missing:
+            return ERR_PARAMETER, 'Missing parameter: %s' % \
+                ', '.join(missing)
+        return None
+
+    def _check_oauth(self, url, params, post):
+        from .auth import OAuthAuthHandler
+        token = params.get('oauth_token')
+        secret = (self.tokens or {}).get(token)
+        if token and self.tokens is None:
+            return True  # token secret unknown
+        handler = OAuthAuthHandler(api_key=self.api_key,
+                                   api_secret=self.api_secret)
+        expected = handler._build_signature(url, dict(params), secret, post)
+        return params['oauth_signature'] == expected.decode('ascii')
+
+    def handle(self, api_method, url, params, post):
+        ''' (HTTP status, response data) of a request '''
+        with self.lock:
+            self.calls[api_method] += 1
+        self._delay(api_method)
+        failure = self._failure(api_method)
+        if failure is not None and failure.status:
+            return failure.status, None
+        error = self._check(api_method, url, params, post)
+        if error is None and failure is not None:
+            error = failure.code, failure.message
+        if error is not None:
+            code, message = error
+            return 200, {'api': {'status': 'error', 'code': str(code),
+                                 'message': message}}
+        resp = build_response(api_method, params, self.pages)
+        resp['api'] = {'status': 'ok', 'at': str(int(time.time()))}
+        return 200, resp
+
+    def start(self):
+        ''' start serving in a daemon thread, return self '''
+        stub = self
+
+        class Handler(StubHandler):
+            server_stub = stub
+
+        self.server = ThreadingHTTPServer((self.addr, self.port), Handler)
+        self.server.daemon_threads = True
+        host, port = self.server.server_address[:2]
+        self.url = 'http://%s:%d/api/' % (host, port)
+        threading.Thread(target=self.server.serve_forever, args=(0.05,),
+                         daemon=True).start()
+        log.debug('Stub API serving on %s', self.url)
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    ''' HTTP handler passing API requests to server_stub '''
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, don't wait for delayed ACKs
+    disable_nagle_algorithm = True
+    server_stub = None
+
+    def _params(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        ctype = self.headers.get('Content-Type', '')
+        if ctype.startswith('multipart/form-data'):
+            msg = BytesParser(policy=HTTP).parsebytes(
+                b'Content-Type: ' + ctype.encode('latin-1') + b'\r\n\r\n' +
+                body)
+            for part in msg.iter_parts():
+                name = part.get_param('name', header='content-disposition')
+                if part.get_filename() is None:
+                    params[name] = part.get_content()
+                else:
+                    # the signed value of a file is its path, sent as field
+                    params.setdefault(name, part.get_filename())
+        elif body:
+            params.update(urllib.parse.parse_qsl(body.decode('utf-8')))
+        return url.path, params
+
+    def _answer(self, post):
+        path, params = self._params()
+        parts = path.strip('/').split('/')
+        if len(parts) != 3 or parts[0] != 'api' or parts[2] != 'json':
+            self.send_error(404)
+            return
+        url = 'http://%s%s' % (self.headers.get('Host', ''), path)
+        status, data = self.server_stub.handle(parts[1], url, params, post)
+        body = json.dumps(data).encode('utf-8') if data is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._answer(False)
+
+    def do_POST(self):
+        self._answer(True)
+
+    def log_message(self, format, *args):
+        log.debug(format, *args)
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Serve the stub API')
+    parser.add_argument('--api-key', default='key')
+    parser.add_argument('--api-secret', default='secret')
+    parser.add_argument('--addr', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--pages', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args(argv)
+    stub = StubServer(args.api_key, args.api_secret, pages=args.pages,
+                      latency=args.latency, error_rate=args.error_rate,
+                      addr=args.addr, port=args.port).start()
+    print(stub.url, flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+''' Incremental sync of docs using date watermarks
+
+For every scope (a user, album or group) the newest date seen is stored as
+a watermark in a CheckpointStore. The next run only asks doc.search for docs
+after the watermark, sorted in ascending order, and merges them into a local
+store. The watermark is advanced after every page, so an interrupted run
+resumes close to where it stopped.
+
+The Ipernity API can only filter on the posted (upload) date or the created
+(taken) date; modifications of already synced docs are not visible this way.
+
+Example:
+    sync = Sync(CheckpointStore('checkpoints.json'), DictStore())
+    sync.run([{'user': user} for user in users], workers=16)
+'''
+import os
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .errors import IpernityError
+from .rest import bind_client
+from .ipernity import Doc, walk_pages
+
+log = logging.getLogger(__name__)
+
+# watermark fields: (doc.search parameter, doc.search sort, dates key)
+FIELDS = {
+    'posted': ('posted_min', 'posted-asc', 'posted_at'),
+    'created': ('created_min', 'created-asc', 'created'),
+}
+
+
+def scope_key(user=None, album=None, group=None):
+    ''' checkpoint key of a scope, e.g. "user:123/album:456" '''
+    parts = ['%s:%s' % (name, getattr(obj, 'id', obj))
+             for name, obj in [('user', user), ('album', album),
+                               ('group', group)]
+             if obj is not None]
+    if not parts:
+        raise IpernityError('No user, album or group given for sync')
+    return '/'.join(parts)
+
+
+class CheckpointStore(object):
+    ''' watermarks persisted in a JSON file
+
+    Parameters:
+        path: JSON file, None to keep checkpoints in memory only
+        interval: minimum number of seconds between two writes of the file,
+            0 writes on every change. A lost checkpoint only means docs are
+            fetched and merged again.
+    '''
+    def __init__(self, path=None, interval=5.0):
+        self.path = path
+        self.interval = interval
+        self.lock = threading.RLock()
+        self.data = {}
+        self.saved_at = 0
+        if path and os.path.exists(path):
+            with open(path) as fobj:
+                self.data = json.load(fobj)
+
+    def get(self, key, default=None):
+        with self.lock:
+            return self.data.get(key, default)
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            if time.time() - self.saved_at >= self.interval:
+                self.save()
+
+    def save(self):
+        ''' write checkpoints atomically '''
+        if not self.path:
+            return
+        with self.lock:
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w') as fobj:
+                json.dump(self.data, fobj, sort_keys=True)
+            os.replace(tmp, self.path)
+            self.saved_at = time.time()
+
+
+class DictStore(object):
+    ''' minimal in-memory store, docs by id '''
+    def __init__(self):
+        self.docs = {}
+        self.lock = threading.Lock()
+
+    def upsert(self, objs):
+        with self.lock:
+            for obj in objs:
+                self.docs[obj.id] = obj
+
+
+class SyncResult(object):
+    ''' outcome of the sync of a scope
+
+    error is the exception of a failed sync (Sync.run), fetched and
+    watermark count the pages synced until then
+    '''
+    def __init__(self, key, watermark, error=None):
+        self.key = key
+        self.watermark = watermark
+        self.fetched = 0
+        self.error = error
+
+    def __repr__(self):
+        if self.error is not None:
+            return 'SyncResult[%s fetched:%d watermark:%s error:%s]' % (
+                self.key, self.fetched, self.watermark, self.error)
+        return 'SyncResult[%s fetched:%d watermark:%s]' % (
+            self.key, self.fetched, self.watermark)
+
+
+class Sync(object):
+    ''' fetch new docs per scope since the stored watermark
+
+    Parameters:
+        checkpoints: CheckpointStore
+        store: object with an upsert(docs) method, e.g. DictStore
+        field: 'posted' (default) or 'created', the date used as watermark
+        per_page: page size of doc.search
+        extra: extra information requested from doc.search
+    '''
+    def __init__(self, checkpoints, store, field='posted', per_page=100,
+                 extra='dates,owner,count,original'):
+        if field not in FIELDS:
+            raise IpernityError('Unknown watermark field: %s' % field)
+        self.checkpoints = checkpoints
+        self.store = store
+        self.field = field
+        self.per_page = per_page
+        extra = set(extra.split(',')) | {'dates'}
+        self.extra = ','.join(sorted(e for e in extra if e))
+
+    def _watermark(self, doc):
+        date = getattr(doc, 'dates', {}).get(FIELDS[self.field][2])
+        if not hasattr(date, 'strftime'):
+            return None
+        if self.field == 'posted':
+            return int(date.timestamp())
+        return date.strftime('%Y-%m-%d %H:%M:%S')
+
+    def _key(self, user=None, album=None, group=None, **kwargs):
+        return '%s#%s' % (scope_key(user, album, group), self.field)
+
+    def sync(self, user=None, album=None, group=None, **kwargs):
+        ''' sync one scope, return SyncResult
+
+        Additional keyword arguments are passed to Doc.search. Call
+        checkpoints.save() when done, run() does this automatically.
+        '''
+        result = SyncResult(self._key(user, album, group), None)
+        self._sync(result, user, album, group, **kwargs)
+        return result
+
+    def _sync(self, result, user=None, album=None, group=None, **kwargs):
+        key = result.key
+        param, sort, _ = FIELDS[self.field]
+        watermark = result.watermark = self.checkpoints.get(key)
+        params = dict(kwargs, sort=sort, extra=self.extra)
+        for name, obj in [('user_id', user), ('album_id', album),
+                          ('group_id', group)]:
+            if obj is not None:
+                params[name] = getattr(obj, 'id', obj)
+        if watermark is not None:
+            # the bound is inclusive, docs of the last second are
+            # fetched again and merged idempotently by the store
+            params[param] = watermark
+        for page in walk_pages(Doc.search, self.per_page, **params):
+            if not page:
+                break
+            self.store.upsert(page)
+            result.fetched += len(page)
+            marks = [m for m in map(self._watermark, page) if m is not None]
+            if marks and (watermark is None or max(marks) > watermark):
+                watermark = result.watermark = max(marks)
+                self.checkpoints.set(key, watermark)
+        log.debug('Synced %s', result)
+
+    def run(self, scopes, workers=4):
+        ''' sync many scopes concurrently
+
+        scopes is a list of dicts with user, album and/or group keys (and
+        optional doc.search parameters). Returns the list of SyncResult.
+        A failing scope doesn't stop the others, its SyncResult holds the
+        error.
+        '''
+        results = [SyncResult(self._key(**scope), None) for scope in scopes]
+
+        def sync(result, scope):
+            try:
+                self._sync(result, **scope)
+            except Exception as e:
+                log.warning('Sync of %s failed: %s', result.key, e)
+                result.error = e
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(bind_client(sync), results, scopes))
+        finally:
+            self.checkpoints.save()
+        return results
@@ -0,0 +1,72 @@
+''' HTTP transport for API requests
+
+A Transport sends the prepared API request and returns the
+``requests.Response``. The default transport keeps a pooled
+``requests.Session``, so connections are reused between calls. An optional
+breaker.CircuitBreaker makes requests fail fast while the API is down.
+Every request has connect and read timeouts, capped by the deadline of the
+call if there is one.
+'''
+import time
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+
+log = logging.getLogger(__name__)
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (10.0, 60.0)
+
+
+class Transport(object):
+    ''' send API requests over a pooled requests.Session
+
+    Parameters:
+        session: requests.Session to use, optional
+        pool_size: maximum number of connections kept per host
+        breaker: breaker.CircuitBreaker, optional
+        timeout: requests timeout, seconds or a (connect, read) tuple
+    '''
+    def __init__(self, session=None, pool_size=10, breaker=None,
+                 timeout=DEFAULT_TIMEOUT):
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size,
+                                  pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+        self.breaker = breaker
+        self.timeout = timeout
+
+    def send(self, url, params, http_post=True, files=None, deadline=None):
+        ''' send request, return requests.Response
+
+        Parameters:
+            url: API url
+            params: request parameters
+            http_post: use POST if True, otherwise GET
+            files: dict of files for upload (POST only)
+            deadline: deadline.Deadline of the call, optional
+        '''
+        timeout = self.timeout
+        if deadline is not None:
+            deadline.check(url)
+            timeout = deadline.cap(timeout, url)
+        if self.breaker is None:
+            return self._send(url, params, http_post, files, timeout)
+        probe = self.breaker.before()
+        started = time.monotonic()
+        failed = True  # also for exceptions other than RequestException
+        try:
+            r = self._send(url, params, http_post, files, timeout)
+            failed = r.status_code >= 500
+            return r
+        finally:
+            self.breaker.record(failed, time.monotonic() - started, probe)
+
+    def _send(self, url, params, http_post, files, timeout):
+        if http_post:
+            return self.session.post(url, data=params, files=files,
+                                     timeout=timeout)
+        return self.session.get(url, params=params, timeout=timeout)
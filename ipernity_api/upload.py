@@ -0,0 +1,55 @@
+''' Concurrent upload of many files
+
+Example:
+    results = upload_files(paths, workers=AIMDLimiter(maximum=8),
+                           is_public=0)
+    tickets = [r.ticket for r in results if r.error is None]
+'''
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from .rest import bind_client
+from .ipernity import Upload
+from .concurrency import pool_size, limited
+
+log = logging.getLogger(__name__)
+
+
+class UploadResult(object):
+    ''' outcome of a single upload
+
+    Attributes:
+        path: local file
+        ticket: Ticket of the upload, None on error
+        error: exception if the upload failed, otherwise None
+    '''
+    def __init__(self, path, ticket=None, error=None):
+        self.path = path
+        self.ticket = ticket
+        self.error = error
+
+    def __repr__(self):
+        return 'UploadResult[%s: %s]' % (self.path, self.error or self.ticket)
+
+
+def upload_files(paths, workers=4, **kwargs):
+    ''' upload files concurrently with Upload.file
+
+    Parameters:
+        paths: local files to upload
+        workers: number of concurrent uploads, or a concurrency.AIMDLimiter
+        **kwargs: parameters passed to Upload.file for every file
+
+    Returns a list of UploadResult, in the order of paths. A failed upload
+    does not stop the others.
+    '''
+    upload = limited(bind_client(Upload.file), workers)
+
+    def job(path):
+        try:
+            return UploadResult(path, upload(file=path, **kwargs))
+        except Exception as e:
+            log.warning('Upload of %s failed: %s', path, e)
+            return UploadResult(path, error=e)
+
+    with ThreadPoolExecutor(max_workers=pool_size(workers)) as executor:
+        return list(executor.map(job, paths))
@@ -6,3 +6,21 @@ from .rest import *
 from .auth import *
 from .reflection import *
 from .ipernity import *
+from .download import *
+from .backup import *
+from .export import *
+from .sync import *
+from .store import *
+from .client import *
+from .ratelimit import *
+from .retry import *
+from .breaker import *
+from .deadline import *
+from .concurrency import *
+from .hedge import *
+from .scheduler import *
+from .hooks import *
+from .metrics import *
+from .methodinfo import *
+from .stub import *
+from .cassette import *
@@ -0,0 +1,112 @@
+import os
+import json
+import shutil
+import tempfile
+from unittest import TestCase, mock
+from ipernity_api.backup import Backup
+from ipernity_api.ipernity import Doc, IpernityList
+from .download import RangeHandler, HTTPServer, threading
+
+
+class BackupTest(TestCase):
+    def setUp(self):
+        self.httpd = HTTPServer(('127.0.0.1', 0), RangeHandler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.base = 'http://127.0.0.1:%d/' % self.httpd.server_port
+        self.root = tempfile.mkdtemp()
+        self.modified = {'1': '1203605781', '2': '1203605781',
+                         '3': '1203605781'}
+        self.missing = set()
+        self.dates = {}
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        shutil.rmtree(self.root)
+
+    def getList(self, **kwargs):
+        self.assertIn('original', kwargs['extra'])
+        # doc 3 is a duplicate of doc 1
+        files = {'1': '1.jpg', '2': '2.jpg', '3': '1.jpg'}
+        files.update((i, 'nofile') for i in self.missing)
+        docs = [Doc(doc_id=i,
+                    dates=dict(self.dates.get(i, {}),
+                               posted_at=self.modified[i]),
+                    original={'url': self.base + files[i], 'ext': 'jpg'})
+                for i in sorted(files)]
+        return IpernityList(docs, {'page': 1, 'pages': 1})
+
+    def test_backup(self):
+        with mock.patch.object(Doc, 'getList', self.getList):
+            report = Backup(self.root).run('123')
+            self.assertEqual(report.changed, 3)
+            self.assertEqual(report.stored, 2)
+            self.assertEqual(report.deduplicated, 1)
+            with open(os.path.join(self.root, 'manifest.json')) as fobj:
+                manifest = json.load(fobj)
+            self.assertEqual(manifest['docs']['1']['hash'],
+                             manifest['docs']['3']['hash'])
+            # nothing changed: nothing downloaded
+            report = Backup(self.root).run('123')
+            self.assertEqual(report.checked, 3)
+            self.assertEqual(report.changed, 0)
+            self.assertEqual(report.bytes, 0)
+            # only the modified doc is fetched again
+            self.modified['2'] = '1203609999'
+            report = Backup(self.root).run('123')
+            self.assertEqual(report.changed, 1)
+            self.assertEqual(report.deduplicated, 1)
+
+    def test_content_dates(self):
+        self.dates['2'] = {'last_comment_at': '1203605781'}
+        with mock.patch.object(Doc, 'getList', self.getList):
+            Backup(self.root).run('123')
+            # a new comment does not change the file
+            self.dates['2'] = {'last_comment_at': '1203609999',
+                               'comment_at': '1203609999'}
+            report = Backup(self.root).run('123')
+            self.assertEqual(report.changed, 0)
+            self.assertEqual(report.bytes, 0)
+            # a replaced file does
+            self.dates['2']['replaced_at'] = '1203609999'
+            report = Backup(self.root).run('123')
+            self.assertEqual(report.changed, 1)
+            self.assertGreater(report.bytes, 0)
+
+    def test_manifest_v1(self):
+        self.dates['2'] = {'last_comment_at': '1203609999'}
+        with mock.patch.object(Doc, 'getList', self.getList):
+            Backup(self.root).run('123')
+            # version 1 stored the latest of all dates
+            path = os.path.join(self.root, 'manifest.json')
+            with open(path) as fobj:
+                manifest = json.load(fobj)
+            manifest['version'] = 1
+            manifest['docs']['2']['modified'] = '2008-02-21T16:06:39'
+            with open(path, 'w') as fobj:
+                json.dump(manifest, fobj)
+            report = Backup(self.root).run('123')
+            self.assertEqual(report.changed, 0)
+            self.dates['2']['replaced_at'] = '1203619999'
+            report = Backup(self.root).run('123')
+            self.assertEqual(report.changed, 1)
+
+    def test_partial(self):
+        staging = os.path.join(self.root, 'staging')
+        os.makedirs(staging)
+        part = os.path.join(staging, '2.jpg.part')
+        with open(os.path.join(os.path.dirname(__file__), 'files', '2.jpg'),
+                  'rb') as fobj:
+            data = fobj.read()
+        with open(part, 'wb') as fobj:
+            fobj.write(data[:100])
+        self.missing.add('2')
+        with mock.patch.object(Doc, 'getList', self.getList):
+            report = Backup(self.root).run('123')
+            self.assertEqual([d.id for d in report.failed], ['2'])
+            # the partial download of the failed doc is kept
+            self.assertTrue(os.path.exists(part))
+            self.missing.clear()
+            report = Backup(self.root).run('123')
+            self.assertEqual(report.bytes, len(data) - 100)
+            self.assertFalse(os.path.exists(staging))
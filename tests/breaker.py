@@ -0,0 +1,103 @@
+import time
+import requests
+from unittest import TestCase
+from ipernity_api.breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+from ipernity_api.errors import IpernityCircuitOpenError
+from ipernity_api.transport import Transport
+from .client import make_response
+
+
+class FakeSession(object):
+    ''' answer with the given status, or raise if status is None '''
+    def __init__(self, status=200):
+        self.status = status
+        self.sent = 0
+
+    def get(self, url, params=None, data=None, files=None, timeout=None):
+        self.sent += 1
+        if self.status is None:
+            raise requests.ConnectionError('refused')
+        return make_response({}, self.status)
+
+    post = get
+
+
+class BreakerTest(TestCase):
+    def breaker(self, **kwargs):
+        return CircuitBreaker(min_requests=4, open_for=0.05, **kwargs)
+
+    def test_open(self):
+        session = FakeSession(503)
+        transport = Transport(session, breaker=self.breaker())
+        for i in range(4):
+            transport.send('http://x', {}, http_post=False)
+        self.assertEqual(transport.breaker.state, OPEN)
+        with self.assertRaises(IpernityCircuitOpenError):
+            transport.send('http://x', {}, http_post=False)
+        self.assertEqual(session.sent, 4)
+
+    def test_stays_closed(self):
+        session = FakeSession(200)
+        transport = Transport(session, breaker=self.breaker())
+        for i in range(10):
+            transport.send('http://x', {})
+        self.assertEqual(transport.breaker.state, CLOSED)
+
+    def test_slow(self):
+        breaker = self.breaker(slow_threshold=1.0)
+        for i in range(4):
+            breaker.before()
+            breaker.record(False, 2.0)
+        self.assertEqual(breaker.state, OPEN)
+
+    def test_half_open(self):
+        session = FakeSession(None)
+        transport = Transport(session, breaker=self.breaker())
+        for i in range(4):
+            with self.assertRaises(requests.ConnectionError):
+                transport.send('http://x', {})
+        time.sleep(0.06)
+        # failed probe reopens the circuit
+        with self.assertRaises(requests.ConnectionError):
+            transport.send('http://x', {})
+        self.assertEqual(transport.breaker.state, OPEN)
+        time.sleep(0.06)
+        session.status = 200
+        breaker = transport.breaker
+        probe = breaker.before()
+        self.assertEqual(breaker.state, HALF_OPEN)
+        # only one probe at a time
+        with self.assertRaises(IpernityCircuitOpenError):
+            transport.send('http://x', {})
+        breaker.record(False, 0.01, probe)
+        self.assertEqual(breaker.state, CLOSED)
+        transport.send('http://x', {})
+
+    def test_stale_results(self):
+        breaker = self.breaker()
+        self.assertIsNone(breaker.before())  # sent while closed
+        breaker._set_state(OPEN)
+        time.sleep(0.06)
+        probe = breaker.before()
+        breaker.record(True, 0.01)
+        breaker.record(True, 0.01, probe - 1)
+        self.assertEqual((breaker.state, breaker.probing), (HALF_OPEN, 1))
+        with self.assertRaises(IpernityCircuitOpenError):
+            breaker.before()
+        breaker.record(False, 0.01, probe)
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_other_exception(self):
+        session = FakeSession()
+        transport = Transport(session, breaker=self.breaker())
+        transport.breaker._set_state(OPEN)
+        time.sleep(0.06)
+
+        def broken(*args, **kwargs):
+            raise ValueError('broken')
+        session.get = broken
+        with self.assertRaises(ValueError):
+            transport.send('http://x', {}, http_post=False)
+        # the probe failed, it does not block the half-open circuit
+        self.assertEqual(transport.breaker.state, OPEN)
+        self.assertEqual(transport.breaker.probing, 0)
@@ -0,0 +1,88 @@
+import os
+import time
+import shutil
+import tempfile
+import requests
+from unittest import TestCase
+from ipernity_api import rest
+from ipernity_api.client import Client
+from ipernity_api.deadline import Deadline
+from ipernity_api.errors import IpernityError, IpernityAPIError
+from ipernity_api.stub import StubServer
+from ipernity_api.cassette import (RecordingTransport, ReplayTransport, load,
+                                   scrub_data, SCRUBBED)
+
+
+class CassetteTest(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def record(self, name):
+        path = os.path.join(self.dir, name)
+        with StubServer('key', 'secret') as stub:
+            transport = RecordingTransport(path)
+            client = Client('key', 'secret', transport=transport,
+                            api_url=stub.url)
+            doc = client.Doc.get(id='7')
+            rest.call_api('doc.delete', client=client, signed=True,
+                          auth_token='token', doc_id='7')
+            stub.fail('doc.get', code=1, message='Document not found')
+            with self.assertRaises(IpernityAPIError):
+                client.Doc.get(id='8')
+            transport.close()
+        return path, doc
+
+    def test_record(self):
+        path, doc = self.record('calls.jsonl.gz')
+        entries = load(path)
+        self.assertEqual([e['method'] for e in entries],
+                         ['doc.get', 'doc.delete', 'doc.get'])
+        self.assertEqual(entries[0]['params'],
+                         {'api_key': SCRUBBED, 'doc_id': '7'})
+        self.assertEqual(entries[1]['params']['api_sig'], SCRUBBED)
+        self.assertEqual(entries[1]['params']['auth_token'], SCRUBBED)
+        self.assertTrue(all(e['latency'] > 0 for e in entries))
+
+    def test_replay(self):
+        path, recorded = self.record('calls.jsonl')
+        # no server is listening anymore
+        transport = ReplayTransport(path)
+        client = Client('other key', 'other secret', transport=transport)
+        doc = client.Doc.get(id='7')
+        self.assertEqual(doc.id, recorded.id)
+        self.assertEqual(doc.title, recorded.title)
+        with self.assertRaises(IpernityAPIError):
+            client.Doc.get(id='8')
+        with self.assertRaises(IpernityError):
+            client.Doc.get(id='9')
+        # recordings are reused when replaying again
+        self.assertEqual(client.Doc.get(id='7').id, '7')
+
+    def test_latency(self):
+        entries = [{'method': 'test.hello', 'post': True,
+                    'params': {'api_key': SCRUBBED}, 'status': 200,
+                    'latency': 0.05, 'at': 0.0,
+                    'body': '{"api":{"status":"ok"},"hello":"hi"}'}]
+        client = Client('key', 'secret', transport=ReplayTransport(entries))
+        started = time.monotonic()
+        self.assertEqual(rest.call_api('test.hello', client=client)['hello'],
+                         'hi')
+        self.assertLess(time.monotonic() - started, 0.05)
+        transport = ReplayTransport(entries, latency=True)
+        client = Client('key', 'secret', transport=transport)
+        started = time.monotonic()
+        rest.call_api('test.hello', client=client)
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            transport.send('http://api/test.hello/json', {'api_key': 'k'},
+                           deadline=Deadline(0.01))
+
+    def test_scrub_data(self):
+        data = {'auth': {'token': 'abc', 'user': {'user_id': '1'}},
+                'list': [{'secret': 's'}]}
+        self.assertEqual(scrub_data(data), {
+            'auth': {'token': SCRUBBED, 'user': {'user_id': '1'}},
+            'list': [{'secret': SCRUBBED}]})
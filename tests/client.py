@@ -0,0 +1,94 @@
+import json
+import threading
+import requests
+from unittest import TestCase
+from ipernity_api import rest
+from ipernity_api.client import Client
+from ipernity_api.ipernity import Doc, User
+
+
+def make_response(data, status=200):
+    r = requests.Response()
+    r.status_code = status
+    r._content = json.dumps(data).encode('utf-8')
+    return r
+
+
+class FakeTransport(object):
+    ''' answer doc.get and user.get, record the api keys used '''
+    def __init__(self):
+        self.keys = []
+        self.urls = []
+
+    def send(self, url, params, http_post=True, files=None, deadline=None):
+        self.keys.append(params.get('api_key'))
+        self.urls.append(url)
+        ok = {'status': 'ok'}
+        if 'doc.get' in url:
+            return make_response({'api': ok, 'doc': {
+                'doc_id': params['doc_id'],
+                'owner': {'user_id': params['api_key']}}})
+        return make_response({'api': ok, 'user': {
+            'user_id': params['user_id']}})
+
+
+class ClientTest(TestCase):
+    def test_client(self):
+        transport = FakeTransport()
+        client = Client('key1', 'secret1', transport=transport)
+        doc = client.Doc.get(id='5')
+        self.assertIsInstance(doc, Doc)
+        self.assertIs(doc._client, client)
+        self.assertIs(doc.owner._client, client)
+        self.assertIsNone(rest.current_client())
+        # objects remember their client
+        doc.getMedias()
+        with client:
+            self.assertIs(rest.current_client(), client)
+            User.get(id='1')
+        self.assertEqual(transport.keys, ['key1', 'key1', 'key1'])
+
+    def test_threads(self):
+        transports = [FakeTransport() for i in range(4)]
+        clients = [Client('key%d' % i, 'secret', transport=t)
+                   for i, t in enumerate(transports)]
+
+        def work(client):
+            for i in range(20):
+                doc = client.Doc.get(id=str(i))
+                self.assertEqual(doc.owner.id, client.api_key)
+
+        threads = [threading.Thread(target=work, args=(c,)) for c in clients]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for i, transport in enumerate(transports):
+            self.assertEqual(set(transport.keys), {'key%d' % i})
+            self.assertEqual(len(transport.keys), 20)
+
+    def test_api_url(self):
+        transport = FakeTransport()
+        client = Client('key', 'secret', transport=transport,
+                        api_url='http://localhost:8080/api/')
+        client.User.get(id='1')
+        rest.set_api_url('http://127.0.0.1/api/')
+        try:
+            Client('key', 'secret', transport=transport).User.get(id='1')
+        finally:
+            rest.set_api_url()
+        self.assertEqual(transport.urls,
+                         ['http://localhost:8080/api/user.get/json',
+                          'http://127.0.0.1/api/user.get/json'])
+        self.assertEqual(rest.API_URL, rest.DEFAULT_API_URL)
+
+    def test_lazy(self):
+        client = Client('key', 'secret', transport=FakeTransport(),
+                        lazy=True)
+        doc = client.Doc.get(id='5')
+        self.assertIn('owner', doc._raw)
+        # converted outside of the client block, with the doc's client
+        self.assertIs(doc.owner._client, client)
+        self.assertEqual(doc.owner.id, 'key')
+        self.assertIsNone(Client(transport=FakeTransport()).Doc(
+            doc_id='1', owner={'user_id': '2'})._raw)
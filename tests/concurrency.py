@@ -0,0 +1,78 @@
+import threading
+import requests
+from unittest import TestCase, mock
+from ipernity_api.concurrency import AIMDLimiter, overloaded
+from ipernity_api.errors import IpernityAPIError
+from ipernity_api.ipernity import IpernityList, Upload, Ticket, walk_pages
+from ipernity_api.upload import upload_files
+from .client import make_response
+
+
+class AIMDTest(TestCase):
+    def test_overloaded(self):
+        self.assertTrue(overloaded(requests.Timeout()))
+        self.assertTrue(overloaded(requests.HTTPError(
+            response=make_response({}, 503))))
+        self.assertFalse(overloaded(requests.HTTPError(
+            response=make_response({}, 404))))
+        self.assertFalse(overloaded(IpernityAPIError(1, 'Not found')))
+
+    def test_increase(self):
+        limiter = AIMDLimiter(initial=2, maximum=4)
+        for i in range(20):
+            limiter.call(lambda: None)
+        self.assertEqual(limiter.limit, 4)
+
+    def test_decrease(self):
+        limiter = AIMDLimiter(initial=8)
+        started = [limiter.acquire() for i in range(3)]
+        # the calls in flight during the first cut don't cut again
+        for s in started:
+            limiter.release(s, failed=True)
+        self.assertEqual(limiter.limit, 4)
+        with self.assertRaises(requests.ConnectionError):
+            with limiter.slot():
+                raise requests.ConnectionError()
+        self.assertEqual(limiter.limit, 2)
+        # not an overload
+        with self.assertRaises(KeyError):
+            with limiter.slot():
+                raise KeyError()
+        self.assertGreater(limiter.limit, 2)
+        self.assertEqual(limiter.inflight, 0)
+
+    def test_latency_spike(self):
+        limiter = AIMDLimiter(initial=8)
+        limiter.latency = 0.1
+        limiter.release(limiter.acquire() - 1.0)
+        self.assertEqual(limiter.limit, 4)
+
+    def test_bound(self):
+        limiter = AIMDLimiter(initial=2, maximum=2)
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def method(page, per_page):
+            with lock:
+                active.append(page)
+                peak.append(len(active))
+            threading.Event().wait(0.01)
+            with lock:
+                active.remove(page)
+            return IpernityList([page], {'pages': 10})
+        pages = list(walk_pages(method, workers=limiter))
+        self.assertEqual([p[0] for p in pages], list(range(1, 11)))
+        self.assertLessEqual(max(peak), 2)
+
+    def test_upload_files(self):
+        def upload(file, **kwargs):
+            if file == 'bad':
+                raise requests.ConnectionError()
+            return Ticket(id=file)
+        with mock.patch.object(Upload, 'file', side_effect=upload):
+            results = upload_files(['a', 'bad', 'c'],
+                                   workers=AIMDLimiter(initial=2))
+        self.assertEqual([r.path for r in results], ['a', 'bad', 'c'])
+        self.assertEqual(results[0].ticket.id, 'a')
+        self.assertIsInstance(results[1].error, requests.ConnectionError)
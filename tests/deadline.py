@@ -0,0 +1,116 @@
+import time
+from unittest import TestCase, mock
+from ipernity_api.deadline import Deadline, current_deadline, resolve
+from ipernity_api.errors import IpernityTimeoutError
+from ipernity_api.transport import Transport
+from ipernity_api.client import Client
+from ipernity_api.retry import RetryPolicy
+from ipernity_api.rest import bind_client
+from ipernity_api.ipernity import IpernityList, Ticket, walk_pages
+from .client import FakeTransport
+from .retry import FlakyTransport
+from .breaker import FakeSession
+
+
+class RecordingSession(FakeSession):
+    def get(self, url, params=None, data=None, files=None, timeout=None):
+        self.timeout = timeout
+        return FakeSession.get(self, url)
+
+    post = get
+
+
+class DeadlineTest(TestCase):
+    def test_nested(self):
+        self.assertIsNone(current_deadline())
+        with Deadline(10) as outer:
+            with Deadline(20):
+                self.assertIs(current_deadline(), outer)
+            inner = resolve(1)
+            self.assertLess(inner.remaining(), 1.1)
+            self.assertIs(bind_client(current_deadline)(), outer)
+        self.assertIsNone(current_deadline())
+
+    def test_cap(self):
+        deadline = Deadline(5)
+        connect, read = deadline.cap((10, 1))
+        self.assertLessEqual(connect, 5)
+        self.assertEqual(read, 1)
+        self.assertLessEqual(deadline.cap(None), 5)
+
+    def test_expired_after_check(self):
+        # the deadline expires between check() and cap()
+        deadline = Deadline(0)
+        deadline.check = lambda what='operation': None
+        session = RecordingSession()
+        with self.assertRaises(IpernityTimeoutError):
+            Transport(session, timeout=(3, 30)).send('http://x', {},
+                                                     deadline=deadline)
+        self.assertFalse(hasattr(session, 'timeout'))
+
+    def test_transport_timeout(self):
+        session = RecordingSession()
+        transport = Transport(session, timeout=(3, 30))
+        transport.send('http://x', {})
+        self.assertEqual(session.timeout, (3, 30))
+        transport.send('http://x', {}, deadline=Deadline(2))
+        self.assertLessEqual(session.timeout[1], 2)
+
+    def test_expired_call(self):
+        transport = FakeTransport()
+        client = Client('key', 'secret', transport=transport)
+        self.assertEqual(client.User.get(id='1', _deadline=5).id, '1')
+        with self.assertRaises(IpernityTimeoutError):
+            client.User.get(id='1', _deadline=0)
+        self.assertEqual(len(transport.keys), 1)
+
+    def test_retry_deadline(self):
+        transport = FlakyTransport(5)
+        policy = RetryPolicy(base=10, max_attempts=5)
+        client = Client('key', 'secret', transport=transport,
+                        retry_policy=policy)
+        with Deadline(0.5):
+            with self.assertRaises(Exception):
+                client.User.get(id='1')
+        # backoff of up to 10s does not fit, at most one retry
+        self.assertLessEqual(len(transport.keys), 2)
+
+    def test_walk_pages(self):
+        deadlines = []
+
+        def method(page, per_page, _deadline=None):
+            deadlines.append(_deadline)
+            return IpernityList([page], {'pages': 3})
+        pages = list(walk_pages(method, workers=2, _deadline=10))
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(len(set(map(id, deadlines))), 1)
+
+    def test_wait_done(self):
+        ticket = Ticket(id='1')
+        ticket.eta = 1
+        with mock.patch.object(Ticket, 'refresh') as refresh:
+            started = time.monotonic()
+            with self.assertRaises(IpernityTimeoutError):
+                ticket.wait_done(_deadline=0.2)
+            self.assertLess(time.monotonic() - started, 0.5)
+            refresh.assert_not_called()
+
+    def test_wait_done_eta(self):
+        # the eta is an estimate: the upload finishes before it
+        ticket = Ticket(id='1')
+        ticket.eta = 5
+
+        def refresh():
+            ticket.done = True
+        with mock.patch.object(Ticket, 'refresh', side_effect=refresh) as m:
+            started = time.monotonic()
+            ticket.wait_done(timeout=0.2)
+            self.assertLess(time.monotonic() - started, 0.5)
+            self.assertEqual(m.call_count, 1)
+        # still not done after the timeout
+        ticket = Ticket(id='2')
+        ticket.eta = 5
+        with mock.patch.object(Ticket, 'refresh') as m:
+            with self.assertRaises(IpernityTimeoutError):
+                ticket.wait_done(timeout=0.1)
+            self.assertEqual(m.call_count, 1)
@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import TestCase
+from ipernity_api.download import (download_files, PART_SUFFIX,
+                                   DOWNLOADED, RESUMED, SKIPPED)
+from ipernity_api.ipernity import Original, Thumb
+from .ipernity import getfile
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    ''' serve tests/files with Range support, ?nosize hides the size from
+    HEAD requests
+    '''
+    def _body(self):
+        name = self.path.lstrip('/').split('?')[0]
+        with open(getfile(name), 'rb') as fobj:
+            return fobj.read()
+
+    def do_HEAD(self):
+        self.send_response(200)
+        if not self.path.endswith('?nosize'):
+            self.send_header('Content-Length', str(len(self._body())))
+        self.end_headers()
+
+    def do_GET(self):
+        try:
+            body = self._body()
+        except IOError:
+            self.send_error(404)
+            return
+        rng = self.headers.get('Range')
+        if rng:
+            start = int(rng.split('=')[1].rstrip('-'))
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header('Content-Range', 'bytes */%d' % len(body))
+                self.end_headers()
+                return
+            body = body[start:]
+            self.send_response(206)
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class DownloadTest(TestCase):
+    def setUp(self):
+        self.httpd = HTTPServer(('127.0.0.1', 0), RangeHandler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.base = 'http://127.0.0.1:%d/' % self.httpd.server_port
+        self.dest = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        shutil.rmtree(self.dest)
+
+    def test_download(self):
+        size = os.path.getsize(getfile('1.jpg'))
+        files = [Original(url=self.base + '1.jpg', bytes=str(size)),
+                 Thumb(url=self.base + '2.jpg')]
+        stats = download_files(files, self.dest, workers=2)
+        self.assertEqual(stats.count(DOWNLOADED), 2)
+        self.assertEqual(os.path.getsize(os.path.join(self.dest, '1.jpg')),
+                         size)
+        self.assertGreater(stats.throughput, 0)
+        # second run should skip everything
+        stats = download_files(files, self.dest)
+        self.assertEqual(stats.count(SKIPPED), 2)
+        self.assertEqual(stats.bytes, 0)
+
+    def test_resume(self):
+        with open(getfile('1.jpg'), 'rb') as fobj:
+            data = fobj.read()
+        part = os.path.join(self.dest, '1.jpg' + PART_SUFFIX)
+        with open(part, 'wb') as fobj:
+            fobj.write(data[:100])
+        stats = download_files([Original(url=self.base + '1.jpg')],
+                               self.dest)
+        self.assertEqual(stats.count(RESUMED), 1)
+        self.assertEqual(stats.bytes, len(data) - 100)
+        with open(os.path.join(self.dest, '1.jpg'), 'rb') as fobj:
+            self.assertEqual(fobj.read(), data)
+        self.assertFalse(os.path.exists(part))
+
+    def test_complete_part(self):
+        with open(getfile('1.jpg'), 'rb') as fobj:
+            data = fobj.read()
+        # complete: kept, too long: downloaded again
+        for extra, status in ((b'', RESUMED), (b'x', DOWNLOADED)):
+            part = os.path.join(self.dest, '1.jpg' + PART_SUFFIX)
+            with open(part, 'wb') as fobj:
+                fobj.write(data + extra)
+            stats = download_files([Original(url=self.base + '1.jpg')],
+                                   self.dest)
+            self.assertEqual(stats.results[0].status, status)
+            with open(os.path.join(self.dest, '1.jpg'), 'rb') as fobj:
+                self.assertEqual(fobj.read(), data)
+            os.remove(os.path.join(self.dest, '1.jpg'))
+
+    def test_failed(self):
+        stats = download_files([Thumb(url=self.base + 'nofile')],
+                               self.dest)
+        self.assertEqual(len(stats.failed), 1)
+
+    def test_no_url(self):
+        files = [Thumb(label='75x'), Thumb(url=self.base + '2.jpg')]
+        stats = download_files(files, self.dest)
+        self.assertEqual(stats.count(DOWNLOADED), 1)
+        self.assertIsInstance(stats.failed[0].error, AttributeError)
+
+    def test_truncated(self):
+        # present but truncated, the remote size is unknown
+        path = os.path.join(self.dest, '2.jpg')
+        with open(path, 'wb') as fobj:
+            fobj.write(b'x')
+        stats = download_files([Thumb(url=self.base + '2.jpg?nosize')],
+                               self.dest)
+        self.assertEqual(stats.count(DOWNLOADED), 1)
+        self.assertEqual(os.path.getsize(path),
+                         os.path.getsize(getfile('2.jpg')))
@@ -0,0 +1,69 @@
+import io
+import gzip
+import json
+import datetime
+from unittest import TestCase, mock
+from ipernity_api.export import JSONLWriter, Exporter, serialize
+from ipernity_api.ipernity import (Doc, Album, Folder, Group, Comment, Tag,
+                                   User, IpernityList)
+
+
+def paged(factory, total):
+    ''' fake list method returning `total` objects '''
+    def method(page=1, per_page=100, **kwargs):
+        start = (page - 1) * per_page
+        objs = [factory(i) for i in range(start, min(start + per_page, total))]
+        pages = (total + per_page - 1) // per_page
+        return IpernityList(objs, {'page': page, 'pages': pages,
+                                   'total': total})
+    return method
+
+
+class ExportTest(TestCase):
+    def test_serialize(self):
+        doc = Doc(doc_id='1', dates={'posted_at': '1203605781'},
+                  owner={'user_id': '2'})
+        data = serialize(doc)
+        self.assertEqual(data['id'], '1')
+        self.assertEqual(data['owner']['user_id'], '2')
+        self.assertEqual(data['dates']['posted_at'],
+                         datetime.datetime.fromtimestamp(1203605781)
+                         .isoformat())
+        json.dumps(data)
+
+    def test_export_user(self):
+        buf = io.BytesIO()
+        patches = [
+            mock.patch.object(Doc, 'getList',
+                              paged(lambda i: Doc(doc_id=str(i)), 250)),
+            mock.patch.object(Album, 'getList',
+                              paged(lambda i: Album(album_id=str(i)), 3)),
+            mock.patch.object(Folder, 'getList', paged(Folder, 0)),
+            mock.patch.object(Group, 'getList',
+                              paged(lambda i: Group(group_id=str(i)), 1)),
+            mock.patch.object(Comment, 'getList',
+                              paged(lambda i: Comment(comment_id=str(i)), 2)),
+            mock.patch.object(Doc, 'tags_getList',
+                              lambda self: [Tag(id='t', tag='tag')]),
+        ]
+        for p in patches:
+            p.start()
+        try:
+            writer = JSONLWriter(buf, compress=True)
+            Exporter(writer, workers=3, per_page=100).export_user(
+                User(user_id='42'))
+            writer.close()
+        finally:
+            for p in patches:
+                p.stop()
+        lines = gzip.decompress(buf.getvalue()).decode('utf-8').splitlines()
+        records = [json.loads(l) for l in lines]
+        types = [r['type'] for r in records]
+        self.assertEqual(types.count('user'), 1)
+        self.assertEqual(types.count('album'), 3)
+        self.assertEqual(types.count('group'), 1)
+        self.assertEqual(types.count('doc'), 250)
+        self.assertEqual(types.count('comment'), 500)
+        self.assertEqual(types.count('tag'), 250)
+        self.assertEqual(len(set(r['data']['id'] for r in records
+                                 if r['type'] == 'doc')), 250)
@@ -0,0 +1,106 @@
+import time
+import threading
+import requests
+from unittest import TestCase
+from ipernity_api.hedge import HedgingPolicy, LatencyWindow
+from ipernity_api.client import Client
+from .client import FakeTransport
+
+
+class SlowTransport(FakeTransport):
+    ''' the first request takes `slow` seconds, and fails if `fail` '''
+    def __init__(self, slow, fail=False):
+        FakeTransport.__init__(self)
+        self.slow = slow
+        self.fail = fail
+        self.threads = []
+        self.lock = threading.Lock()
+
+    def send(self, url, params, http_post=True, files=None, deadline=None):
+        with self.lock:
+            first = not self.keys
+            self.threads.append(threading.current_thread())
+        r = FakeTransport.send(self, url, params, http_post, files, deadline)
+        if first:
+            time.sleep(self.slow)
+            if self.fail:
+                raise requests.exceptions.ReadTimeout('slow')
+        return r
+
+
+class HedgeTest(TestCase):
+    def policy(self, **kwargs):
+        policy = HedgingPolicy(**kwargs)
+        for i in range(20):
+            policy._window('user.get').add(0.01)
+        return policy
+
+    def test_percentile(self):
+        window = LatencyWindow(100)
+        for i in range(100):
+            window.add(i / 100.0)
+        self.assertEqual(window.percentile(0.95), 0.95)
+        self.assertEqual(window.percentile(0.5), 0.5)
+
+    def test_hedge(self):
+        # the request of the call times out, the hedge answers
+        transport = SlowTransport(0.2, fail=True)
+        policy = self.policy()
+        client = Client('key', 'secret', transport=transport,
+                        hedging_policy=policy)
+        self.assertEqual(client.User.get(id='1').id, '1')
+        self.assertEqual(len(transport.keys), 2)
+        self.assertEqual(policy.hedged, 1)
+
+    def test_latency(self):
+        # the hedge answers first, the call doesn't wait for its request
+        transport = SlowTransport(1.0)
+        policy = self.policy()
+        client = Client('key', 'secret', transport=transport,
+                        hedging_policy=policy)
+        started = time.monotonic()
+        self.assertEqual(client.User.get(id='1').id, '1')
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(len(transport.keys), 2)
+        self.assertEqual(policy.hedged, 1)
+        # both sent from the pools
+        self.assertNotIn(threading.current_thread(), transport.threads)
+
+    def test_no_free_call_worker(self):
+        transport = SlowTransport(0.1)
+        policy = self.policy(calls=1)
+        policy.calls_free.acquire()
+        client = Client('key', 'secret', transport=transport,
+                        hedging_policy=policy)
+        self.assertEqual(client.User.get(id='1').id, '1')
+        # sent from the calling thread, unhedged
+        self.assertEqual(transport.threads, [threading.current_thread()])
+        self.assertEqual((policy.hedged, policy.skipped), (0, 1))
+
+    def test_no_free_worker(self):
+        transport = SlowTransport(0.1, fail=True)
+        policy = self.policy(workers=1)
+        policy.free.acquire()
+        client = Client('key', 'secret', transport=transport,
+                        hedging_policy=policy)
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            client.User.get(id='1')
+        self.assertEqual(len(transport.keys), 1)
+        self.assertEqual((policy.hedged, policy.skipped), (0, 1))
+
+    def test_budget(self):
+        transport = SlowTransport(0.2)
+        policy = self.policy()
+        policy.budget.tokens = 0
+        client = Client('key', 'secret', transport=transport,
+                        hedging_policy=policy)
+        client.User.get(id='1')
+        self.assertEqual(len(transport.keys), 1)
+        self.assertEqual(policy.hedged, 0)
+
+    def test_write_method(self):
+        policy = self.policy()
+        self.assertTrue(policy.hedgeable('doc.get'))
+        self.assertFalse(policy.hedgeable('doc.delete'))
+        self.assertFalse(HedgingPolicy(methods=['user.get'])
+                         .hedgeable('doc.get'))
@@ -0,0 +1,113 @@
+from unittest import TestCase
+from ipernity_api import rest
+from ipernity_api.client import Client
+from ipernity_api.cache import SimpleCache
+from ipernity_api.errors import IpernityAPIError
+from ipernity_api.retry import RetryPolicy
+from ipernity_api.hooks import Hooks, EVENTS, HIT, MISS
+from .client import FakeTransport, make_response
+
+
+class ErrorTransport(FakeTransport):
+    def send(self, url, params, http_post=True, files=None, deadline=None):
+        return make_response({'api': {'status': 'error', 'code': '1',
+                                      'message': 'Doc not found'}})
+
+
+class FlakyTransport(FakeTransport):
+    ''' the first request fails with 503 '''
+    def send(self, url, params, http_post=True, files=None, deadline=None):
+        if not self.keys:
+            self.keys.append(None)
+            return make_response({}, 503)
+        return FakeTransport.send(self, url, params, http_post, files,
+                                  deadline)
+
+
+class HooksTest(TestCase):
+    def record(self, hooks):
+        calls = []
+        for event in EVENTS:
+            hooks.add(event, lambda info, event=event:
+                      calls.append((event, dict(info.timings), info.cache,
+                                    info.response_bytes, info.error_code)))
+        return calls
+
+    def test_events(self):
+        hooks = Hooks()
+        calls = self.record(hooks)
+        client = Client('key', 'secret', transport=FakeTransport(),
+                        hooks=hooks)
+        client.User.get(id='1')
+        self.assertEqual([c[0] for c in calls], list(EVENTS))
+        timings = calls[-1][1]
+        self.assertEqual(sorted(timings),
+                         ['decode', 'format', 'request', 'sign', 'wait'])
+        self.assertGreater(calls[1][3], 0)
+        self.assertIsNone(calls[1][2])
+
+    def test_sign(self):
+        hooks = Hooks()
+        calls = []
+        hooks.add('before_request', calls.append)
+        client = Client('key', 'secret', transport=FakeTransport(),
+                        hooks=hooks)
+        rest.call_api('user.get', client=client, signed=True, user_id='1')
+        self.assertIn('api_sig', calls[0].params)
+        self.assertGreater(calls[0].timings['sign'], 0)
+
+    def test_cache(self):
+        hooks = Hooks()
+        calls = self.record(hooks)
+        client = Client('key', 'secret', transport=FakeTransport(),
+                        cache=SimpleCache(), hooks=hooks)
+        client.call_api('user.get', user_id='1', http_post=False)
+        client.call_api('user.get', user_id='1', http_post=False)
+        caches = [c[2] for c in calls if c[0] == 'after_response']
+        self.assertEqual(caches, [MISS, HIT])
+
+    def test_error(self):
+        hooks = Hooks()
+        calls = self.record(hooks)
+        client = Client('key', 'secret', transport=ErrorTransport(),
+                        hooks=hooks)
+        with self.assertRaises(IpernityAPIError):
+            client.User.get(id='1')
+        self.assertEqual(calls[-1][0], 'after_decode')
+        self.assertEqual(calls[-1][4], 1)
+
+    def test_global_hooks(self):
+        seen = []
+
+        def hook(info):
+            seen.append(info.api_method)
+            raise ValueError('broken hook')
+        rest.add_hook('after_format', hook)
+        try:
+            client = Client('key', 'secret', transport=FakeTransport())
+            client.User.get(id='1')
+        finally:
+            rest.remove_hook('after_format', hook)
+        self.assertEqual(seen, ['user.get'])
+        with self.assertRaises(ValueError):
+            Hooks().add('after_everything', hook)
+
+    def test_attempts(self):
+        hooks = Hooks()
+        attempts, calls = [], []
+        hooks.add('before_request', attempts.append)
+        hooks.add('after_format', calls.append)
+        client = Client('key', 'secret', transport=FlakyTransport(),
+                        retry_policy=RetryPolicy(base=0.001), hooks=hooks)
+        client.User.get(id='1')
+        # every attempt has its own CallInfo, the call's holds the last one
+        self.assertEqual([a.attempt for a in attempts], [1, 2])
+        self.assertIsNot(attempts[0], attempts[1])
+        self.assertEqual(attempts[0].status, 503)
+        info = calls[0]
+        self.assertNotIn(info, attempts)
+        self.assertEqual((info.attempt, info.status, info.error),
+                         (2, 200, None))
+        self.assertEqual(sorted(info.timings),
+                         ['decode', 'format', 'request', 'sign', 'wait'])
+        self.assertIn('sign', attempts[0].timings)
@@ -1,7 +1,7 @@
 import os
 import datetime
 import ipernity_api as ipernity
-from unittest import TestCase
+from unittest import TestCase, mock
 from ipernity_api import errors
 from . import utils
 
@@ -481,3 +481,139 @@ class IpernityTest(TestCase):
         # explore.groups.getRandom seems to be defunct:
         #groups = ipernity.Explore.groups_getRandom(count = 5)
         #self.assertTrue(all([isinstance(g, ipernity.Group) for g in groups]))
+
+
+class PropsTest(TestCase):
+    ''' conversion of properties, without network '''
+    def test_doc(self):
+        doc = ipernity.Doc(doc_id='5', w='640', count={'visits': '3'},
+                           owner={'user_id': '7', 'username': 'u'},
+                           thumbs={'thumb': [{'label': '75x', 'w': '75'}]},
+                           dates={'created': '2020-01-02 03:04:05'})
+        self.assertEqual((doc.id, doc['doc_id']), ('5', '5'))
+        self.assertEqual(doc.w, 640)
+        self.assertEqual(doc.count, {'visits': 3})
+        self.assertEqual(doc.owner.id, '7')
+        self.assertEqual(doc.thumbs[0].w, 75)
+        self.assertEqual(doc.dates['created'],
+                         datetime.datetime(2020, 1, 2, 3, 4, 5))
+
+    def test_replace(self):
+        c = ipernity.Comment(comment_id='1', user_id='2', parent_id='3',
+                             canedit='1')
+        self.assertEqual(c.user.id, '2')
+        self.assertEqual(c.parent.id, '3')
+        self.assertIs(c.canedit, True)
+        self.assertFalse(hasattr(c, 'user_id'))
+
+    def test_convertor_key_error(self):
+        # a malformed value is kept as it is
+        doc = ipernity.Doc(id='1', thumbs={})
+        self.assertEqual(doc.thumbs, {})
+        self.assertEqual(doc.doc_id, '1')
+
+    def test_subclass(self):
+        class Item(ipernity.IpernityObject):
+            __id__ = 'item_id'
+            __convertors__ = [(['n'], int), (['n'], lambda n: n * 2)]
+            __replace__ = [('owner_id', 'owner', str.upper)]
+
+        item = Item(item_id='x', n='2', owner_id='me')
+        self.assertEqual((item.id, item.n, item.owner), ('x', 4, 'ME'))
+
+    def test_slots(self):
+        thumb = ipernity.Thumb(label='75x', w='75', url='u')
+        self.assertEqual(thumb.__dict__, {})
+        self.assertEqual((thumb.w, thumb['label']), (75, '75x'))
+        self.assertRaises(KeyError, lambda: thumb['h'])
+        self.assertIsNone(thumb._client)
+        self.assertRaises(KeyError, lambda: thumb['_client'])
+        self.assertRaises(KeyError, lambda: thumb['_raw'])
+        # unknown properties go to the overflow dict
+        user = ipernity.User(user_id='1', unknown='x')
+        self.assertEqual(user.__dict__, {'unknown': 'x'})
+        self.assertEqual((user.unknown, user['unknown']), ('x', 'x'))
+        self.assertEqual(user._asdict(),
+                         {'id': '1', 'user_id': '1', 'unknown': 'x'})
+        self.assertRaises(errors.IpernityError, user.__setitem__, 'id', '2')
+
+    def test_lazy(self):
+        ipernity.ipernity.set_lazy(True)
+        try:
+            doc = ipernity.Doc(doc_id='5', w='640',
+                               owner={'user_id': '7'},
+                               dates={'posted_at': 'x'})
+            c = ipernity.Comment(comment_id='1', user_id='2')
+        finally:
+            ipernity.ipernity.set_lazy(False)
+        self.assertEqual(doc.id, '5')
+        self.assertEqual(sorted(doc._raw), ['dates', 'owner', 'w'])
+        self.assertEqual(doc.w, 640)
+        self.assertEqual(doc['owner'].id, '7')
+        self.assertEqual(list(doc._raw), ['dates'])
+        self.assertEqual(c.user.id, '2')
+        self.assertFalse(hasattr(c, 'user_id'))
+        self.assertRaises(AttributeError, getattr, c, 'parent')
+        # a property popped by another thread between check and lookup
+        class Racing(dict):
+            def __contains__(self, key):
+                return True
+        c._raw = Racing(content=(str, 'x'))
+        self.assertFalse(hasattr(c, 'title'))
+        self.assertEqual(getattr(c, 'title', 'x'), 'x')
+        # refreshed properties replace the raw ones
+        doc._set_props(doc_id='5', dates={'posted_at': 'y'})
+        self.assertEqual(doc.dates, {'posted_at': 'y'})
+        self.assertEqual(doc._asdict()['w'], 640)
+
+    def test_ts2datetime(self):
+        conv = ipernity.ipernity._ts2datetime
+        self.assertEqual(conv('1300000000'),
+                         datetime.datetime.fromtimestamp(1300000000))
+        self.assertEqual(conv('2020-01-02 03:04:05'),
+                         datetime.datetime(2020, 1, 2, 3, 4, 5))
+        for ts in ['', '0000-00-00 00:00:00', '2020-02-30 03:04:05',
+                   '2020-01-02 03:04:05.5']:
+            self.assertIsNone(conv(ts), ts)
+        self.assertEqual(conv('2020-01-02'), '2020-01-02')
+        self.assertIs(conv('2020-01-02 03:04:05'),
+                      conv('2020-01-02 03:04:05'))
+        self.assertIs(conv('1300000000'), conv('1300000000'))
+
+    @mock.patch.multiple(ipernity.ipernity, _TS_MEMO_SIZE=4,
+                         _TS_MEMO_MISSES=16, _TS_MEMO_SKIP=10,
+                         _TS_MEMO={}, _ts_memo_hits=0, _ts_memo_misses=0,
+                         _ts_memo_skip=0)
+    def test_ts2datetime_memo(self):
+        module = ipernity.ipernity
+        conv = module._ts2datetime
+        # a full memo takes no new values
+        for i in range(10):
+            conv(str(1300000000 + i))
+        self.assertEqual(sorted(module._TS_MEMO),
+                         [str(1300000000 + i) for i in range(4)])
+        # repeated values keep the memo
+        for i in range(100):
+            conv(str(1300000000 + i % 4))
+            if i % 10 == 0:
+                conv(str(1400000000 + i))
+        self.assertEqual(module._ts_memo_skip, 0)
+        self.assertEqual(len(module._TS_MEMO), 4)
+        # distinct values: the memo is cleared and skipped for a while
+        for i in range(32):
+            conv(str(1500000000 + i))
+            if module._ts_memo_skip:
+                break
+        self.assertEqual((module._TS_MEMO, module._ts_memo_skip), ({}, 10))
+        for i in range(10):
+            self.assertEqual(conv('1600000000'),
+                             datetime.datetime.fromtimestamp(1600000000))
+        self.assertEqual(module._TS_MEMO, {})
+        conv('1600000000')
+        self.assertIn('1600000000', module._TS_MEMO)
+
+    def test_ts2datetime_page(self):
+        items = [{'a': '2020-01-02 03:04:05', 'b': '0'}, {'a': ''}, {}]
+        self.assertEqual(ipernity.ipernity._ts2datetime_page(items, 'ab'), [
+            {'a': datetime.datetime(2020, 1, 2, 3, 4, 5),
+             'b': datetime.datetime.fromtimestamp(0)}, {'a': None}, {}])
@@ -0,0 +1,27 @@
+import sys
+import subprocess
+from unittest import TestCase
+from ipernity_api.methodinfo import (INDEX_FILE, build_index, auth_info,
+                                     required_params, is_read_method,
+                                     exists, describe)
+
+
+class MethodInfoTest(TestCase):
+    def test_index_up_to_date(self):
+        with open(INDEX_FILE) as f:
+            self.assertEqual(f.read(), build_index())
+
+    def test_lookup(self):
+        self.assertEqual(auth_info('doc.delete'),
+                         {'token': 1, 'post': 1, 'sign': 1})
+        self.assertEqual(required_params('album.docs.add'),
+                         ['album_id', 'doc_id'])
+        self.assertTrue(is_read_method('doc.get'))
+        self.assertFalse(exists('doc.unknown'))
+        self.assertEqual(describe('doc.get')['name'], 'doc.get')
+
+    def test_lazy(self):
+        code = ('import sys, ipernity_api; '
+                'print("ipernity_api.methods" in sys.modules)')
+        out = subprocess.check_output([sys.executable, '-c', code])
+        self.assertEqual(out.strip(), b'False')
@@ -0,0 +1,58 @@
+import requests
+from unittest import TestCase
+from ipernity_api.client import Client
+from ipernity_api.errors import IpernityAPIError
+from ipernity_api.metrics import Registry, Counter, Histogram, serve
+from .client import FakeTransport
+from .hooks import ErrorTransport
+
+
+class MetricsTest(TestCase):
+    def test_counter(self):
+        counter = Counter('c_total', 'help', ['a'])
+        counter.inc('x"y')
+        counter.inc('x"y', amount=2)
+        self.assertEqual(counter.render(), ['c_total{a="x\\"y"} 3'])
+
+    def test_histogram(self):
+        histogram = Histogram('h', 'help', buckets=[0.1, 1])
+        for value in [0.05, 0.5, 5]:
+            histogram.observe(value)
+        self.assertEqual(histogram.render(), [
+            'h_bucket{le="0.1"} 1', 'h_bucket{le="1"} 2',
+            'h_bucket{le="+Inf"} 3', 'h_sum 5.55', 'h_count 3'])
+
+    def test_calls(self):
+        registry = Registry()
+        client = Client('key', 'secret', transport=FakeTransport())
+        registry.install(client.hooks)
+        client.User.get(id='1')
+        client.User.get(id='2')
+        self.assertEqual(registry.requests.get('user.get', '200', 'none'), 2)
+        self.assertEqual(registry.call_duration.count('user.get'), 2)
+        self.assertEqual(registry.request_duration.count('user.get'), 2)
+        client = Client('key', 'secret', transport=ErrorTransport())
+        registry.install(client.hooks)
+        with self.assertRaises(IpernityAPIError):
+            client.Doc.get(id='1')
+        self.assertEqual(registry.errors.get('doc.get', 1), 1)
+        text = registry.render()
+        self.assertIn('# TYPE ipernity_call_duration_seconds histogram',
+                      text)
+        self.assertIn('ipernity_api_errors_total{method="doc.get",code="1"} 1',
+                      text)
+
+    def test_serve(self):
+        registry = Registry()
+        registry.requests.inc('doc.get', '200', 'none')
+        server = serve(registry, 0, '127.0.0.1')
+        try:
+            url = 'http://127.0.0.1:%d' % server.server_address[1]
+            r = requests.get(url + '/metrics')
+            self.assertEqual(r.status_code, 200)
+            self.assertIn('ipernity_requests_total{method="doc.get",'
+                          'status="200",cache="none"} 1', r.text)
+            self.assertEqual(requests.get(url + '/').status_code, 404)
+        finally:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,58 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+from unittest import TestCase
+from ipernity_api.ratelimit import TokenBucket, SharedTokenBucket, RateLimiter
+from ipernity_api.client import Client
+from .client import FakeTransport
+
+
+class RateLimitTest(TestCase):
+    def test_token_bucket(self):
+        bucket = TokenBucket(10, burst=2)
+        self.assertEqual(bucket.take(), 0)
+        self.assertEqual(bucket.take(), 0)
+        wait = bucket.take()
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, 0.1)
+
+    def test_shared_bucket(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'rate.db')
+            b1 = SharedTokenBucket(path, 'key', 1, burst=2)
+            b2 = SharedTokenBucket(path, 'key', 1, burst=2)
+            self.assertEqual(b1.take(), 0)
+            self.assertEqual(b2.take(), 0)
+            # both buckets share the same tokens
+            self.assertGreater(b1.take(), 0)
+            self.assertEqual(SharedTokenBucket(path, 'other', 1).take(), 0)
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_limiter_threads(self):
+        limiter = RateLimiter(50, burst=5, weights={'doc.get': 2})
+        started = time.monotonic()
+
+        def work():
+            for i in range(5):
+                limiter.acquire('key', 'doc.get')
+
+        threads = [threading.Thread(target=work) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        # 40 tokens, 5 in the initial burst, 35 at 50/s
+        self.assertGreaterEqual(time.monotonic() - started, 0.6)
+
+    def test_client(self):
+        transport = FakeTransport()
+        client = Client('key', 'secret', transport=transport,
+                        rate_limiter=RateLimiter(20, burst=1))
+        started = time.monotonic()
+        for i in range(5):
+            client.User.get(id=str(i))
+        self.assertGreaterEqual(time.monotonic() - started, 0.18)
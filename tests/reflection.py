@@ -42,3 +42,31 @@ class ReflectionTest(TestCase):
         t = Test()
         with self.assertRaisesRegex(IpernityError, 'missing'):
             t.test()
+
+
+class DocTest(TestCase):
+    def test_lazy_doc(self):
+        class Test:
+            __id__ = 'album_id'
+
+            @call('album.get')
+            def get(self, **kwargs):
+                ''' get the album '''
+                return kwargs, lambda k: k
+
+            @static_call('album.getList')
+            def getList(**kwargs):
+                return kwargs, lambda k: k
+
+        method = Test.__dict__['get']
+        self.assertIsNone(method._doc)
+        doc = Test().get.__doc__
+        self.assertTrue(doc.startswith(' get the album'))
+        self.assertIn('API: album.get', doc)
+        # the id is set from the object
+        self.assertNotIn('album_id:', doc)
+        self.assertIs(method.__doc__, doc)
+        doc = Test.getList.__doc__
+        self.assertIsInstance(doc, str)
+        self.assertIn('Optional Parameters', doc)
+        self.assertNotIn('api_key:', doc)
@@ -0,0 +1,76 @@
+import requests
+from unittest import TestCase
+from ipernity_api.retry import RetryPolicy, RetryBudget, is_read_method
+from ipernity_api.errors import IpernityAPIError
+from ipernity_api.client import Client
+from .client import FakeTransport, make_response
+
+
+class FlakyTransport(FakeTransport):
+    ''' fail the first `failures` requests '''
+    def __init__(self, failures, status=503):
+        FakeTransport.__init__(self)
+        self.failures = failures
+        self.status = status
+
+    def send(self, url, params, http_post=True, files=None, deadline=None):
+        if self.failures:
+            self.failures -= 1
+            self.keys.append(params.get('api_key'))
+            if self.status is None:
+                raise requests.ConnectionError('reset')
+            return make_response({}, self.status)
+        return FakeTransport.send(self, url, params, http_post, files,
+                                  deadline)
+
+
+class RetryTest(TestCase):
+    def policy(self, **kwargs):
+        return RetryPolicy(base=0.001, **kwargs)
+
+    def test_read_method(self):
+        self.assertTrue(is_read_method('doc.get'))
+        self.assertFalse(is_read_method('doc.delete'))
+        self.assertFalse(is_read_method('unknown'))
+
+    def test_transient(self):
+        policy = self.policy()
+        self.assertTrue(policy.transient(requests.ConnectionError()))
+        self.assertFalse(policy.transient(IpernityAPIError(1, 'Not found')))
+        self.assertTrue(self.policy(error_codes=[99]).transient(
+            IpernityAPIError(99, 'busy')))
+
+    def test_retry(self):
+        for status in [503, None]:
+            transport = FlakyTransport(2, status)
+            client = Client('key', 'secret', transport=transport,
+                            retry_policy=self.policy())
+            self.assertEqual(client.User.get(id='1').id, '1')
+            self.assertEqual(len(transport.keys), 3)
+
+    def test_no_retry(self):
+        # write methods and non transient errors are not retried
+        policy = self.policy()
+        self.assertFalse(policy.should_retry(requests.ConnectionError(),
+                                             'doc.delete', 1))
+        transport = FlakyTransport(1, 404)
+        client = Client('key', 'secret', transport=transport,
+                        retry_policy=policy)
+        with self.assertRaises(requests.HTTPError):
+            client.User.get(id='1')
+        self.assertEqual(len(transport.keys), 1)
+        # give up after max_attempts
+        transport = FlakyTransport(5)
+        client = Client('key', 'secret', transport=transport,
+                        retry_policy=self.policy(max_attempts=3))
+        with self.assertRaises(requests.HTTPError):
+            client.User.get(id='1')
+        self.assertEqual(len(transport.keys), 3)
+
+    def test_budget(self):
+        budget = RetryBudget(ratio=0.5, min_per_second=0, max_tokens=1)
+        self.assertTrue(budget.withdraw())
+        self.assertFalse(budget.withdraw())
+        budget.deposit()
+        budget.deposit()
+        self.assertTrue(budget.withdraw())
@@ -0,0 +1,59 @@
+import time
+import threading
+from unittest import TestCase
+from ipernity_api.scheduler import (Scheduler, INTERACTIVE, BULK, priority,
+                                    current_priority)
+from ipernity_api.deadline import Deadline
+from ipernity_api.errors import IpernityTimeoutError
+from ipernity_api.client import Client
+from ipernity_api.rest import bind_client
+from .client import FakeTransport
+
+
+class SchedulerTest(TestCase):
+    def test_priority(self):
+        scheduler = Scheduler(concurrency=1)
+        scheduler.acquire(BULK)
+        order = []
+
+        def request(name):
+            with scheduler.slot(name):
+                order.append(name)
+        threads = [threading.Thread(target=request, args=(name,))
+                   for name in [BULK, BULK, INTERACTIVE]]
+        for t in threads:
+            t.start()
+            time.sleep(0.02)
+        self.assertEqual(scheduler.metrics()[BULK]['queued'], 2)
+        self.assertEqual(scheduler.metrics()[INTERACTIVE]['queued'], 1)
+        scheduler.release(BULK)
+        for t in threads:
+            t.join()
+        # the interactive request jumps the queue
+        self.assertEqual(order, [INTERACTIVE, BULK, BULK])
+        metrics = scheduler.metrics()
+        self.assertEqual(metrics[BULK]['admitted'], 3)
+        self.assertEqual(metrics[BULK]['max_queued'], 2)
+        self.assertGreater(metrics[INTERACTIVE]['wait_max'], 0)
+
+    def test_limits(self):
+        scheduler = Scheduler(concurrency=2, limits={BULK: 1})
+        scheduler.acquire(BULK)
+        with self.assertRaises(IpernityTimeoutError):
+            scheduler.acquire(BULK, Deadline(0.05))
+        self.assertEqual(scheduler.metrics()[BULK]['queued'], 0)
+        # the second slot is left for interactive requests
+        scheduler.acquire(INTERACTIVE, Deadline(0.05))
+
+    def test_context(self):
+        self.assertIsNone(current_priority())
+        with priority(BULK):
+            self.assertEqual(bind_client(current_priority)(), BULK)
+            transport = FakeTransport()
+            scheduler = Scheduler()
+            client = Client('key', 'secret', transport=transport,
+                            scheduler=scheduler)
+            client.User.get(id='1')
+        self.assertIsNone(current_priority())
+        self.assertEqual(scheduler.metrics()[BULK]['admitted'], 1)
+        self.assertEqual(scheduler.metrics()[INTERACTIVE]['admitted'], 0)
@@ -0,0 +1,54 @@
+import json
+from unittest import TestCase
+from ipernity_api.errors import IpernityError
+from ipernity_api.export import serialize
+from ipernity_api.store import SQLiteStore
+from ipernity_api.ipernity import Doc, Album, Group, Comment, Tag
+
+
+class SQLiteStoreTest(TestCase):
+    def setUp(self):
+        self.store = SQLiteStore(':memory:', batch_size=10)
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_upsert(self):
+        docs = [Doc(doc_id=str(i), title='doc %d' % i,
+                    dates={'posted_at': '1203605781'},
+                    owner={'user_id': '7', 'username': 'john'},
+                    tags={'total': '1', 'tag': [
+                        {'id': '99', 'type': 'keyword', 'tag': 'car',
+                         'user_id': '7'}]})
+                for i in range(25)]
+        self.store.upsert(docs)
+        self.assertEqual(self.store.query('SELECT count(*) FROM docs'),
+                         [(25,)])
+        self.assertEqual(self.store.query(
+            'SELECT username FROM users WHERE id = ?', ('7',)), [('john',)])
+        self.assertEqual(self.store.query(
+            'SELECT count(*) FROM doc_tags WHERE tag_id = ?', ('99',)),
+            [(25,)])
+        # update keeps columns missing in the new object
+        self.store.add(Doc(doc_id='1', title='renamed'))
+        row = self.store.query(
+            'SELECT title, owner_id, posted_at FROM docs WHERE id = ?',
+            ('1',))[0]
+        self.assertEqual(row[:2], ('renamed', '7'))
+        self.assertIsNotNone(row[2])
+
+    def test_context(self):
+        self.store.upsert([Comment(comment_id='1', user_id='3',
+                                   posted_at='1203605781')], doc_id='5')
+        album = Album(album_id='2', title='album')
+        self.store.add(album)
+        self.store.add(Group(id='3', title='group', count={'members': 4}))
+        self.assertEqual(self.store.query(
+            'SELECT doc_id, user_id FROM comments'), [('5', '3')])
+        self.assertEqual(self.store.query(
+            'SELECT members FROM "groups"'), [(4,)])
+        (data,), = self.store.query('SELECT data FROM albums')
+        self.assertEqual(json.loads(data), serialize(album))
+        self.assertEqual(json.loads(data)['title'], 'album')
+        with self.assertRaises(IpernityError):
+            self.store.add(Tag)
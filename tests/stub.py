@@ -0,0 +1,162 @@
+import time
+from unittest import TestCase
+from ipernity_api import rest, auth, ipernity
+from ipernity_api.client import Client
+from ipernity_api.errors import IpernityAPIError
+from ipernity_api.ipernity import Doc, IpernityList, IpernityObject, walk
+from ipernity_api.methodinfo import METHODS, auth_info, required_params
+from ipernity_api.reflection import ApiMethod
+from ipernity_api.stub import (StubServer, build_response, ERR_METHOD,
+                               ERR_SIGNATURE, ERR_TOKEN, ERR_PARAMETER)
+
+
+class StubResponseTest(TestCase):
+    def test_sample(self):
+        resp = build_response('doc.get', {'doc_id': '42'})
+        self.assertEqual(resp['doc']['doc_id'], '42')
+        self.assertEqual(resp['doc']['owner']['user_id'], '123')
+        self.assertEqual(build_response('test.echo', {'echo': 'hi'}),
+                         {'echo': 'hi'})
+
+    def test_pages(self):
+        resp = build_response('doc.getList', {'page': '2', 'per_page': '3'},
+                              pages=4)
+        docs = resp['docs']
+        self.assertEqual((docs['page'], docs['pages'], docs['total']),
+                         ('2', '4', '12'))
+        self.assertEqual([d['doc_id'] for d in docs['doc']], ['4', '5', '6'])
+        resp = build_response('doc.getList', {'page': '5', 'per_page': '3'},
+                              pages=4)
+        self.assertEqual(resp['docs']['doc'], [])
+
+    def test_every_method(self):
+        for api_method in METHODS:
+            self.assertIsInstance(build_response(api_method, {}), dict)
+
+    def test_shapes(self):
+        doc = build_response('doc.search', {})['docs']['doc'][0]
+        # optional placeholders (<dates ... if option/>) are left out
+        self.assertNotIn('dates', doc)
+        self.assertEqual(doc['owner'], {'user_id': '295'})
+        albums = build_response('album.getList', {})['albums']
+        self.assertEqual(albums['can'], {'create': '1'})
+        self.assertEqual(albums['album'][0]['can'],
+                         {'fave': '1', 'comment': '1'})
+        self.assertIsInstance(
+            build_response('network.getList', {})['network']['user'], list)
+
+
+class StubServerTest(TestCase):
+    def setUp(self):
+        self.stub = StubServer('key', 'secret').start()
+        self.client = Client('key', 'secret', api_url=self.stub.url)
+
+    def tearDown(self):
+        self.stub.stop()
+
+    def call(self, api_method, **kwargs):
+        return rest.call_api(api_method, client=self.client, **kwargs)
+
+    def assertCode(self, code, api_method, **kwargs):
+        with self.assertRaises(IpernityAPIError) as cm:
+            self.call(api_method, **kwargs)
+        self.assertEqual(cm.exception.code, code)
+
+    def test_objects(self):
+        doc = self.client.Doc.get(id='12')
+        self.assertEqual(doc.id, '12')
+        self.assertEqual(doc.owner.id, '123')
+
+    def test_object_lists(self):
+        # every list and search method of the object API
+        called = []
+        for name, cls in vars(ipernity).items():
+            if not isinstance(cls, type) or \
+                    not issubclass(cls, IpernityObject):
+                continue
+            for attr, method in vars(cls).items():
+                if not isinstance(method, ApiMethod) or \
+                        method.ipernity_method.rsplit('.', 1)[-1] not in \
+                        ('getList', 'search'):
+                    continue
+                params = dict((p, '1') for p in
+                              required_params(method.ipernity_method))
+                if method.static:
+                    func = getattr(getattr(self.client, name), attr)
+                else:
+                    idname = cls.__id__
+                    params.pop(idname, None)
+                    obj = getattr(self.client, name)(**{idname: '1'})
+                    func = getattr(obj, attr)
+                result = func(**params)
+                self.assertIsInstance(result, IpernityList, attr)
+                self.assertTrue(result, attr)
+                called.append(method.ipernity_method)
+        self.assertIn('doc.search', called)
+        self.assertIn('album.getList', called)
+        self.assertGreaterEqual(len(called), 10)
+        doc = self.client.Doc.search()[0]
+        self.assertEqual(doc.owner.id, '295')
+        self.assertEqual(self.client.Album.getList()[0].can,
+                         {'fave': '1', 'comment': '1'})
+
+    def test_walk(self):
+        self.stub.pages = 3
+        with self.client:
+            docs = list(walk(Doc.getList, per_page=5, user_id='1',
+                             workers=2))
+        self.assertEqual([d.id for d in docs],
+                         [str(i) for i in range(1, 16)])
+        self.assertEqual(self.stub.calls['doc.getList'], 3)
+
+    def test_validation(self):
+        self.assertCode(ERR_METHOD, 'doc.unknown')
+        self.assertCode(ERR_PARAMETER, 'doc.get')
+        self.assertCode(ERR_TOKEN, 'doc.delete', signed=True, doc_id='1')
+        self.assertCode(ERR_SIGNATURE, 'doc.delete', doc_id='1',
+                        auth_token='t')
+        self.assertCode(ERR_SIGNATURE, 'doc.get', doc_id='1', api_sig='x')
+
+    def test_every_method(self):
+        for api_method in METHODS:
+            params = dict((p, __file__ if p == 'file' else '1')
+                          for p in required_params(api_method))
+            info = auth_info(api_method)
+            if info['token']:
+                params['auth_token'] = 'token'
+            resp = self.call(api_method, signed=bool(info['sign']),
+                             http_post=bool(info['post']), **params)
+            self.assertEqual(resp['api']['status'], 'ok')
+
+    def test_oauth(self):
+        self.stub.tokens = {'token': 'token secret'}
+        handler = auth.OAuthAuthHandler(api_key='key', api_secret='secret',
+                                        oauth_token='token',
+                                        oauth_token_secret='token secret')
+        client = Client('key', 'secret', auth_handler=handler,
+                        api_url=self.stub.url)
+        resp = rest.call_api('doc.delete', client=client, authed=True,
+                             doc_id='1')
+        self.assertEqual(resp['api']['status'], 'ok')
+        handler.oauth_token_secret = 'wrong'
+        with self.assertRaises(IpernityAPIError) as cm:
+            rest.call_api('doc.delete', client=client, authed=True,
+                          doc_id='1')
+        self.assertEqual(cm.exception.code, ERR_SIGNATURE)
+
+    def test_injected_errors(self):
+        self.stub.fail('doc.get', code=1, message='Document not found',
+                       times=2)
+        self.assertCode(1, 'doc.get', doc_id='1')
+        self.assertCode(1, 'doc.get', doc_id='1')
+        self.call('doc.get', doc_id='1')
+        self.stub.fail(status=503)
+        with self.assertRaises(Exception):
+            self.call('doc.get', doc_id='1')
+        self.call('doc.get', doc_id='1')
+
+    def test_latency(self):
+        self.stub.latency = 0.05
+        started = time.monotonic()
+        self.call('test.hello')
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
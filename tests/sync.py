@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase, mock
+from ipernity_api.sync import Sync, CheckpointStore, DictStore, scope_key
+from ipernity_api.errors import IpernityAPIError
+from ipernity_api.ipernity import Doc, IpernityList
+
+
+class FakeSearch(object):
+    ''' doc.search over `docs` (doc_id -> posted timestamp) '''
+    def __init__(self, docs):
+        self.docs = docs
+        self.calls = []
+
+    def __call__(self, page=1, per_page=100, **kwargs):
+        self.calls.append(kwargs)
+        posted_min = kwargs.get('posted_min', 0)
+        found = sorted((ts, i) for i, ts in self.docs.items()
+                       if ts >= posted_min)
+        pages = max(1, (len(found) + per_page - 1) // per_page)
+        found = found[(page - 1) * per_page:page * per_page]
+        docs = [Doc(doc_id=i, dates={'posted_at': str(ts)})
+                for ts, i in found]
+        return IpernityList(docs, {'page': page, 'pages': pages})
+
+
+class SyncTest(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'checkpoints.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_scope_key(self):
+        self.assertEqual(scope_key(user='1', album=Doc(doc_id='2')),
+                         'user:1/album:2')
+        with self.assertRaises(Exception):
+            scope_key()
+
+    def test_sync(self):
+        search = FakeSearch(dict(('d%d' % i, 1300000000 + i)
+                                 for i in range(250)))
+        store = DictStore()
+        with mock.patch.object(Doc, 'search', search):
+            sync = Sync(CheckpointStore(self.path), store)
+            results = sync.run([{'user': '1'}])
+            self.assertEqual(results[0].fetched, 250)
+            self.assertEqual(results[0].watermark, 1300000249)
+            self.assertEqual(len(store.docs), 250)
+            self.assertNotIn('posted_min', search.calls[0])
+
+            # new docs: only those after the watermark are fetched
+            search.docs['new'] = 1400000000
+            sync = Sync(CheckpointStore(self.path), store)
+            result = sync.run([{'user': '1'}])[0]
+            self.assertEqual(search.calls[-1]['posted_min'], 1300000249)
+            self.assertEqual(result.fetched, 2)
+            self.assertEqual(result.watermark, 1400000000)
+            self.assertEqual(len(store.docs), 251)
+
+    def test_failing_scope(self):
+        search = FakeSearch(dict(('d%d' % i, 1300000000 + i)
+                                 for i in range(25)))
+
+        def failing(page=1, per_page=100, **kwargs):
+            if kwargs.get('user_id') == '2' and page == 2:
+                raise IpernityAPIError(1, 'User not found')
+            return search(page, per_page, **kwargs)
+        store = DictStore()
+        with mock.patch.object(Doc, 'search', failing):
+            sync = Sync(CheckpointStore(self.path), store, per_page=10)
+            results = sync.run([{'user': str(i)} for i in range(1, 4)],
+                               workers=2)
+        self.assertEqual([r.key for r in results],
+                         ['user:%d#posted' % i for i in range(1, 4)])
+        self.assertEqual([r.fetched for r in results], [25, 10, 25])
+        self.assertIsNone(results[0].error)
+        self.assertIsNone(results[2].error)
+        self.assertIsInstance(results[1].error, IpernityAPIError)
+        # the pages synced before the error count
+        self.assertEqual(results[1].watermark, 1300000009)
+        self.assertEqual(CheckpointStore(self.path).get(results[1].key),
+                         1300000009)